@@ -6,12 +6,26 @@ Prikazuje:
 - Koliko proizvoda nema slike
 - Koje SKU-ove nemaju slike
 - Statistiku po kategorijama
+
+Analiza se radi u bazi: SKU-ovi sa slikama se COPY-jem ubace u privremenu
+tabelu, a brojevi, statistika po kategorijama i top-N lista se računaju
+jednim agregatnim upitom, pa memorija ne raste sa veličinom kataloga.
+
+Upotreba:
+    python scripts/check_missing_images.py
+    python scripts/check_missing_images.py --format json --output missing.json
+    python scripts/check_missing_images.py --format csv --top 20
 """
 
+import argparse
+import csv
+import io
+import json
 import os
 import re
+import sys
 from pathlib import Path
-from typing import Dict, Set
+from typing import Dict, Iterable, Set
 import psycopg2
 from psycopg2.extras import RealDictCursor
 from dotenv import load_dotenv
@@ -21,6 +35,10 @@ load_dotenv()
 
 # Putanje
 IMAGES_DIR = Path("public/uploads/images_compressed")
+MISSING_LIST_FILE = Path("scripts/missing_images_skus.txt")
+
+# Privremena tabela sa SKU-ovima koji imaju slike (briše se na kraju transakcije)
+AVAILABLE_SKUS_TABLE = "available_image_skus"
 
 def parse_image_filename(filename: str) -> str | None:
     """
@@ -67,118 +85,263 @@ def get_db_connection():
 
     return psycopg2.connect(database_url)
 
-def analyze_missing_images():
+def load_available_skus(cursor, skus: Iterable[str]) -> None:
+    """
+    Kreira privremenu tabelu i puni je SKU-ovima preko COPY-ja.
+
+    Tabela živi do kraja transakcije (ON COMMIT DROP).
+    """
+    cursor.execute(f'''
+        CREATE TEMP TABLE {AVAILABLE_SKUS_TABLE} (
+            sku TEXT PRIMARY KEY
+        ) ON COMMIT DROP
+    ''')
+
+    # CSV format: csv.writer escape-uje navodnike, tabove i nove redove u vrijednostima
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    for sku in skus:
+        writer.writerow([sku])
+    buffer.seek(0)
+
+    cursor.copy_expert(f'COPY {AVAILABLE_SKUS_TABLE} (sku) FROM STDIN WITH (FORMAT csv)', buffer)
+    cursor.execute(f'ANALYZE {AVAILABLE_SKUS_TABLE}')
+
+# Jedan agregatni upit: ukupni brojevi, breakdown po kategorijama i top-N
+# kategorije sa primjerima SKU-ova bez slika.
+SUMMARY_QUERY = f'''
+    WITH products AS (
+        SELECT p.sku, p.name, p."categoryId", (a.sku IS NOT NULL) AS has_image
+        FROM "Product" p
+        LEFT JOIN {AVAILABLE_SKUS_TABLE} a ON a.sku = p.sku
+        WHERE p."isArchived" = false
+    ),
+    missing AS (
+        SELECT
+            sku, name, "categoryId",
+            ROW_NUMBER() OVER (PARTITION BY "categoryId" ORDER BY sku) AS rn
+        FROM products
+        WHERE sku IS NOT NULL AND NOT has_image
+    ),
+    per_category AS (
+        SELECT
+            m."categoryId" AS category_id,
+            COALESCE(c.name, 'Nepoznata kategorija') AS category_name,
+            COUNT(*) AS missing_count,
+            COALESCE(
+                json_agg(json_build_object('sku', m.sku, 'name', m.name) ORDER BY m.sku)
+                    FILTER (WHERE m.rn <= %(examples)s),
+                '[]'::json
+            ) AS examples
+        FROM missing m
+        LEFT JOIN "Category" c ON c.id = m."categoryId"
+        GROUP BY m."categoryId", c.name
+    ),
+    ranked AS (
+        SELECT
+            pc.*,
+            ROW_NUMBER() OVER (ORDER BY pc.missing_count DESC, pc.category_name) AS rank
+        FROM per_category pc
+    )
+    SELECT
+        (SELECT COUNT(*) FROM products) AS total_products,
+        (SELECT COUNT(*) FROM products WHERE sku IS NOT NULL) AS products_with_sku,
+        (SELECT COUNT(*) FROM products WHERE sku IS NOT NULL AND has_image) AS with_images,
+        (SELECT COUNT(*) FROM missing) AS missing_images,
+        (
+            SELECT COALESCE(json_agg(json_build_object(
+                'category_id', r.category_id,
+                'category_name', r.category_name,
+                'missing_count', r.missing_count,
+                'examples', CASE WHEN r.rank <= %(top)s THEN r.examples ELSE '[]'::json END
+            ) ORDER BY r.rank), '[]'::json)
+            FROM ranked r
+        ) AS categories,
+        (
+            SELECT COALESCE(json_agg(json_build_object('sku', s.sku, 'name', s.name)), '[]'::json)
+            FROM (
+                SELECT sku, name FROM products
+                WHERE sku IS NOT NULL AND has_image
+                ORDER BY sku
+                LIMIT %(examples)s
+            ) s
+        ) AS with_images_examples
+'''
+
+def export_missing_skus(cursor, output_file: Path, total_missing: int) -> None:
+    """
+    Streama listu SKU-ova bez slika iz baze u fajl (server-side cursor).
+
+    Format je isti kao ranije: "sku<TAB>naziv" po redu, bez escape-ovanja.
+    """
+    stream = cursor.connection.cursor(name='missing_image_skus')
+    stream.itersize = 5000
+    try:
+        stream.execute(f'''
+            SELECT p.sku, p.name
+            FROM "Product" p
+            LEFT JOIN {AVAILABLE_SKUS_TABLE} a ON a.sku = p.sku
+            WHERE p.sku IS NOT NULL
+            AND p."isArchived" = false
+            AND a.sku IS NULL
+            ORDER BY p.sku
+        ''')
+        with open(output_file, 'w') as f:
+            f.write("# SKU-ovi proizvoda bez slika\n")
+            f.write(f"# Ukupno: {total_missing}\n\n")
+            for sku, name in stream:
+                f.write(f"{sku}\t{name}\n")
+    finally:
+        stream.close()
+
+def print_text_report(summary: Dict, top: int, examples: int) -> None:
+    """
+    Ispisuje izvještaj u čitljivom formatu (default).
+    """
+    total_products = summary['total_products']
+    products_with_sku = summary['products_with_sku']
+    with_images = summary['with_images']
+    missing_images = summary['missing_images']
+
+    print(f"\n📊 Statistika proizvoda:")
+    print(f"  Ukupno proizvoda (aktivnih): {total_products}")
+    print(f"  Proizvoda sa SKU: {products_with_sku}")
+    print(f"  Proizvoda bez SKU: {total_products - products_with_sku}")
+
+    coverage = with_images / products_with_sku * 100 if products_with_sku else 0.0
+
+    print(f"\n📸 Statistika slika:")
+    print(f"  Proizvoda sa slikama: {with_images}")
+    print(f"  Proizvoda bez slika: {missing_images}")
+    print(f"  Procenat pokrivenosti: {coverage:.1f}%")
+
+    # Proizvodi bez slika po kategorijama
+    if missing_images:
+        print(f"\n❌ Proizvodi bez slika ({missing_images}):")
+
+        for category in summary['categories'][:top]:
+            count = category['missing_count']
+            print(f"\n  {category['category_name']} ({count} proizvoda):")
+            for product in category['examples']:
+                print(f"    - SKU {product['sku']}: {product['name'][:60]}")
+            if count > examples:
+                print(f"    ... i još {count - examples} proizvoda")
+
+    # Primjeri SKU sa slikama
+    if summary['with_images_examples']:
+        print(f"\n✅ Primjeri SKU sa slikama:")
+        for product in summary['with_images_examples']:
+            print(f"  - SKU {product['sku']}: {product['name'][:60]}")
+
+def write_json_report(summary: Dict, output) -> None:
+    """
+    Zapisuje kompletan rezultat analize kao JSON.
+    """
+    json.dump(summary, output, ensure_ascii=False, indent=2)
+    output.write('\n')
+
+def write_csv_report(summary: Dict, output) -> None:
+    """
+    Zapisuje breakdown po kategorijama kao CSV (jedan red po kategoriji).
+    """
+    writer = csv.writer(output)
+    writer.writerow(['category_id', 'category_name', 'missing_count'])
+    for category in summary['categories']:
+        writer.writerow([
+            category['category_id'],
+            category['category_name'],
+            category['missing_count'],
+        ])
+
+def analyze_missing_images(
+    output_format: str = 'text',
+    output_path: Path | None = None,
+    top: int = 10,
+    examples: int = 5,
+    missing_list: Path | None = MISSING_LIST_FILE,
+):
     """
     Analizira proizvode koji nemaju slike.
     """
-    print("=" * 80)
-    print("ANALIZA PROIZVODA BEZ SLIKA")
-    print("=" * 80)
+    # U JSON/CSV modu stdout je rezervisan za podatke, poruke idu na stderr
+    log_stream = sys.stdout if output_format == 'text' else sys.stderr
+
+    def log(message: str = ''):
+        print(message, file=log_stream)
+
+    log("=" * 80)
+    log("ANALIZA PROIZVODA BEZ SLIKA")
+    log("=" * 80)
 
     # Učitaj dostupne SKU-ove
-    print("\nSkeniranje slika...")
+    log("\nSkeniranje slika...")
     available_skus = get_available_skus(IMAGES_DIR)
-    print(f"Pronađeno {len(available_skus)} SKU-ova sa slikama")
+    log(f"Pronađeno {len(available_skus)} SKU-ova sa slikama")
 
     # Konektuj se na bazu
     try:
         conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
 
-        # Ukupan broj proizvoda
-        cursor.execute('SELECT COUNT(*) as total FROM "Product" WHERE "isArchived" = false')
-        total_products = cursor.fetchone()['total']
-
-        # Proizvodi sa SKU
-        cursor.execute('SELECT COUNT(*) as total FROM "Product" WHERE sku IS NOT NULL AND "isArchived" = false')
-        products_with_sku = cursor.fetchone()['total']
-
-        # Proizvodi bez SKU
-        products_without_sku = total_products - products_with_sku
-
-        print(f"\n📊 Statistika proizvoda:")
-        print(f"  Ukupno proizvoda (aktivnih): {total_products}")
-        print(f"  Proizvoda sa SKU: {products_with_sku}")
-        print(f"  Proizvoda bez SKU: {products_without_sku}")
-
-        # Proizvodi sa SKU koji nemaju slike
-        cursor.execute('''
-            SELECT sku, name, "categoryId"
-            FROM "Product"
-            WHERE sku IS NOT NULL
-            AND "isArchived" = false
-            ORDER BY sku
-        ''')
-        all_products = cursor.fetchall()
+        load_available_skus(cursor, available_skus)
+        del available_skus
 
-        missing_images = []
-        has_images = []
+        cursor.execute(SUMMARY_QUERY, {'top': top, 'examples': examples})
+        summary = dict(cursor.fetchone())
 
-        for product in all_products:
-            if product['sku'] not in available_skus:
-                missing_images.append(product)
+        if output_format == 'text':
+            print_text_report(summary, top, examples)
+        else:
+            writer = write_json_report if output_format == 'json' else write_csv_report
+            if output_path:
+                with open(output_path, 'w', newline='') as f:
+                    writer(summary, f)
+                log(f"\n💾 Izvještaj ({output_format}) spremljen u: {output_path}")
             else:
-                has_images.append(product)
-
-        print(f"\n📸 Statistika slika:")
-        print(f"  Proizvoda sa slikama: {len(has_images)}")
-        print(f"  Proizvoda bez slika: {len(missing_images)}")
-        print(f"  Procenat pokrivenosti: {len(has_images) / len(all_products) * 100:.1f}%")
-
-        # Proizvodi bez slika po kategorijama
-        if missing_images:
-            print(f"\n❌ Proizvodi bez slika ({len(missing_images)}):")
-
-            # Group by category
-            category_stats = {}
-            for product in missing_images:
-                cat_id = product['categoryId']
-                if cat_id not in category_stats:
-                    category_stats[cat_id] = []
-                category_stats[cat_id].append(product)
-
-            # Get category names
-            cursor.execute('''
-                SELECT id, name
-                FROM "Category"
-                WHERE id = ANY(%s)
-            ''', (list(category_stats.keys()),))
-
-            categories = {cat['id']: cat['name'] for cat in cursor.fetchall()}
-
-            # Print by category
-            for cat_id, products in sorted(category_stats.items(), key=lambda x: len(x[1]), reverse=True)[:10]:
-                cat_name = categories.get(cat_id, 'Nepoznata kategorija')
-                print(f"\n  {cat_name} ({len(products)} proizvoda):")
-                for product in products[:5]:
-                    print(f"    - SKU {product['sku']}: {product['name'][:60]}")
-                if len(products) > 5:
-                    print(f"    ... i još {len(products) - 5} proizvoda")
-
-        # Primjeri SKU sa slikama
-        if has_images:
-            print(f"\n✅ Primjeri SKU sa slikama:")
-            for product in has_images[:5]:
-                print(f"  - SKU {product['sku']}: {product['name'][:60]}")
-
-        cursor.close()
-        conn.close()
+                writer(summary, sys.stdout)
 
         # Export missing SKUs to file
-        if missing_images:
-            output_file = Path("scripts/missing_images_skus.txt")
-            with open(output_file, 'w') as f:
-                f.write("# SKU-ovi proizvoda bez slika\n")
-                f.write(f"# Ukupno: {len(missing_images)}\n\n")
-                for product in missing_images:
-                    f.write(f"{product['sku']}\t{product['name']}\n")
+        if missing_list and summary['missing_images']:
+            export_missing_skus(cursor, missing_list, summary['missing_images'])
+            log(f"\n💾 Lista SKU-ova spremljena u: {missing_list}")
 
-            print(f"\n💾 Lista SKU-ova spremljena u: {output_file}")
+        conn.commit()
+        cursor.close()
+        conn.close()
 
     except Exception as e:
-        print(f"\n❌ Greška: {str(e)}")
-
-    print("\n" + "=" * 80)
+        log(f"\n❌ Greška: {str(e)}")
+
+    log("\n" + "=" * 80)
+
+def main():
+    parser = argparse.ArgumentParser(description="Analiza proizvoda bez slika")
+    parser.add_argument(
+        "--format",
+        choices=["text", "json", "csv"],
+        default="text",
+        help="Format izvještaja (default: text)"
+    )
+    parser.add_argument("--output", type=Path, help="Putanja za JSON/CSV izvještaj (default: stdout)")
+    parser.add_argument("--top", type=int, default=10, help="Broj kategorija sa primjerima (default: 10)")
+    parser.add_argument("--examples", type=int, default=5, help="Broj primjera po kategoriji (default: 5)")
+    parser.add_argument(
+        "--missing-list",
+        type=Path,
+        default=MISSING_LIST_FILE,
+        help=f"Fajl za listu SKU-ova bez slika (default: {MISSING_LIST_FILE})"
+    )
+    parser.add_argument("--no-missing-list", action="store_true", help="Ne zapisuj listu SKU-ova bez slika")
+
+    args = parser.parse_args()
+
+    analyze_missing_images(
+        output_format=args.format,
+        output_path=args.output,
+        top=args.top,
+        examples=args.examples,
+        missing_list=None if args.no_missing_list else args.missing_list,
+    )
 
 if __name__ == "__main__":
-    analyze_missing_images()
+    main()
@@ -184,6 +184,136 @@ class CrossLinkEngine:
             print(f"  ✗ Greška pri kreiranju fitment: {e}")
             return None
 
+    # ===================================================================
+    # DRY-RUN PLANER (set-based)
+    # ===================================================================
+
+    async def plan_dry_run(self):
+        """
+        Izračunaj sve planirane fitmente bez per-row upita.
+
+        Proizvodi idu u staging tabelu dry_run_products, a jedan
+        INSERT ... SELECT puni dry_run_plan (isti izbor kao process_product:
+        za svaki TecDoc ID motora isključuje se generacija zadnjeg fitmenta
+        sa tim ID-om). CSV report se pravi direktno iz dry_run_plan (COPY).
+        """
+        await self.conn.execute("""
+            DROP TABLE IF EXISTS dry_run_products;
+            DROP TABLE IF EXISTS dry_run_plan;
+            CREATE TEMP TABLE dry_run_products (
+                id text PRIMARY KEY,
+                name text,
+                catalog_number text
+            );
+            CREATE TEMP TABLE dry_run_plan (
+                product_id text,
+                tecdoc_engine_id text,
+                generation_id text,
+                engine_id text,
+                brand text,
+                model text,
+                generation text,
+                engine_code text,
+                already_linked boolean,
+                planned_at timestamptz DEFAULT now()
+            );
+        """)
+
+        # Isti izbor kao get_products_with_fitments
+        await self.conn.execute("""
+            INSERT INTO dry_run_products (id, name, catalog_number)
+            SELECT p.id, p.name, p."catalogNumber"
+            FROM "Product" p
+            WHERE EXISTS (SELECT 1 FROM "ProductVehicleFitment" pvf WHERE pvf."productId" = p.id)
+              AND p."isArchived" = false
+              AND ($1::text IS NULL OR p.id = $1)
+        """, self.product_id)
+
+        await self.conn.execute("""
+            WITH source_engines AS (
+                -- process_product puni dict po TecDoc ID-u, pa pobjeđuje
+                -- zadnji fitment (ORDER BY ... DESC = obrnut redoslijed)
+                SELECT DISTINCT ON (pvf."productId", ve."externalId")
+                    pvf."productId" AS product_id,
+                    ve."externalId" AS tecdoc_id,
+                    pvf."generationId" AS original_generation_id
+                FROM "ProductVehicleFitment" pvf
+                INNER JOIN dry_run_products dp ON dp.id = pvf."productId"
+                INNER JOIN "VehicleEngine" ve ON pvf."engineId" = ve.id
+                LEFT JOIN "VehicleGeneration" vg ON pvf."generationId" = vg.id
+                LEFT JOIN "VehicleModel" vm ON vg."modelId" = vm.id
+                LEFT JOIN "VehicleBrand" vb ON vm."brandId" = vb.id
+                WHERE ve."externalId" IS NOT NULL AND ve."externalId" != ''
+                ORDER BY pvf."productId", ve."externalId",
+                         vb.name DESC, vm.name DESC, vg.name DESC, ve."engineCode" DESC
+            )
+            INSERT INTO dry_run_plan (
+                product_id, tecdoc_engine_id, generation_id, engine_id,
+                brand, model, generation, engine_code, already_linked
+            )
+            SELECT
+                se.product_id, se.tecdoc_id, vg.id, ve.id,
+                vb.name, vm.name, vg.name, ve."engineCode",
+                EXISTS (
+                    SELECT 1 FROM "ProductVehicleFitment" pvf
+                    WHERE pvf."productId" = se.product_id
+                      AND pvf."generationId" = vg.id
+                      AND pvf."engineId" IS NOT DISTINCT FROM ve.id
+                )
+            FROM source_engines se
+            INNER JOIN "VehicleEngine" ve ON ve."externalId" = se.tecdoc_id
+            INNER JOIN "VehicleGeneration" vg ON ve."generationId" = vg.id
+            INNER JOIN "VehicleModel" vm ON vg."modelId" = vm.id
+            INNER JOIN "VehicleBrand" vb ON vm."brandId" = vb.id
+            WHERE vg.id != se.original_generation_id
+        """)
+
+        scope = await self.conn.fetchrow("""
+            SELECT
+                COUNT(DISTINCT dp.id) AS products,
+                COUNT(ve."externalId") FILTER (WHERE ve."externalId" != '') AS engines
+            FROM dry_run_products dp
+            LEFT JOIN "ProductVehicleFitment" pvf ON pvf."productId" = dp.id
+            LEFT JOIN "VehicleEngine" ve ON pvf."engineId" = ve.id
+        """)
+        summary = await self.conn.fetchrow("""
+            SELECT
+                COUNT(*) AS matching,
+                COUNT(*) FILTER (WHERE NOT already_linked) AS planned,
+                COUNT(*) FILTER (WHERE already_linked) AS skipped
+            FROM dry_run_plan
+        """)
+
+        self.stats["total_products"] = scope["products"]
+        self.stats["products_with_fitments"] = scope["products"]
+        self.stats["engines_found"] = scope["engines"]
+        self.stats["matching_engines"] = summary["matching"]
+        self.stats["new_fitments_created"] = summary["planned"]
+        self.stats["skipped_duplicates"] = summary["skipped"]
+
+        print(f"\n📋 Planirano {summary['planned']} novih fitmenta za {scope['products']} proizvod(a)")
+
+        if self.report_path:
+            await self.conn.copy_from_query("""
+                SELECT
+                    to_char(pl.planned_at, 'YYYY-MM-DD"T"HH24:MI:SS.US') AS timestamp,
+                    pl.product_id,
+                    p.name AS product_name,
+                    p.catalog_number,
+                    'dry_run_created' AS action,
+                    pl.tecdoc_engine_id,
+                    pl.brand,
+                    pl.model,
+                    pl.generation,
+                    pl.engine_code,
+                    'Auto-linked by TecDoc ID' AS notes
+                FROM dry_run_plan pl
+                INNER JOIN dry_run_products p ON p.id = pl.product_id
+                WHERE NOT pl.already_linked
+                ORDER BY p.name, pl.product_id, pl.tecdoc_engine_id, pl.brand, pl.model, pl.generation
+            """, output=self.report_path, format='csv', header=True)
+            print(f"\n📄 Report upisano: {self.report_path} ({summary['planned']} redaka)")
+
     async def process_product(self, product: Dict) -> int:
         """
         Obradi jedan proizvod:
@@ -305,14 +435,15 @@ class CrossLinkEngine:
 
             if self.dry_run:
                 print("⚠️  DRY-RUN MODE - Bez stvarnih promjena u bazi")
+                await self.plan_dry_run()
+            else:
+                products = await self.get_products_with_fitments()
+                print(f"\n📋 Pronađen {self.stats['total_products']} proizvod(a) sa fitmentima")
 
-            products = await self.get_products_with_fitments()
-            print(f"\n📋 Pronađen {self.stats['total_products']} proizvod(a) sa fitmentima")
-
-            total_new = 0
-            for i, product in enumerate(products, 1):
-                new = await self.process_product(product)
-                total_new += new
+                total_new = 0
+                for i, product in enumerate(products, 1):
+                    new = await self.process_product(product)
+                    total_new += new
 
             print("\n" + "="*70)
             print("📊 STATISTIKA")
@@ -326,7 +457,7 @@ class CrossLinkEngine:
             print("="*70)
 
             # Ispis reporta
-            if self.report_path:
+            if self.report_path and not self.dry_run:
                 self._write_report()
 
         finally:
@@ -8,8 +8,11 @@ import sys
 sys.path.insert(0, '/Users/emir_mw/omerbasic/tecdoc-import-plan')
 
 from tecdoc_advanced_enrichment import TecDocAdvancedEnricher
+from tecdoc_normalize import PLACEHOLDER_PATTERNS
 import psycopg2
 
+PLACEHOLDER_SQL = ", ".join(f"'{value}'" for value, _ in PLACEHOLDER_PATTERNS)
+
 print("=" * 70)
 print("ANALIZA: OEM DATA QUALITY")
 print("=" * 70)
@@ -46,19 +49,8 @@ print("\n" + "=" * 70)
 print("2. PLACEHOLDER OEM VRIJEDNOSTI")
 print("=" * 70)
 
-# Definišemo placeholder vrijednosti
-placeholder_patterns = [
-    ("'0'", "Single zero"),
-    ("'00'", "Double zero"),
-    ("'000'", "Triple zero"),
-    ("'N/A'", "N/A"),
-    ("'NA'", "NA"),
-    ("'-'", "Dash"),
-    ("'/'", "Slash"),
-    ("'X'", "X"),
-    ("'XX'", "XX"),
-    ("'XXX'", "XXX"),
-]
+# Placeholder vrijednosti (iste koje koristi should_skip_oem_matching)
+placeholder_patterns = [(f"'{value}'", description) for value, description in PLACEHOLDER_PATTERNS]
 
 print("\nOEM Value | Count | Percentage | Description")
 print("-" * 70)
@@ -89,12 +81,12 @@ print("3. VALID OEM BROJEVI")
 print("=" * 70)
 
 # Valid OEM brojevi (dužina >= 5, nisu placeholder)
-query = """
+query = f"""
 SELECT COUNT(*)
 FROM "Product"
 WHERE "oemNumber" IS NOT NULL
   AND "oemNumber" != ''
-  AND "oemNumber" NOT IN ('0', '00', '000', 'N/A', 'NA', '-', '/', 'X', 'XX', 'XXX')
+  AND "oemNumber" NOT IN ({PLACEHOLDER_SQL})
   AND LENGTH("oemNumber") >= 5
 """
 cursor.execute(query)
@@ -143,24 +135,24 @@ cursor.execute('SELECT COUNT(*) FROM "Product" WHERE "tecdocArticleId" IS NOT NU
 products_with_tecdoc = cursor.fetchone()[0]
 
 # Sa TecDoc ID i valid OEM
-query = """
+query = f"""
 SELECT COUNT(*)
 FROM "Product"
 WHERE "tecdocArticleId" IS NOT NULL
   AND "oemNumber" IS NOT NULL
-  AND "oemNumber" NOT IN ('0', '00', '000', 'N/A', 'NA', '-', '/', 'X', 'XX', 'XXX')
+  AND "oemNumber" NOT IN ({PLACEHOLDER_SQL})
   AND LENGTH("oemNumber") >= 5
 """
 cursor.execute(query)
 tecdoc_with_valid_oem = cursor.fetchone()[0]
 
 # Sa TecDoc ID i placeholder OEM
-query = """
+query = f"""
 SELECT COUNT(*)
 FROM "Product"
 WHERE "tecdocArticleId" IS NOT NULL
   AND (
-    "oemNumber" IN ('0', '00', '000', 'N/A', 'NA', '-', '/', 'X', 'XX', 'XXX')
+    "oemNumber" IN ({PLACEHOLDER_SQL})
     OR LENGTH(COALESCE("oemNumber", '')) < 3
   )
 """
@@ -183,12 +175,12 @@ cursor.execute('SELECT COUNT(*) FROM "Product" WHERE "tecdocArticleId" IS NULL')
 products_without_tecdoc = cursor.fetchone()[0]
 
 # Bez TecDoc, sa validnim OEM (potencijal za OEM matching)
-query = """
+query = f"""
 SELECT COUNT(*)
 FROM "Product"
 WHERE "tecdocArticleId" IS NULL
   AND "oemNumber" IS NOT NULL
-  AND "oemNumber" NOT IN ('0', '00', '000', 'N/A', 'NA', '-', '/', 'X', 'XX', 'XXX')
+  AND "oemNumber" NOT IN ({PLACEHOLDER_SQL})
   AND LENGTH("oemNumber") >= 5
 """
 cursor.execute(query)
@@ -206,13 +198,13 @@ cursor.execute(query)
 no_tecdoc_with_ean = cursor.fetchone()[0]
 
 # Bez TecDoc, bez valid podataka za matching
-query = """
+query = f"""
 SELECT COUNT(*)
 FROM "Product"
 WHERE "tecdocArticleId" IS NULL
   AND (
     "oemNumber" IS NULL
-    OR "oemNumber" IN ('0', '00', '000', 'N/A', 'NA', '-', '/', 'X', 'XX', 'XXX')
+    OR "oemNumber" IN ({PLACEHOLDER_SQL})
     OR LENGTH("oemNumber") < 5
   )
   AND ("eanCode" IS NULL OR "eanCode" = '')
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Checkpoint Journal
+
+Append-only checkpoint store for long-running enrichment scripts.
+
+Layout (for checkpoint_file = 'x_checkpoint.json'):
+    x_checkpoint.json          - snapshot (same JSON format as before:
+                                 processed_products, failed_products, stats)
+    x_checkpoint.json.journal  - one JSON line per event since the snapshot
+
+Every mark_processed / mark_failed appends one short line (constant cost,
+independent of how many products were already processed). save() only
+flushes + fsyncs the journal; once the journal grows past
+compact_every lines it is folded into a new snapshot, written to a temp
+file and atomically swapped in with os.replace.
+
+Recovery: snapshot is loaded, then the journal is replayed. A torn last
+line (crash mid-write) is ignored, so the checkpoint is never corrupted.
+
+Usage:
+    from checkpoint_journal import CheckpointJournal
+
+    checkpoint = CheckpointJournal('my_enrichment_checkpoint.json')
+    if not checkpoint.is_processed(product_id):
+        ...
+        checkpoint.mark_processed(product_id)
+    checkpoint.save()
+"""
+
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Dict
+
+
+class CheckpointJournal:
+    """Append-only checkpoint (snapshot + journal) with resume support"""
+
+    def __init__(self, checkpoint_file: str, compact_every: int = 50000):
+        self.checkpoint_file = checkpoint_file
+        self.journal_file = checkpoint_file + '.journal'
+        self.compact_every = compact_every
+
+        self.processed_products = set()
+        self.failed_products: Dict[str, Dict] = {}
+        self.stats = {}
+
+        self._journal = None
+        self._journal_lines = 0
+        self.load()
+
+    # ===================================================================
+    # LOAD / RECOVERY
+    # ===================================================================
+
+    def load(self):
+        """Load snapshot and replay journal"""
+        try:
+            with open(self.checkpoint_file, 'r') as f:
+                data = json.load(f)
+                self.processed_products = set(data.get('processed_products', []))
+                self.failed_products = data.get('failed_products', {})
+                self.stats = data.get('stats', {})
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.error(f"Error loading checkpoint snapshot: {e}")
+
+        replayed = self._replay_journal()
+
+        if self.processed_products or self.failed_products:
+            logging.info(f"📋 Checkpoint loaded: {len(self.processed_products)} products already processed "
+                         f"({replayed} journal entries replayed)")
+        else:
+            logging.info("📋 No checkpoint found, starting fresh")
+
+    def _replay_journal(self) -> int:
+        replayed = 0
+        good_offset = 0
+        torn = False
+        try:
+            with open(self.journal_file, 'rb') as f:
+                for line in f:
+                    try:
+                        if not line.endswith(b'\n'):
+                            raise ValueError('incomplete line')
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Torn write (crash usred linije) - ostatak se odbacuje
+                        torn = True
+                        break
+                    self._apply(entry)
+                    replayed += 1
+                    good_offset += len(line)
+        except FileNotFoundError:
+            return 0
+
+        if torn:
+            logging.warning(f"⚠️  Dropping incomplete checkpoint journal tail (after {replayed} entries)")
+            with open(self.journal_file, 'r+b') as f:
+                f.truncate(good_offset)
+
+        self._journal_lines = replayed
+        return replayed
+
+    def _apply(self, entry: Dict):
+        op = entry.get('op')
+        if op == 'processed':
+            self.processed_products.add(entry['id'])
+        elif op == 'failed':
+            self.failed_products[entry['id']] = {
+                'error': entry.get('error'),
+                'timestamp': entry.get('timestamp')
+            }
+        elif op == 'stats':
+            self.stats = entry.get('stats', {})
+
+    # ===================================================================
+    # WRITES (O(1))
+    # ===================================================================
+
+    def _append(self, entry: Dict):
+        if self._journal is None:
+            self._journal = open(self.journal_file, 'a')
+        self._journal.write(json.dumps(entry, separators=(',', ':')) + '\n')
+        self._journal.flush()
+        self._journal_lines += 1
+
+    def mark_processed(self, product_id: str):
+        """Mark product as successfully processed"""
+        if product_id in self.processed_products:
+            return
+        self.processed_products.add(product_id)
+        self._append({'op': 'processed', 'id': product_id})
+
+    def mark_failed(self, product_id: str, error: str):
+        """Mark product as failed with error message"""
+        timestamp = datetime.now().isoformat()
+        self.failed_products[product_id] = {
+            'error': str(error),
+            'timestamp': timestamp
+        }
+        self._append({'op': 'failed', 'id': product_id, 'error': str(error), 'timestamp': timestamp})
+
+    def is_processed(self, product_id: str) -> bool:
+        """Check if product was already processed (successfully or failed)"""
+        return (product_id in self.processed_products or
+                product_id in self.failed_products)
+
+    def update_stats(self, stats: dict):
+        """Update stats in checkpoint"""
+        self.stats = dict(stats)
+        self._append({'op': 'stats', 'stats': self.stats})
+
+    def save(self):
+        """Make journal durable (fsync); compact when it gets large"""
+        try:
+            if self._journal is not None:
+                self._journal.flush()
+                os.fsync(self._journal.fileno())
+            if self._journal_lines >= self.compact_every:
+                self.compact()
+        except Exception as e:
+            logging.error(f"Error saving checkpoint: {e}")
+
+    # ===================================================================
+    # COMPACTION
+    # ===================================================================
+
+    def compact(self):
+        """Fold journal into a new snapshot (atomic replace), then truncate journal"""
+        data = {
+            'processed_products': list(self.processed_products),
+            'failed_products': self.failed_products,
+            'stats': self.stats,
+            'last_updated': datetime.now().isoformat()
+        }
+        tmp_file = self.checkpoint_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.checkpoint_file)
+
+        # Snapshot sadrži sve iz journala - tek sada ga je sigurno isprazniti
+        self.close()
+        with open(self.journal_file, 'w'):
+            pass
+        self._journal_lines = 0
+        logging.info(f"🗜️  Checkpoint compacted ({len(self.processed_products)} products)")
+
+    def close(self):
+        """Close journal file handle"""
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def clear(self):
+        """Clear checkpoint (start fresh)"""
+        self.close()
+        self.processed_products = set()
+        self.failed_products = {}
+        self.stats = {}
+        self._journal_lines = 0
+        try:
+            removed = False
+            for path in (self.checkpoint_file, self.journal_file):
+                if os.path.exists(path):
+                    os.remove(path)
+                    removed = True
+            if removed:
+                logging.info("✅ Checkpoint cleared")
+        except Exception as e:
+            logging.error(f"Error clearing checkpoint: {e}")
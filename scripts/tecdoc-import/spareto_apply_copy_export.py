@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Apply a Spareto COPY export (spareto_vehicle_enrichment.py -o file.sql --format copy)
+
+The exporter writes COPY-ready CSV files with IDs already resolved during the
+run. This script loads them through temp staging tables (COPY FROM STDIN) and
+applies each table with one set-based statement, all in one transaction:
+
+    --step enrichment (default)
+        <base>_oem_numbers.csv        → ArticleOENumber (ON CONFLICT DO NOTHING)
+        <base>_fitments.csv           → ProductVehicleFitment (only missing keys)
+        <base>_enriched_products.csv  → Product."sparetoEnrichedAt" = NOW()
+
+    --step link   (after adding vehicles from *_missing_vehicles_template.sql)
+        <base>_link_products.csv      → ProductVehicleFitment; every distinct
+                                        brand/model/generation and engine is
+                                        resolved once with a join, instead of
+                                        nested subqueries per fitment
+
+Usage:
+    python3 spareto_apply_copy_export.py spareto_enrichment
+    python3 spareto_apply_copy_export.py spareto_enrichment.sql --step link
+    python3 spareto_apply_copy_export.py spareto_enrichment --dry-run
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+import psycopg2
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+PG_CONNECTION = os.getenv('DATABASE_URL', 'postgresql://emir_mw@localhost:5432/omerbasicdb')
+
+# name -> staging table definition (columns in the same order as the CSV header)
+STAGING_TABLES = {
+    'oem_numbers': """
+        CREATE TEMP TABLE stage_oem_numbers (
+            product_id text,
+            oem_number text,
+            manufacturer text,
+            reference_type text
+        ) ON COMMIT DROP
+    """,
+    'fitments': """
+        CREATE TEMP TABLE stage_fitments (
+            product_id text,
+            generation_id text,
+            engine_id text,
+            year_from integer,
+            year_to integer
+        ) ON COMMIT DROP
+    """,
+    'enriched_products': """
+        CREATE TEMP TABLE stage_enriched_products (
+            product_id text
+        ) ON COMMIT DROP
+    """,
+    'link_products': """
+        CREATE TEMP TABLE stage_link_products (
+            product_id text,
+            catalog_number text,
+            brand text,
+            model text,
+            gen_codes text,
+            engine_desc text,
+            year_from integer,
+            year_to integer
+        ) ON COMMIT DROP
+    """,
+}
+
+APPLY_OEM_NUMBERS = """
+    INSERT INTO "ArticleOENumber" (
+        id, "productId", "oemNumber", manufacturer, "referenceType", "createdAt", "updatedAt"
+    )
+    SELECT DISTINCT ON (s.product_id, s.oem_number)
+        gen_random_uuid()::text, s.product_id, s.oem_number, s.manufacturer,
+        COALESCE(s.reference_type, 'Original'), NOW(), NOW()
+    FROM stage_oem_numbers s
+    JOIN "Product" p ON p.id = s.product_id
+    ORDER BY s.product_id, s.oem_number
+    ON CONFLICT ("productId", "oemNumber") DO NOTHING
+"""
+
+# engineId NULL ne pravi konflikt na unique indeksu - zato NOT EXISTS
+APPLY_FITMENTS = """
+    INSERT INTO "ProductVehicleFitment" (
+        id, "productId", "generationId", "engineId", "yearFrom", "yearTo",
+        "createdAt", "updatedAt"
+    )
+    SELECT DISTINCT ON (s.product_id, s.generation_id, s.engine_id)
+        gen_random_uuid()::text, s.product_id, s.generation_id, s.engine_id,
+        s.year_from, s.year_to, NOW(), NOW()
+    FROM stage_fitments s
+    JOIN "Product" p ON p.id = s.product_id
+    JOIN "VehicleGeneration" vg ON vg.id = s.generation_id
+    WHERE NOT EXISTS (
+        SELECT 1 FROM "ProductVehicleFitment" f
+        WHERE f."productId" = s.product_id
+          AND f."generationId" = s.generation_id
+          AND f."engineId" IS NOT DISTINCT FROM s.engine_id
+    )
+    ORDER BY s.product_id, s.generation_id, s.engine_id
+    ON CONFLICT ("productId", "generationId", "engineId") DO NOTHING
+"""
+
+APPLY_ENRICHED_PRODUCTS = """
+    UPDATE "Product" p
+    SET "sparetoEnrichedAt" = NOW()
+    FROM (SELECT DISTINCT product_id FROM stage_enriched_products) s
+    WHERE p.id = s.product_id
+"""
+
+# Isti redoslijed kao stari nested subquery-ji (brand → model → generation
+# po imenu, engine po engineCode, LIMIT 1), ali jednom po distinct ključu
+RESOLVE_LINK_PRODUCTS = """
+    CREATE TEMP TABLE stage_link_resolved ON COMMIT DROP AS
+    WITH generations AS (
+        SELECT k.brand, k.model, k.gen_codes, g.id AS generation_id
+        FROM (SELECT DISTINCT brand, model, gen_codes FROM stage_link_products) k
+        JOIN LATERAL (
+            SELECT vg.id
+            FROM "VehicleGeneration" vg
+            JOIN "VehicleModel" vm ON vm.id = vg."modelId"
+            JOIN "VehicleBrand" vb ON vb.id = vm."brandId"
+            WHERE vg.name = k.gen_codes
+              AND LOWER(vm.name) = LOWER(k.model)
+              AND LOWER(vb.name) = LOWER(k.brand)
+            LIMIT 1
+        ) g ON TRUE
+    ),
+    engines AS (
+        SELECT k.generation_id, k.engine_desc, e.id AS engine_id
+        FROM (
+            SELECT DISTINCT g.generation_id, l.engine_desc
+            FROM stage_link_products l
+            JOIN generations g USING (brand, model, gen_codes)
+        ) k
+        JOIN LATERAL (
+            SELECT ve.id
+            FROM "VehicleEngine" ve
+            WHERE ve."generationId" = k.generation_id
+              AND ve."engineCode" = k.engine_desc
+            LIMIT 1
+        ) e ON TRUE
+    )
+    SELECT
+        l.product_id,
+        g.generation_id,
+        e.engine_id,
+        l.year_from,
+        l.year_to
+    FROM stage_link_products l
+    LEFT JOIN generations g USING (brand, model, gen_codes)
+    LEFT JOIN engines e
+        ON e.generation_id = g.generation_id
+       AND e.engine_desc = l.engine_desc
+"""
+
+APPLY_LINK_PRODUCTS = """
+    INSERT INTO "ProductVehicleFitment" (
+        id, "productId", "generationId", "engineId", "yearFrom", "yearTo",
+        "createdAt", "updatedAt"
+    )
+    SELECT DISTINCT ON (r.product_id, r.generation_id, r.engine_id)
+        gen_random_uuid()::text, r.product_id, r.generation_id, r.engine_id,
+        r.year_from, r.year_to, NOW(), NOW()
+    FROM stage_link_resolved r
+    JOIN "Product" p ON p.id = r.product_id
+    WHERE r.generation_id IS NOT NULL
+      AND NOT EXISTS (
+          SELECT 1 FROM "ProductVehicleFitment" f
+          WHERE f."productId" = r.product_id
+            AND f."generationId" = r.generation_id
+            AND f."engineId" IS NOT DISTINCT FROM r.engine_id
+      )
+    ORDER BY r.product_id, r.generation_id, r.engine_id
+    ON CONFLICT ("productId", "generationId", "engineId") DO NOTHING
+"""
+
+
+def export_base(path: str) -> str:
+    """spareto_enrichment.sql / spareto_enrichment → spareto_enrichment"""
+    return os.path.splitext(path)[0] if path.endswith('.sql') else path
+
+
+def load_staging(cursor, base: str, name: str) -> int:
+    """CREATE staging tabele + COPY FROM STDIN iz <base>_<name>.csv"""
+    path = f"{base}_{name}.csv"
+    cursor.execute(STAGING_TABLES[name])
+    if not os.path.exists(path):
+        logger.warning(f"⚠ Nema fajla {path} - preskačem")
+        return 0
+
+    with open(path, 'r', encoding='utf-8') as f:
+        cursor.copy_expert(f"COPY stage_{name} FROM STDIN WITH CSV HEADER", f)
+    cursor.execute(f"SELECT COUNT(*) FROM stage_{name}")
+    rows = cursor.fetchone()[0]
+    logger.info(f"  ✓ {path}: {rows} rows staged")
+    return rows
+
+
+def apply_enrichment(cursor, base: str) -> dict:
+    """OEM brojevi, fitmenti i sparetoEnrichedAt iz jednog exporta"""
+    stats = {}
+
+    stats['oem_numbers_staged'] = load_staging(cursor, base, 'oem_numbers')
+    cursor.execute(APPLY_OEM_NUMBERS)
+    stats['oem_numbers_inserted'] = cursor.rowcount
+
+    stats['fitments_staged'] = load_staging(cursor, base, 'fitments')
+    cursor.execute(APPLY_FITMENTS)
+    stats['fitments_inserted'] = cursor.rowcount
+
+    stats['products_staged'] = load_staging(cursor, base, 'enriched_products')
+    cursor.execute(APPLY_ENRICHED_PRODUCTS)
+    stats['products_marked'] = cursor.rowcount
+
+    return stats
+
+
+def apply_link(cursor, base: str) -> dict:
+    """Linkovanje proizvoda sa naknadno dodanim vozilima (po imenima)"""
+    stats = {'links_staged': load_staging(cursor, base, 'link_products')}
+
+    cursor.execute(RESOLVE_LINK_PRODUCTS)
+    cursor.execute("""
+        SELECT
+            COUNT(*) FILTER (WHERE generation_id IS NULL),
+            COUNT(*) FILTER (WHERE generation_id IS NOT NULL AND engine_id IS NULL)
+        FROM stage_link_resolved
+    """)
+    stats['links_unresolved_generation'], stats['links_without_engine'] = cursor.fetchone()
+
+    cursor.execute(APPLY_LINK_PRODUCTS)
+    stats['fitments_inserted'] = cursor.rowcount
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Primjeni Spareto COPY export (CSV) na PostgreSQL')
+    parser.add_argument('export', help='Export base ili .sql ime dato sa -o (npr. spareto_enrichment.sql)')
+    parser.add_argument('--step', choices=['enrichment', 'link'], default='enrichment',
+                        help='enrichment: OEM + fitmenti + sparetoEnrichedAt; '
+                             'link: *_link_products.csv (nakon dodavanja vozila)')
+    parser.add_argument('--dry-run', action='store_true', help='Sve izvrši pa rollback (samo statistika)')
+    args = parser.parse_args()
+
+    base = export_base(args.export)
+
+    logger.info("=" * 70)
+    logger.info(f"SPARETO COPY EXPORT → PostgreSQL [{args.step}]{' [DRY RUN]' if args.dry_run else ''}")
+    logger.info("=" * 70)
+
+    try:
+        conn = psycopg2.connect(PG_CONNECTION)
+    except psycopg2.Error as e:
+        logger.error(f"✗ Greška pri spajanju PostgreSQL: {e}")
+        return 1
+
+    started = time.perf_counter()
+    cursor = conn.cursor()
+    try:
+        if args.step == 'link':
+            stats = apply_link(cursor, base)
+        else:
+            stats = apply_enrichment(cursor, base)
+
+        if args.dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+    except (psycopg2.Error, OSError) as e:
+        logger.error(f"✗ Greška - ništa nije primijenjeno: {e}")
+        conn.rollback()
+        return 1
+    finally:
+        cursor.close()
+        conn.close()
+
+    logger.info("\n" + "=" * 70)
+    logger.info(f"REZULTATI ({time.perf_counter() - started:.1f}s)")
+    logger.info("=" * 70)
+    for key, value in stats.items():
+        logger.info(f"  {key}: {value}")
+    if args.dry_run:
+        logger.info("\n⚠ DRY RUN - rollback, baza nije promijenjena")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,8 +3,19 @@
 Spareto Vehicle Enrichment Script
 
 Enriches products with OEM numbers and vehicle fitments from spareto.com
+
+Output modes:
+    (default)              write directly to the database
+    -o file.sql            SQL file with INSERT statements
+    -o file.sql --format copy
+                           COPY-ready CSV files (IDs resolved during the run),
+                           applied with spareto_apply_copy_export.py through
+                           staging tables
 """
 
+import csv
+import io
+import os
 import requests
 from bs4 import BeautifulSoup
 import time
@@ -18,6 +29,10 @@ from datetime import datetime
 from urllib.parse import urlparse
 from functools import wraps
 
+from checkpoint_journal import CheckpointJournal
+from tecdoc_db import ArticleOENumberWriter
+from tecdoc_metrics import add_metrics_argument, metrics
+
 # Setup logging
 logging.basicConfig(
     level=logging.DEBUG,  # Changed to DEBUG for detailed vehicle matching
@@ -121,6 +136,7 @@ def retry_with_backoff(max_retries=3, initial_delay=2, backoff_factor=2, excepti
                     return func(*args, **kwargs)
                 except exceptions as e:
                     last_exception = e
+                    metrics.count(f"retry.{func.__name__}")
                     if attempt < max_retries:
                         logging.warning(f"  Attempt {attempt + 1}/{max_retries + 1} failed: {e}")
                         logging.warning(f"  Retrying in {delay}s...")
@@ -135,76 +151,16 @@ def retry_with_backoff(max_retries=3, initial_delay=2, backoff_factor=2, excepti
         return wrapper
     return decorator
 
-class CheckpointManager:
-    """Manages checkpoints for resume functionality"""
-
-    def __init__(self, checkpoint_file: str = 'spareto_enrichment_checkpoint.json'):
-        self.checkpoint_file = checkpoint_file
-        self.processed_products = set()
-        self.failed_products = {}
-        self.stats = {}
-        self.load()
-
-    def load(self):
-        """Load checkpoint from file"""
-        try:
-            with open(self.checkpoint_file, 'r') as f:
-                data = json.load(f)
-                self.processed_products = set(data.get('processed_products', []))
-                self.failed_products = data.get('failed_products', {})
-                self.stats = data.get('stats', {})
-                logging.info(f"📋 Checkpoint loaded: {len(self.processed_products)} products already processed")
-        except FileNotFoundError:
-            logging.info(f"📋 No checkpoint found, starting fresh")
-        except Exception as e:
-            logging.error(f"Error loading checkpoint: {e}")
-
-    def save(self):
-        """Save checkpoint to file"""
-        try:
-            data = {
-                'processed_products': list(self.processed_products),
-                'failed_products': self.failed_products,
-                'stats': self.stats,
-                'last_updated': datetime.now().isoformat()
-            }
-            with open(self.checkpoint_file, 'w') as f:
-                json.dump(data, f, indent=2)
-        except Exception as e:
-            logging.error(f"Error saving checkpoint: {e}")
-
-    def mark_processed(self, product_id: str):
-        """Mark product as successfully processed"""
-        self.processed_products.add(product_id)
-
-    def mark_failed(self, product_id: str, error: str):
-        """Mark product as failed with error message"""
-        self.failed_products[product_id] = {
-            'error': str(error),
-            'timestamp': datetime.now().isoformat()
-        }
-
-    def is_processed(self, product_id: str) -> bool:
-        """Check if product was already processed (successfully or failed)"""
-        return (product_id in self.processed_products or
-                product_id in self.failed_products)
+class CheckpointManager(CheckpointJournal):
+    """
+    Manages checkpoints for resume functionality
 
-    def update_stats(self, stats: dict):
-        """Update stats in checkpoint"""
-        self.stats = stats
+    Append-only journal (see checkpoint_journal.py): mark_* calls cost O(1)
+    and survive a crash; save() fsyncs and periodically compacts.
+    """
 
-    def clear(self):
-        """Clear checkpoint (start fresh)"""
-        self.processed_products = set()
-        self.failed_products = {}
-        self.stats = {}
-        try:
-            import os
-            if os.path.exists(self.checkpoint_file):
-                os.remove(self.checkpoint_file)
-                logging.info(f"✅ Checkpoint cleared")
-        except Exception as e:
-            logging.error(f"Error clearing checkpoint: {e}")
+    def __init__(self, checkpoint_file: str = 'spareto_enrichment_checkpoint.json'):
+        super().__init__(checkpoint_file)
 
 def validate_url(url: str, allowed_domain: str = "spareto.com") -> bool:
     """
@@ -228,8 +184,141 @@ def sql_escape(value: str) -> str:
         return 'NULL'
     return value.replace("'", "''")
 
+def write_copy_csv(path: str, header: Tuple[str, ...], rows) -> int:
+    """
+    Write rows as CSV for COPY ... FROM STDIN WITH CSV HEADER
+
+    None is written as an empty unquoted field, which COPY reads as NULL.
+    Returns the number of rows written.
+    """
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+# COPY export files: name -> CSV header (spareto_apply_copy_export.py reads the same files)
+COPY_EXPORT_COLUMNS = {
+    'oem_numbers': ('productId', 'oemNumber', 'manufacturer', 'referenceType'),
+    'fitments': ('productId', 'generationId', 'engineId', 'yearFrom', 'yearTo'),
+    'enriched_products': ('productId',),
+    'link_products': ('productId', 'catalogNumber', 'brand', 'model', 'genCodes',
+                      'engineDesc', 'yearFrom', 'yearTo'),
+}
+
+# Spareto_UnmatchedVehicles: review table for vehicles that don't exist in our database
+UNMATCHED_TABLE_DDL = """
+CREATE TABLE IF NOT EXISTS "Spareto_UnmatchedVehicles" (
+  id TEXT PRIMARY KEY DEFAULT gen_random_uuid()::text,
+  "productId" TEXT NOT NULL,
+  "catalogNumber" TEXT,
+  brand TEXT NOT NULL,
+  model TEXT NOT NULL,
+  "genCodes" TEXT[] NOT NULL,
+  "vehicleString" TEXT NOT NULL,
+  "engineDesc" TEXT,
+  "yearFrom" INTEGER,
+  "yearTo" INTEGER,
+  "powerKW" INTEGER,
+  "capacityCCM" INTEGER,
+  "scrapedAt" TIMESTAMP DEFAULT NOW(),
+  "createdAt" TIMESTAMP DEFAULT NOW()
+);
+
+-- Indexes for faster querying
+CREATE INDEX IF NOT EXISTS idx_unmatched_brand ON "Spareto_UnmatchedVehicles" (brand);
+CREATE INDEX IF NOT EXISTS idx_unmatched_model ON "Spareto_UnmatchedVehicles" (brand, model);
+CREATE INDEX IF NOT EXISTS idx_unmatched_product ON "Spareto_UnmatchedVehicles" ("productId");
+CREATE INDEX IF NOT EXISTS idx_unmatched_catalog ON "Spareto_UnmatchedVehicles" ("catalogNumber");
+"""
+
+UNMATCHED_COLUMNS = ('productId', 'catalogNumber', 'brand', 'model', 'genCodes', 'vehicleString',
+                     'engineDesc', 'yearFrom', 'yearTo', 'powerKW', 'capacityCCM')
+
+def pg_text_array(values: List[str]) -> str:
+    """['8P1', '8PA'] -> {"8P1","8PA"} (PostgreSQL array literal for COPY)"""
+    quoted = ('"' + v.replace('\\', '\\\\').replace('"', '\\"') + '"' for v in values)
+    return '{' + ','.join(quoted) + '}'
+
+def parse_pg_text_array(literal: str) -> List[str]:
+    """Inverse of pg_text_array"""
+    return [re.sub(r'\\(.)', r'\1', v) for v in re.findall(r'"((?:[^"\\]|\\.)*)"', literal)]
+
+class UnmatchedVehicleAggregator:
+    """
+    Incremental brand/model/gen-code aggregation of unmatched vehicles
+
+    Per generation only counters, distinct engine variants (capped) and a few
+    example strings are kept for the whole run. Raw per-product rows wait in
+    `pending` until the next checkpoint flush (COPY to Spareto_UnmatchedVehicles
+    or append to the unmatched CSV), so memory stays bounded on long runs.
+    """
+
+    def __init__(self, sample_size: int = 3, max_engines: int = 100):
+        self.sample_size = sample_size
+        self.max_engines = max_engines
+        self.groups: Dict[Tuple[str, str, str], Dict] = {}
+        self.pending: List[Tuple] = []
+        self.total = 0
+        self.flushed = 0
+
+    def add(self, product_id: str, catalog_number: str, vehicle_str: str, parsed: Dict):
+        """Count one unmatched vehicle and queue its row for the next flush"""
+        key = (parsed['brand'], parsed['model'], ', '.join(parsed['gen_codes']))
+        group = self.groups.get(key)
+        if group is None:
+            group = self.groups[key] = {
+                'gen_codes': list(parsed['gen_codes']),
+                'year_range': f"{parsed['year_from']}-{parsed['year_to']}",
+                'count': 0,
+                'examples': [],
+                'engines': {},
+                'engines_dropped': 0,
+            }
+
+        group['count'] += 1
+        if len(group['examples']) < self.sample_size:
+            group['examples'].append(vehicle_str)
+
+        engine_key = (parsed['engine_desc'], parsed['power_kw'], parsed['capacity_ccm'])
+        if engine_key not in group['engines']:
+            if len(group['engines']) < self.max_engines:
+                group['engines'][engine_key] = {
+                    'engine_desc': parsed['engine_desc'],
+                    'year_from': parsed['year_from'],
+                    'year_to': parsed['year_to'],
+                    'power_kw': parsed['power_kw'],
+                    'capacity_ccm': parsed['capacity_ccm'],
+                }
+            else:
+                group['engines_dropped'] += 1
+
+        self.pending.append((
+            product_id, catalog_number, parsed['brand'], parsed['model'], group['gen_codes'],
+            vehicle_str, parsed['engine_desc'], parsed['year_from'], parsed['year_to'],
+            parsed['power_kw'], parsed['capacity_ccm'],
+        ))
+        self.total += 1
+
+    def take_pending(self) -> List[Tuple]:
+        """Hand over queued rows (UNMATCHED_COLUMNS order) and forget them"""
+        rows, self.pending = self.pending, []
+        self.flushed += len(rows)
+        return rows
+
+    def by_brand(self) -> Dict[str, Dict[str, Dict[str, Dict]]]:
+        """{brand: {model: {gen_codes_key: group}}}"""
+        grouped: Dict[str, Dict[str, Dict[str, Dict]]] = {}
+        for (brand, model, gen_codes_key), group in self.groups.items():
+            grouped.setdefault(brand, {}).setdefault(model, {})[gen_codes_key] = group
+        return grouped
+
 class SparetoEnricher:
-    def __init__(self, db_conn_string: str, output_file: Optional[str] = None, enable_checkpoint: bool = True):
+    def __init__(self, db_conn_string: str, output_file: Optional[str] = None, enable_checkpoint: bool = True,
+                 export_format: str = 'sql', metrics_out: Optional[str] = None):
         """
         Initialize with database connection
 
@@ -237,6 +326,8 @@ class SparetoEnricher:
             db_conn_string: PostgreSQL connection string
             output_file: If provided, writes SQL to file instead of executing
             enable_checkpoint: Enable checkpoint for resume functionality
+            export_format: 'sql' (INSERT statements) or 'copy' (COPY-ready CSV files)
+            metrics_out: Run metrics export (*.prom or *.json, see tecdoc_metrics.py)
         """
         self.base_url = "https://spareto.com"
         self.search_url = f"{self.base_url}/products"
@@ -248,6 +339,16 @@ class SparetoEnricher:
         self.sql_statements = []
         self.enriched_product_ids = []
 
+        # COPY export: resolved rows are kept raw and written as CSV at the end
+        self.export_format = export_format
+        self.export_rows = {'oem_numbers': [], 'fitments': []}
+
+        self.metrics_out = metrics_out
+
+        # OEM brojevi se skupljaju kroz batch i pišu jednim upsert-om (flush_batch)
+        self.oem_writer = ArticleOENumberWriter(overwrite=False)
+        self.pending_product_ids = []
+
         # Checkpoint manager for resume functionality
         self.enable_checkpoint = enable_checkpoint
         self.checkpoint = CheckpointManager() if enable_checkpoint else None
@@ -281,14 +382,19 @@ class SparetoEnricher:
             'skipped_no_match': 0
         }
 
-        # Track unmatched vehicles for later review
-        self.unmatched_vehicles = []
+        # Track unmatched vehicles for later review (aggregated, flushed at checkpoints)
+        self.unmatched = UnmatchedVehicleAggregator()
+        self._unmatched_table_ready = False
+        self._unmatched_csv_started = False
 
-        if self.sql_mode:
+        if self.sql_mode and export_format == 'copy':
+            logging.info(f"🔧 COPY EXPORT MODE: Will write CSV files next to {output_file}")
+        elif self.sql_mode:
             logging.info(f"🔧 SQL MODE: Will write statements to {output_file}")
         else:
             logging.info(f"💾 DATABASE MODE: Will write directly to database")
 
+    @metrics.timed('db')
     def _load_brand_aliases(self) -> Dict[str, str]:
         """
         Load vehicle brands from database and create comprehensive alias mapping
@@ -382,7 +488,8 @@ class SparetoEnricher:
     def search_product(self, catalog_number: str) -> Optional[str]:
         """Search for product and return product URL (with automatic retry)"""
         try:
-            time.sleep(self.crawl_delay)
+            with metrics.span('http.crawl_delay'):
+                time.sleep(self.crawl_delay)
 
             # Security: Sanitize catalog number
             catalog_number = sanitize_string(catalog_number, max_length=100)
@@ -391,16 +498,18 @@ class SparetoEnricher:
                 return None
 
             logging.info(f"Searching for: {catalog_number}")
-            response = requests.get(
-                self.search_url,
-                params={'keywords': catalog_number},
-                headers=self.headers,
-                timeout=self.timeout,
-                verify=self.verify_ssl  # Security: Verify SSL certificates
-            )
-            response.raise_for_status()
+            with metrics.span('http.search'):
+                response = requests.get(
+                    self.search_url,
+                    params={'keywords': catalog_number},
+                    headers=self.headers,
+                    timeout=self.timeout,
+                    verify=self.verify_ssl  # Security: Verify SSL certificates
+                )
+                response.raise_for_status()
 
-            soup = BeautifulSoup(response.content, 'html.parser')
+            with metrics.span('parse.search_page'):
+                soup = BeautifulSoup(response.content, 'html.parser')
 
             # Find product link
             product_link = soup.find('a', href=lambda x: x and '/products/' in x)
@@ -425,6 +534,7 @@ class SparetoEnricher:
             logging.error(f"  Error searching: {e}")
             return None
 
+    @metrics.timed('parse')
     def extract_oem_numbers(self, soup: BeautifulSoup) -> List[Dict[str, str]]:
         """Extract OEM numbers from product page (Spareto specific format)"""
         oem_numbers = []
@@ -496,6 +606,7 @@ class SparetoEnricher:
             logging.error(f"  Error extracting OEM numbers: {e}")
             return []
 
+    @metrics.timed('parse')
     def extract_vehicles(self, soup: BeautifulSoup) -> List[str]:
         """Extract vehicle compatibility list from Spareto table format"""
         vehicles = []
@@ -564,6 +675,7 @@ class SparetoEnricher:
             logging.error(f"  Error extracting vehicles: {e}")
             return []
 
+    @metrics.timed('parse')
     def parse_vehicle_string(self, vehicle_str: str) -> Optional[Dict]:
         """
         Parse Spareto table format with comprehensive pattern matching:
@@ -717,6 +829,7 @@ class SparetoEnricher:
             logging.error(f"  Error parsing vehicle string '{vehicle_str}': {e}")
             return None
 
+    @metrics.timed('db')
     def find_generation(self, brand: str, model: str, gen_codes: List[str]) -> Optional[str]:
         """Find matching generation ID in database (with brand alias support and fuzzy matching)"""
         try:
@@ -779,6 +892,7 @@ class SparetoEnricher:
             logging.error(f"  Error finding generation: {e}")
             return None
 
+    @metrics.timed('db')
     def find_engine(self, generation_id: str, engine_desc: str, power_kw: Optional[int] = None,
                    capacity_ccm: Optional[int] = None) -> Optional[str]:
         """Find matching engine ID in database"""
@@ -849,40 +963,88 @@ class SparetoEnricher:
             return None
 
     def insert_oem_number(self, product_id: str, oem_number: str, manufacturer: Optional[str] = None):
-        """Insert OEM number if not exists (or add to SQL statements)"""
+        """Buffer OEM number for the batch upsert (written by flush_batch)"""
+        return self.oem_writer.add(product_id, oem_number, manufacturer)
+
+    @metrics.timed('write')
+    def flush_batch(self):
+        """
+        Write buffered OEM numbers with one statement and commit pending products.
+
+        DB mode: OEM upsert + sparetoEnrichedAt update + commit in one transaction,
+        products are marked processed in checkpoint only after the commit.
+        SQL mode: one multi-row INSERT for the OEM numbers not yet in the database.
+        """
+        if self.sql_mode:
+            rows = self.oem_writer.take()
+            existing = ArticleOENumberWriter.existing_keys(self.conn, rows)
+            new_rows = [row for row in rows if (row[0], row[1]) not in existing]
+            if new_rows and self.export_format == 'copy':
+                self.export_rows['oem_numbers'].extend(new_rows)
+                self.stats['oem_numbers_added'] += len(new_rows)
+                logging.info(f"  ✅ Added {len(new_rows)} OEM numbers ({len(rows) - len(new_rows)} already exist)")
+            elif new_rows:
+                values = []
+                for product_id, oem_number, manufacturer, _ in new_rows:
+                    manuf_sql = f"'{sql_escape(manufacturer)}'" if manufacturer else 'NULL'
+                    values.append(f"(gen_random_uuid(), '{product_id}', '{sql_escape(oem_number)}', {manuf_sql}, NOW(), NOW())")
+                values = ',\n'.join(values)
+                self.sql_statements.append(
+                    f"INSERT INTO \"ArticleOENumber\" (id, \"productId\", \"oemNumber\", manufacturer, \"createdAt\", \"updatedAt\") VALUES\n{values};"
+                )
+                self.stats['oem_numbers_added'] += len(new_rows)
+                logging.info(f"  ✅ Added {len(new_rows)} OEM numbers ({len(rows) - len(new_rows)} already exist)")
+            return
+
+        if not self.pending_product_ids and not len(self.oem_writer):
+            return
+
+        product_ids = self.pending_product_ids
+        self.pending_product_ids = []
         try:
-            cursor = self.conn.cursor()
+            added = self.oem_writer.flush(self.conn)
 
-            # Check if exists
+            cursor = self.conn.cursor()
             cursor.execute("""
-                SELECT id FROM "ArticleOENumber"
-                WHERE "productId" = %s AND "oemNumber" = %s
-            """, (product_id, oem_number))
+                UPDATE "Product"
+                SET "sparetoEnrichedAt" = NOW()
+                WHERE id = ANY(%s)
+            """, (product_ids,))
 
-            if cursor.fetchone():
-                logging.debug(f"  OEM already exists: {oem_number}")
-                return False
+            self.conn.commit()
+        except Exception as e:
+            logging.error(f"  ❌ Error writing batch ({len(product_ids)} products): {e}")
+            self.conn.rollback()
+            self._fail_products(product_ids, str(e))
+            return
 
-            if self.sql_mode:
-                # Add to SQL statements
-                manuf_sql = f"'{sql_escape(manufacturer)}'" if manufacturer else 'NULL'
-                sql = f"INSERT INTO \"ArticleOENumber\" (id, \"productId\", \"oemNumber\", manufacturer, \"createdAt\", \"updatedAt\") VALUES (gen_random_uuid(), '{product_id}', '{sql_escape(oem_number)}', {manuf_sql}, NOW(), NOW());"
-                self.sql_statements.append(sql)
-            else:
-                # Insert directly
-                cursor.execute("""
-                    INSERT INTO "ArticleOENumber"
-                    ("id", "productId", "oemNumber", "manufacturer", "createdAt", "updatedAt")
-                    VALUES (gen_random_uuid(), %s, %s, %s, NOW(), NOW())
-                """, (product_id, oem_number, manufacturer))
+        self.stats['oem_numbers_added'] += added
+        logging.info(f"  ✅ Batch committed: {len(product_ids)} products, {added} new OEM numbers")
 
-            self.stats['oem_numbers_added'] += 1
-            logging.info(f"  ✅ Added OEM: {oem_number}")
-            return True
+        if self.checkpoint:
+            for product_id in product_ids:
+                self.checkpoint.mark_processed(product_id)
 
-        except Exception as e:
-            logging.error(f"  Error inserting OEM number: {e}")
-            return False
+    def _fail_products(self, product_ids: List[str], error: str):
+        """Products whose writes were rolled back: count as errors and mark failed in checkpoint"""
+        self.stats['errors'] += len(product_ids)
+        if self.checkpoint:
+            for product_id in product_ids:
+                self.checkpoint.mark_failed(product_id, error)
+
+    def _discard_pending_batch(self, error: str):
+        """
+        Full transaction rollback: fitments of every pending product in the batch
+        are gone too, so they must not be committed as enriched by flush_batch.
+        """
+        product_ids = self.pending_product_ids
+        self.pending_product_ids = []
+        for product_id in product_ids:
+            self.oem_writer.discard_product(product_id)
+        self.stats['products_processed'] -= len(product_ids)
+        if product_ids:
+            logging.warning(f"  ⚠️  Batch rolled back - {len(product_ids)} pending products marked failed")
+        self._fail_products(product_ids, f"Batch rolled back: {error}")
 
     def insert_fitment(self, product_id: str, generation_id: str, engine_id: Optional[str],
                       year_from: Optional[int] = None, year_to: Optional[int] = None):
@@ -910,7 +1072,9 @@ class SparetoEnricher:
                 logging.debug(f"  Fitment already exists")
                 return False
 
-            if self.sql_mode:
+            if self.sql_mode and self.export_format == 'copy':
+                self.export_rows['fitments'].append((product_id, generation_id, engine_id, year_from, year_to))
+            elif self.sql_mode:
                 # Add to SQL statements
                 engine_sql = f"'{engine_id}'" if engine_id else 'NULL'
                 year_from_sql = str(year_from) if year_from else 'NULL'
@@ -937,16 +1101,20 @@ class SparetoEnricher:
     @retry_with_backoff(max_retries=3, initial_delay=2, exceptions=(requests.exceptions.RequestException, requests.exceptions.Timeout))
     def _fetch_product_page(self, product_url: str) -> BeautifulSoup:
         """Fetch and parse product page (with automatic retry)"""
-        time.sleep(self.crawl_delay)
-        response = requests.get(
-            product_url,
-            headers=self.headers,
-            timeout=self.timeout,
-            verify=self.verify_ssl  # Security: Verify SSL certificates
-        )
-        response.raise_for_status()
-        return BeautifulSoup(response.content, 'html.parser')
+        with metrics.span('http.crawl_delay'):
+            time.sleep(self.crawl_delay)
+        with metrics.span('http.product_page'):
+            response = requests.get(
+                product_url,
+                headers=self.headers,
+                timeout=self.timeout,
+                verify=self.verify_ssl  # Security: Verify SSL certificates
+            )
+            response.raise_for_status()
+        with metrics.span('parse.product_page'):
+            return BeautifulSoup(response.content, 'html.parser')
 
+    @metrics.timed('product')
     def enrich_product(self, product_id: str, catalog_number: str) -> bool:
         """Enrich single product with OEM numbers and vehicle fitments"""
         try:
@@ -958,6 +1126,10 @@ class SparetoEnricher:
                 logging.info(f"  ⏭️  Skipping (already processed in previous run)")
                 return True
 
+            # Savepoint: greška ovog proizvoda ne poništava ostatak batch-a
+            if not self.sql_mode:
+                self.conn.cursor().execute("SAVEPOINT enrich_product")
+
             # Search product
             product_url = self.search_product(catalog_number)
             if not product_url:
@@ -997,12 +1169,7 @@ class SparetoEnricher:
                     logging.debug(f"  Skipped (no match): {vehicle_str}")
                     self.stats['skipped_no_match'] += 1
                     # Track unmatched vehicle for later review
-                    self.unmatched_vehicles.append({
-                        'product_id': product_id,
-                        'catalog_number': catalog_number,
-                        'vehicle_string': vehicle_str,
-                        'parsed': parsed
-                    })
+                    self.unmatched.add(product_id, catalog_number, vehicle_str, parsed)
                     continue
 
                 # Find engine
@@ -1020,30 +1187,28 @@ class SparetoEnricher:
             # Mark product for update
             if self.sql_mode:
                 self.enriched_product_ids.append(product_id)
-            else:
-                # Mark as enriched in database
-                cursor = self.conn.cursor()
-                cursor.execute("""
-                    UPDATE "Product"
-                    SET "sparetoEnrichedAt" = NOW()
-                    WHERE id = %s
-                """, (product_id,))
 
-                # Commit transaction
-                self.conn.commit()
+                # Mark as processed in checkpoint
+                if self.checkpoint:
+                    self.checkpoint.mark_processed(product_id)
+            else:
+                # sparetoEnrichedAt + commit + checkpoint rade se u flush_batch
+                self.conn.cursor().execute("RELEASE SAVEPOINT enrich_product")
+                self.pending_product_ids.append(product_id)
 
             self.stats['products_processed'] += 1
 
-            # Mark as processed in checkpoint
-            if self.checkpoint:
-                self.checkpoint.mark_processed(product_id)
-
             return True
 
         except Exception as e:
             logging.error(f"  ❌ Error enriching product: {e}")
+            self.oem_writer.discard_product(product_id)
             if not self.sql_mode:
-                self.conn.rollback()
+                try:
+                    self.conn.cursor().execute("ROLLBACK TO SAVEPOINT enrich_product")
+                except Exception:
+                    self.conn.rollback()
+                    self._discard_pending_batch(str(e))
             self.stats['errors'] += 1
 
             # Mark as failed in checkpoint
@@ -1052,91 +1217,96 @@ class SparetoEnricher:
 
             return False
 
-    def write_unmatched_vehicles_report(self):
-        """Write report of unmatched vehicles for later import"""
-        if not self.unmatched_vehicles:
-            logging.info("No unmatched vehicles to report")
-            return
-
-        import json
-        from collections import defaultdict
-
-        # Group by brand -> model -> generation codes
-        grouped = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
-
-        for entry in self.unmatched_vehicles:
-            parsed = entry['parsed']
-            brand = parsed['brand']
-            model = parsed['model']
-            gen_codes_key = ', '.join(parsed['gen_codes'])
-
-            grouped[brand][model][gen_codes_key].append({
-                'vehicle_string': entry['vehicle_string'],
-                'engine_desc': parsed['engine_desc'],
-                'year_range': f"{parsed['year_from']}-{parsed['year_to']}",
-                'power_kw': parsed['power_kw'],
-                'capacity_ccm': parsed['capacity_ccm'],
-                'catalog_number': entry['catalog_number']
-            })
-
-        # Write JSON report with product IDs for later linking
-        json_file = self.output_file.replace('.sql', '_unmatched_vehicles.json')
-
-        # Enhanced JSON with product tracking
-        enhanced_grouped = {}
-        for entry in self.unmatched_vehicles:
-            parsed = entry['parsed']
-            brand = parsed['brand']
-            model = parsed['model']
-            gen_codes_key = ', '.join(parsed['gen_codes'])
-
-            if brand not in enhanced_grouped:
-                enhanced_grouped[brand] = {}
-            if model not in enhanced_grouped[brand]:
-                enhanced_grouped[brand][model] = {}
-            if gen_codes_key not in enhanced_grouped[brand][model]:
-                enhanced_grouped[brand][model][gen_codes_key] = {
-                    'generation_info': {
-                        'gen_codes': parsed['gen_codes'],
-                        'year_range': f"{parsed['year_from']}-{parsed['year_to']}"
-                    },
-                    'products': [],
-                    'engines': []
-                }
-
-            # Add product info
-            enhanced_grouped[brand][model][gen_codes_key]['products'].append({
-                'product_id': entry['product_id'],
-                'catalog_number': entry['catalog_number'],
-                'vehicle_string': entry['vehicle_string']
-            })
-
-            # Add unique engine info
-            engine_key = f"{parsed['engine_desc']}_{parsed['power_kw']}_{parsed['capacity_ccm']}"
-            engine_exists = any(
-                e['engine_desc'] == parsed['engine_desc'] and
-                e['power_kw'] == parsed['power_kw'] and
-                e['capacity_ccm'] == parsed['capacity_ccm']
-                for e in enhanced_grouped[brand][model][gen_codes_key]['engines']
-            )
-            if not engine_exists:
-                enhanced_grouped[brand][model][gen_codes_key]['engines'].append({
-                    'engine_desc': parsed['engine_desc'],
-                    'year_from': parsed['year_from'],
-                    'year_to': parsed['year_to'],
-                    'power_kw': parsed['power_kw'],
-                    'capacity_ccm': parsed['capacity_ccm']
-                })
+    @metrics.timed('write')
+    def flush_unmatched(self):
+        """
+        Checkpoint flush of unmatched vehicles
 
+        Queued rows go to Spareto_UnmatchedVehicles with COPY (database mode) or
+        are appended to <base>_unmatched_vehicles.csv (SQL mode, loaded later by
+        *_unmatched_table.sql). The JSON/TXT summary is rewritten from the
+        aggregates, so the report is available mid-run.
+        """
+        rows = self.unmatched.take_pending()
+        if rows:
+            if self.sql_mode:
+                self._append_unmatched_csv(rows)
+            else:
+                self._copy_unmatched_rows(rows)
+
+        if self.unmatched.total:
+            self.write_unmatched_summary()
+
+    def _unmatched_csv_rows(self, rows):
+        for row in rows:
+            row = list(row)
+            row[4] = pg_text_array(row[4])
+            yield row
+
+    def _append_unmatched_csv(self, rows):
+        """Append rows to the unmatched CSV (header on the first flush of the run)"""
+        path = self._unmatched_path('vehicles.csv')
+        mode = 'a' if self._unmatched_csv_started else 'w'
+        with open(path, mode, newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            if not self._unmatched_csv_started:
+                writer.writerow(UNMATCHED_COLUMNS)
+            writer.writerows(self._unmatched_csv_rows(rows))
+        self._unmatched_csv_started = True
+
+    def _copy_unmatched_rows(self, rows):
+        """COPY rows into Spareto_UnmatchedVehicles (table created on first use)"""
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(self._unmatched_csv_rows(rows))
+        buffer.seek(0)
+
+        columns = ', '.join(f'"{c}"' if c != c.lower() else c for c in UNMATCHED_COLUMNS)
+        cursor = self.conn.cursor()
+        try:
+            if not self._unmatched_table_ready:
+                cursor.execute(UNMATCHED_TABLE_DDL)
+                self._unmatched_table_ready = True
+            cursor.copy_expert(f'COPY "Spareto_UnmatchedVehicles" ({columns}) FROM STDIN WITH CSV', buffer)
+            self.conn.commit()
+            logging.info(f"📋 Unmatched vehicles: {len(rows)} rows → Spareto_UnmatchedVehicles")
+        except Exception as e:
+            logging.error(f"  ❌ Error writing unmatched vehicles ({len(rows)} rows dropped): {e}")
+            self.conn.rollback()
+            self._unmatched_table_ready = False
+
+    def _unmatched_path(self, suffix: str) -> str:
+        return f"{self._export_base()}_unmatched_{suffix}"
+
+    def write_unmatched_summary(self):
+        """Write JSON/TXT summary of unmatched vehicles from the aggregates"""
+        grouped = self.unmatched.by_brand()
+
+        summary = {}
+        for brand, models in grouped.items():
+            for model, gens in models.items():
+                for gen_codes_key, group in gens.items():
+                    summary.setdefault(brand, {}).setdefault(model, {})[gen_codes_key] = {
+                        'generation_info': {
+                            'gen_codes': group['gen_codes'],
+                            'year_range': group['year_range']
+                        },
+                        'count': group['count'],
+                        'examples': group['examples'],
+                        'engines': list(group['engines'].values()),
+                        'engines_dropped': group['engines_dropped']
+                    }
+
+        json_file = self._unmatched_path('vehicles.json')
         with open(json_file, 'w', encoding='utf-8') as f:
-            json.dump(enhanced_grouped, f, indent=2, ensure_ascii=False)
+            json.dump(summary, f, indent=2, ensure_ascii=False)
 
         # Write human-readable report
-        report_file = self.output_file.replace('.sql', '_unmatched_vehicles.txt')
+        report_file = self._unmatched_path('vehicles.txt')
         with open(report_file, 'w', encoding='utf-8') as f:
             f.write("=" * 80 + "\n")
             f.write("UNMATCHED VEHICLES REPORT\n")
-            f.write(f"Total unmatched: {len(self.unmatched_vehicles)}\n")
+            f.write(f"Total unmatched: {self.unmatched.total}\n")
+            f.write(f"Updated: {datetime.now().isoformat(timespec='seconds')}\n")
             f.write("=" * 80 + "\n\n")
 
             for brand in sorted(grouped.keys()):
@@ -1149,34 +1319,61 @@ class SparetoEnricher:
                     f.write(f"  {'-'*76}\n")
 
                     for gen_codes in sorted(grouped[brand][model].keys()):
-                        vehicles = grouped[brand][model][gen_codes]
+                        group = grouped[brand][model][gen_codes]
                         f.write(f"    Generation codes: {gen_codes}\n")
-                        f.write(f"    Count: {len(vehicles)} products affected\n")
+                        f.write(f"    Count: {group['count']} products affected\n")
 
                         # Show unique engine variants
                         engines = set()
-                        for v in vehicles:
-                            engines.add(f"{v['engine_desc']} ({v['power_kw']}kW, {v['capacity_ccm']}cc)")
+                        for engine_desc, power_kw, capacity_ccm in group['engines']:
+                            engines.add(f"{engine_desc} ({power_kw}kW, {capacity_ccm}cc)")
 
                         f.write(f"    Engines:\n")
                         for engine in sorted(engines):
                             f.write(f"      - {engine}\n")
+                        if group['engines_dropped']:
+                            f.write(f"      ... +{group['engines_dropped']} more\n")
 
-                        f.write(f"    Example: {vehicles[0]['vehicle_string']}\n")
+                        f.write(f"    Example: {group['examples'][0]}\n")
                         f.write("\n")
 
+        logging.debug(f"📋 Unmatched summary: {self.unmatched.total} vehicles, "
+                      f"{len(self.unmatched.groups)} generations → {report_file}")
+
+    def write_unmatched_vehicles_report(self):
+        """Write report of unmatched vehicles for later import"""
+        self.flush_unmatched()
+        if not self.unmatched.total:
+            logging.info("No unmatched vehicles to report")
+            return
+
+        grouped = self.unmatched.by_brand()
+
         logging.info(f"\n{'='*70}")
         logging.info(f"📋 Unmatched vehicles report written:")
-        logging.info(f"  JSON: {json_file}")
-        logging.info(f"  TXT:  {report_file}")
-        logging.info(f"  Total unmatched: {len(self.unmatched_vehicles)}")
+        logging.info(f"  JSON: {self._unmatched_path('vehicles.json')}")
+        logging.info(f"  TXT:  {self._unmatched_path('vehicles.txt')}")
+        logging.info(f"  CSV:  {self._unmatched_path('vehicles.csv')}")
+        logging.info(f"  Total unmatched: {self.unmatched.total}")
         logging.info(f"  Unique brands: {len(grouped)}")
         logging.info(f"{'='*70}")
 
         # Write SQL template for creating missing vehicles
-        self._write_vehicle_insert_template(grouped, enhanced_grouped)
+        self._write_vehicle_insert_template(grouped)
 
-    def _write_vehicle_insert_template(self, grouped, enhanced_grouped):
+    def _iter_unmatched_rows(self):
+        """Stream flushed rows back from the unmatched CSV: (row dict, group)"""
+        path = self._unmatched_path('vehicles.csv')
+        if not os.path.exists(path):
+            return
+        with open(path, 'r', newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                key = (row['brand'], row['model'], ', '.join(parse_pg_text_array(row['genCodes'])))
+                group = self.unmatched.groups.get(key)
+                if group is not None:
+                    yield row, key[2], group
+
+    def _write_vehicle_insert_template(self, grouped):
         """Generate SQL template for inserting missing vehicles"""
         sql_template_file = self.output_file.replace('.sql', '_missing_vehicles_template.sql')
 
@@ -1222,18 +1419,17 @@ class SparetoEnricher:
                     f.write(f"-- {'-'*68}\n\n")
 
                     for gen_codes in sorted(grouped[brand][model].keys()):
-                        vehicles = grouped[brand][model][gen_codes]
-                        example = vehicles[0]
+                        group = grouped[brand][model][gen_codes]
 
                         # Parse year range
-                        year_from_str, year_to_str = example['year_range'].split('-')
+                        year_from_str, year_to_str = group['year_range'].split('-')
                         year_from = int(year_from_str)
                         year_to = int(year_to_str)
 
                         f.write(f"-- Generation: {gen_codes}\n")
-                        f.write(f"-- Year range: {example['year_range']}\n")
-                        f.write(f"-- Engines: {len(set(v['engine_desc'] for v in vehicles))} variants\n")
-                        f.write(f"-- Example: {example['vehicle_string']}\n\n")
+                        f.write(f"-- Year range: {group['year_range']}\n")
+                        f.write(f"-- Engines: {len(set(desc for desc, _, _ in group['engines']))} variants\n")
+                        f.write(f"-- Example: {group['examples'][0]}\n\n")
 
                         # Model insert (commented out)
                         f.write(f"-- INSERT INTO \"VehicleModel\" (id, name, \"brandId\", \"createdAt\", \"updatedAt\")\n")
@@ -1258,13 +1454,7 @@ class SparetoEnricher:
                         f.write(f"-- ) ON CONFLICT DO NOTHING;\n\n")
 
                         # Engine inserts (commented out)
-                        unique_engines = {}
-                        for v in vehicles:
-                            key = (v['engine_desc'], v['power_kw'], v['capacity_ccm'])
-                            if key not in unique_engines:
-                                unique_engines[key] = v
-
-                        for (engine_desc, power_kw, capacity_ccm), v in unique_engines.items():
+                        for engine_desc, power_kw, capacity_ccm in group['engines']:
                             # Determine fuel type
                             fuel_type = 'PETROL'
                             engine_upper = engine_desc.upper()
@@ -1309,13 +1499,22 @@ class SparetoEnricher:
         logging.info(f"  ^ Review and uncomment lines to insert missing vehicles")
 
         # Generate linking SQL for products
-        self._write_product_linking_sql(enhanced_grouped)
+        self._write_product_linking_sql()
 
         # Generate PostgreSQL table SQL for unmatched vehicles
-        self.write_unmatched_to_postgres_table(enhanced_grouped)
+        self.write_unmatched_to_postgres_table()
+
+    def _write_product_linking_sql(self):
+        """
+        Generate SQL to link products with newly added vehicles
+
+        Products are streamed back from the unmatched CSV (flushed at
+        checkpoints); engine variants come from the per-generation aggregates.
+        """
+        if self.export_format == 'copy':
+            self._write_product_linking_copy()
+            return
 
-    def _write_product_linking_sql(self, grouped):
-        """Generate SQL to link products with newly added vehicles"""
         linking_sql_file = self.output_file.replace('.sql', '_link_products.sql')
 
         with open(linking_sql_file, 'w', encoding='utf-8') as f:
@@ -1329,45 +1528,29 @@ class SparetoEnricher:
 
             total_fitments = 0
 
-            for brand in sorted(grouped.keys()):
-                f.write(f"\n-- {'='*70}\n")
-                f.write(f"-- BRAND: {brand}\n")
-                f.write(f"-- {'='*70}\n\n")
-
-                for model in sorted(grouped[brand].keys()):
-                    for gen_codes in sorted(grouped[brand][model].keys()):
-                        data = grouped[brand][model][gen_codes]
-                        products = data['products']
-                        engines = data['engines']
-                        gen_info = data['generation_info']
-
-                        f.write(f"-- Model: {model}, Generation: {gen_codes}\n")
-                        f.write(f"-- Products: {len(products)}, Engines: {len(engines)}\n\n")
-
-                        # For each product
-                        for product in products:
-                            product_id = product['product_id']
-                            catalog_number = product['catalog_number']
-
-                            # For each engine variant
-                            for engine in engines:
-                                year_range = f"{engine['year_from']}-{engine['year_to']}"
-
-                                f.write(f"-- Product: {catalog_number}, Engine: {engine['engine_desc']}\n")
-                                f.write(f"INSERT INTO \"ProductVehicleFitment\" (\n")
-                                f.write(f"  id, \"productId\", \"generationId\", \"engineId\", \"yearFrom\", \"yearTo\",\n")
-                                f.write(f"  \"createdAt\", \"updatedAt\"\n")
-                                f.write(f") VALUES (\n")
-                                f.write(f"  gen_random_uuid(),\n")
-                                f.write(f"  '{product_id}',\n")
-                                f.write(f"  (SELECT id FROM \"VehicleGeneration\" WHERE name = '{sql_escape(gen_codes)}' AND \"modelId\" = (SELECT id FROM \"VehicleModel\" WHERE LOWER(name) = LOWER('{sql_escape(model)}') AND \"brandId\" = (SELECT id FROM \"VehicleBrand\" WHERE LOWER(name) = LOWER('{sql_escape(brand)}')) LIMIT 1) LIMIT 1),\n")
-                                f.write(f"  (SELECT id FROM \"VehicleEngine\" WHERE \"engineCode\" = '{sql_escape(engine['engine_desc'])}' AND \"generationId\" = (SELECT id FROM \"VehicleGeneration\" WHERE name = '{sql_escape(gen_codes)}' AND \"modelId\" = (SELECT id FROM \"VehicleModel\" WHERE LOWER(name) = LOWER('{sql_escape(model)}') AND \"brandId\" = (SELECT id FROM \"VehicleBrand\" WHERE LOWER(name) = LOWER('{sql_escape(brand)}')) LIMIT 1) LIMIT 1) LIMIT 1),\n")
-                                f.write(f"  {engine['year_from']},\n")
-                                f.write(f"  {engine['year_to']},\n")
-                                f.write(f"  NOW(),\n")
-                                f.write(f"  NOW()\n")
-                                f.write(f") ON CONFLICT DO NOTHING;\n\n")
-                                total_fitments += 1
+            for row, gen_codes, group in self._iter_unmatched_rows():
+                product_id = row['productId']
+                brand = row['brand']
+                model = row['model']
+
+                f.write(f"-- Product: {row['catalogNumber']}, {brand} {model}, Generation: {gen_codes}\n")
+
+                # For each engine variant
+                for engine in group['engines'].values():
+                    f.write(f"INSERT INTO \"ProductVehicleFitment\" (\n")
+                    f.write(f"  id, \"productId\", \"generationId\", \"engineId\", \"yearFrom\", \"yearTo\",\n")
+                    f.write(f"  \"createdAt\", \"updatedAt\"\n")
+                    f.write(f") VALUES (\n")
+                    f.write(f"  gen_random_uuid(),\n")
+                    f.write(f"  '{product_id}',\n")
+                    f.write(f"  (SELECT id FROM \"VehicleGeneration\" WHERE name = '{sql_escape(gen_codes)}' AND \"modelId\" = (SELECT id FROM \"VehicleModel\" WHERE LOWER(name) = LOWER('{sql_escape(model)}') AND \"brandId\" = (SELECT id FROM \"VehicleBrand\" WHERE LOWER(name) = LOWER('{sql_escape(brand)}')) LIMIT 1) LIMIT 1),\n")
+                    f.write(f"  (SELECT id FROM \"VehicleEngine\" WHERE \"engineCode\" = '{sql_escape(engine['engine_desc'])}' AND \"generationId\" = (SELECT id FROM \"VehicleGeneration\" WHERE name = '{sql_escape(gen_codes)}' AND \"modelId\" = (SELECT id FROM \"VehicleModel\" WHERE LOWER(name) = LOWER('{sql_escape(model)}') AND \"brandId\" = (SELECT id FROM \"VehicleBrand\" WHERE LOWER(name) = LOWER('{sql_escape(brand)}')) LIMIT 1) LIMIT 1) LIMIT 1),\n")
+                    f.write(f"  {engine['year_from']},\n")
+                    f.write(f"  {engine['year_to']},\n")
+                    f.write(f"  NOW(),\n")
+                    f.write(f"  NOW()\n")
+                    f.write(f") ON CONFLICT DO NOTHING;\n\n")
+                    total_fitments += 1
 
             f.write("COMMIT;\n\n")
             f.write(f"-- Total fitments to create: {total_fitments}\n")
@@ -1378,9 +1561,38 @@ class SparetoEnricher:
         logging.info(f"  Linking SQL: {linking_sql_file}")
         logging.info(f"  ^ Run this AFTER adding vehicles to link products (estimated {total_fitments} fitments)")
 
-    def write_unmatched_to_postgres_table(self, enhanced_grouped):
-        """Generate SQL to create table and insert unmatched vehicles"""
+    def _write_product_linking_copy(self):
+        """
+        COPY variant of _write_product_linking_sql: one CSV row per
+        (product, engine) with vehicle names instead of nested subqueries.
+
+        The vehicles don't exist yet during the run, so IDs are resolved at
+        apply time - spareto_apply_copy_export.py --step link resolves every
+        distinct brand/model/generation/engine once with a set-based join.
+        """
+        def rows():
+            for row, gen_codes, group in self._iter_unmatched_rows():
+                for engine in group['engines'].values():
+                    yield (row['productId'], row['catalogNumber'], row['brand'], row['model'],
+                           gen_codes, engine['engine_desc'], engine['year_from'], engine['year_to'])
+
+        linking_file = self._export_path('link_products')
+        total_fitments = write_copy_csv(linking_file, COPY_EXPORT_COLUMNS['link_products'], rows())
+
+        logging.info(f"  Linking CSV: {linking_file}")
+        logging.info(f"  ^ Apply AFTER adding vehicles: python3 spareto_apply_copy_export.py "
+                     f"{self._export_base()} --step link (estimated {total_fitments} fitments)")
+
+    def write_unmatched_to_postgres_table(self):
+        """
+        Generate SQL to create the unmatched table and load the unmatched CSV
+
+        Rows are loaded with psql \\copy (COPY through the client) instead of
+        one INSERT per row; run from the directory that holds the CSV.
+        """
         table_sql_file = self.output_file.replace('.sql', '_unmatched_table.sql')
+        csv_file = self._unmatched_path('vehicles.csv')
+        columns = ', '.join(f'"{c}"' if c != c.lower() else c for c in UNMATCHED_COLUMNS)
 
         with open(table_sql_file, 'w', encoding='utf-8') as f:
             # Create table
@@ -1388,85 +1600,59 @@ class SparetoEnricher:
             f.write("-- This table stores vehicles found on Spareto that don't exist in our database\n\n")
 
             f.write("-- Drop table if exists (careful in production!)\n")
-            f.write("-- DROP TABLE IF EXISTS \"Spareto_UnmatchedVehicles\";\n\n")
-
-            f.write("CREATE TABLE IF NOT EXISTS \"Spareto_UnmatchedVehicles\" (\n")
-            f.write("  id TEXT PRIMARY KEY DEFAULT gen_random_uuid()::text,\n")
-            f.write("  \"productId\" TEXT NOT NULL,\n")
-            f.write("  \"catalogNumber\" TEXT,\n")
-            f.write("  brand TEXT NOT NULL,\n")
-            f.write("  model TEXT NOT NULL,\n")
-            f.write("  \"genCodes\" TEXT[] NOT NULL,\n")
-            f.write("  \"vehicleString\" TEXT NOT NULL,\n")
-            f.write("  \"engineDesc\" TEXT,\n")
-            f.write("  \"yearFrom\" INTEGER,\n")
-            f.write("  \"yearTo\" INTEGER,\n")
-            f.write("  \"powerKW\" INTEGER,\n")
-            f.write("  \"capacityCCM\" INTEGER,\n")
-            f.write("  \"scrapedAt\" TIMESTAMP DEFAULT NOW(),\n")
-            f.write("  \"createdAt\" TIMESTAMP DEFAULT NOW()\n")
-            f.write(");\n\n")
-
-            # Create indexes
-            f.write("-- Indexes for faster querying\n")
-            f.write("CREATE INDEX IF NOT EXISTS idx_unmatched_brand ON \"Spareto_UnmatchedVehicles\" (brand);\n")
-            f.write("CREATE INDEX IF NOT EXISTS idx_unmatched_model ON \"Spareto_UnmatchedVehicles\" (brand, model);\n")
-            f.write("CREATE INDEX IF NOT EXISTS idx_unmatched_product ON \"Spareto_UnmatchedVehicles\" (\"productId\");\n")
-            f.write("CREATE INDEX IF NOT EXISTS idx_unmatched_catalog ON \"Spareto_UnmatchedVehicles\" (\"catalogNumber\");\n\n")
+            f.write("-- DROP TABLE IF EXISTS \"Spareto_UnmatchedVehicles\";\n")
+            f.write(UNMATCHED_TABLE_DDL)
+            f.write("\n")
 
             f.write("BEGIN;\n\n")
-
-            total_inserts = 0
-
-            # Insert data
-            for brand in sorted(enhanced_grouped.keys()):
-                f.write(f"\n-- Brand: {brand}\n")
-
-                for model in sorted(enhanced_grouped[brand].keys()):
-                    for gen_codes_key in sorted(enhanced_grouped[brand][model].keys()):
-                        data = enhanced_grouped[brand][model][gen_codes_key]
-                        gen_codes = data['generation_info']['gen_codes']
-
-                        # For each product
-                        for product in data['products']:
-                            product_id = product['product_id']
-                            catalog_number = product['catalog_number']
-                            vehicle_string = product['vehicle_string']
-
-                            # For each unique engine
-                            for engine in data['engines']:
-                                # PostgreSQL ARRAY syntax: ARRAY['code1', 'code2']
-                                gen_codes_array = '[' + ','.join(f"'{code}'" for code in gen_codes) + ']'
-
-                                f.write(f"INSERT INTO \"Spareto_UnmatchedVehicles\" (\n")
-                                f.write(f"  id, \"productId\", \"catalogNumber\", brand, model, \"genCodes\",\n")
-                                f.write(f"  \"vehicleString\", \"engineDesc\", \"yearFrom\", \"yearTo\",\n")
-                                f.write(f"  \"powerKW\", \"capacityCCM\"\n")
-                                f.write(f") VALUES (\n")
-                                f.write(f"  gen_random_uuid()::text,\n")
-                                f.write(f"  '{product_id}',\n")
-                                f.write(f"  '{sql_escape(catalog_number)}',\n")
-                                f.write(f"  '{sql_escape(brand)}',\n")
-                                f.write(f"  '{sql_escape(model)}',\n")
-                                f.write(f"  ARRAY{gen_codes_array},\n")
-                                f.write(f"  '{sql_escape(vehicle_string)}',\n")
-                                f.write(f"  '{sql_escape(engine['engine_desc'])}',\n")
-                                f.write(f"  {engine['year_from']},\n")
-                                f.write(f"  {engine['year_to']},\n")
-                                f.write(f"  {engine['power_kw'] if engine['power_kw'] else 'NULL'},\n")
-                                f.write(f"  {engine['capacity_ccm'] if engine['capacity_ccm'] else 'NULL'}\n")
-                                f.write(f") ON CONFLICT (id) DO NOTHING;\n\n")
-                                total_inserts += 1
-
+            f.write(f"\\copy \"Spareto_UnmatchedVehicles\" ({columns}) FROM '{csv_file}' WITH CSV HEADER\n\n")
             f.write("COMMIT;\n\n")
-            f.write(f"-- Total inserts: {total_inserts}\n")
+            f.write(f"-- Total rows: {self.unmatched.flushed}\n")
             f.write(f"-- Check results: SELECT brand, model, COUNT(*) FROM \"Spareto_UnmatchedVehicles\" GROUP BY brand, model ORDER BY brand, model;\n")
 
         logging.info(f"  Table SQL: {table_sql_file}")
-        logging.info(f"  ^ Creates table and inserts {total_inserts} unmatched vehicle records")
+        logging.info(f"  ^ Creates table and loads {self.unmatched.flushed} unmatched vehicle records from {csv_file}")
+
+    def _export_base(self) -> str:
+        return os.path.splitext(self.output_file)[0] if self.output_file else 'spareto_enrichment'
+
+    def _export_path(self, name: str) -> str:
+        return f"{self._export_base()}_{name}.csv"
+
+    def write_copy_export(self):
+        """
+        Write collected rows as COPY-ready CSV files (IDs already resolved)
+
+        Applied in one transaction by spareto_apply_copy_export.py: COPY into
+        staging tables, then one INSERT ... SELECT / UPDATE ... FROM per table.
+        """
+        try:
+            exports = {
+                'oem_numbers': self.export_rows['oem_numbers'],
+                'fitments': self.export_rows['fitments'],
+                'enriched_products': [(product_id,) for product_id in self.enriched_product_ids],
+            }
+
+            logging.info(f"\n{'='*70}")
+            for name, rows in exports.items():
+                path = self._export_path(name)
+                count = write_copy_csv(path, COPY_EXPORT_COLUMNS[name], rows)
+                logging.info(f"✅ {path}: {count} rows")
+            logging.info(f"{'='*70}")
+            logging.info(f"\nTo import:")
+            logging.info(f"  python3 spareto_apply_copy_export.py {self._export_base()}")
+            logging.info(f"{'='*70}")
+
+        except Exception as e:
+            logging.error(f"Error writing COPY export: {e}")
 
+    @metrics.timed('write')
     def write_sql_file(self):
         """Write collected SQL statements to file"""
+        if self.export_format == 'copy':
+            self.write_copy_export()
+            return
+
         try:
             with open(self.output_file, 'w', encoding='utf-8') as f:
                 f.write("-- Spareto Enrichment SQL Import\n")
@@ -1571,6 +1757,8 @@ class SparetoEnricher:
 
                 # Progress report and checkpoint save every 10 products
                 if i % 10 == 0:
+                    self.flush_batch()
+                    self.flush_unmatched()
                     self.print_stats()
                     # Save checkpoint every 10 products
                     if self.checkpoint:
@@ -1578,6 +1766,9 @@ class SparetoEnricher:
                         self.checkpoint.save()
                         logging.info(f"💾 Checkpoint saved ({len(self.checkpoint.processed_products)} products)")
 
+            self.flush_batch()
+            self.flush_unmatched()
+
             # Final stats
             logging.info(f"\n{'='*70}")
             logging.info("FINAL SUMMARY")
@@ -1588,6 +1779,7 @@ class SparetoEnricher:
             if self.checkpoint:
                 self.checkpoint.update_stats(self.stats)
                 self.checkpoint.save()
+                self.checkpoint.compact()
                 logging.info(f"💾 Final checkpoint saved")
                 if self.checkpoint.failed_products:
                     logging.warning(f"⚠️  {len(self.checkpoint.failed_products)} products failed - check checkpoint file")
@@ -1606,6 +1798,7 @@ class SparetoEnricher:
                 logging.info(f"💾 Emergency checkpoint saved before exit")
         finally:
             self.conn.close()
+            metrics.finish(self.metrics_out, stats=self.stats)
 
     def print_stats(self):
         """Print current statistics"""
@@ -1619,12 +1812,13 @@ class SparetoEnricher:
         logging.info(f"{'='*70}")
 
 
-def test_catalog_number(catalog_number: str, output_file: Optional[str] = None):
+def test_catalog_number(catalog_number: str, output_file: Optional[str] = None, export_format: str = 'sql',
+                        metrics_out: Optional[str] = None):
     """Test enrichment for a specific catalog number"""
-    import os
     db_conn = os.getenv('DATABASE_URL', 'postgresql://emir_mw@localhost:5432/omerbasicdb')
 
-    enricher = SparetoEnricher(db_conn, output_file=output_file)
+    enricher = SparetoEnricher(db_conn, output_file=output_file, export_format=export_format,
+                               metrics_out=metrics_out)
     cursor = enricher.conn.cursor()
 
     # Get product by catalog number
@@ -1648,12 +1842,16 @@ def test_catalog_number(catalog_number: str, output_file: Optional[str] = None):
     logging.info(f"{'='*70}\n")
 
     enricher.enrich_product(product_id, catalog_number)
+    enricher.flush_batch()
+    enricher.flush_unmatched()
     enricher.print_stats()
 
     if enricher.sql_mode:
         enricher.write_sql_file()
         enricher.write_unmatched_vehicles_report()
 
+    metrics.finish(metrics_out, stats=enricher.stats)
+
 
 def main():
     """Main entry point"""
@@ -1667,12 +1865,16 @@ def main():
                        help='Number of products to process (default: 10)')
     parser.add_argument('--output', '-o', type=str, default=None,
                        help='Output SQL file (if specified, writes SQL instead of executing)')
+    parser.add_argument('--format', choices=['sql', 'copy'], default='sql',
+                       help='Output format with --output: sql (INSERT statements) or copy '
+                            '(CSV files for spareto_apply_copy_export.py)')
     parser.add_argument('--test', type=str, default=None,
                        help='Test with specific catalog number')
     parser.add_argument('--clear-checkpoint', action='store_true',
                        help='Clear checkpoint and start fresh')
     parser.add_argument('--no-checkpoint', action='store_true',
                        help='Disable checkpoint system (not recommended for large batches)')
+    add_metrics_argument(parser)
 
     args = parser.parse_args()
 
@@ -1687,12 +1889,14 @@ def main():
 
     # Test mode
     if args.test:
-        test_catalog_number(args.test, output_file=args.output)
+        test_catalog_number(args.test, output_file=args.output, export_format=args.format,
+                            metrics_out=args.metrics_out)
         return
 
     # Normal mode
     enable_checkpoint = not args.no_checkpoint
-    enricher = SparetoEnricher(db_conn, output_file=args.output, enable_checkpoint=enable_checkpoint)
+    enricher = SparetoEnricher(db_conn, output_file=args.output, enable_checkpoint=enable_checkpoint,
+                               export_format=args.format, metrics_out=args.metrics_out)
     enricher.run(limit=args.limit)
 
 
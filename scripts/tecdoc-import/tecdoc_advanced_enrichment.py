@@ -12,7 +12,6 @@ Autor: Claude Code
 Datum: 22. decembar 2025.
 """
 
-import psycopg2
 import mysql.connector
 from typing import Dict, List, Optional, Tuple
 import json
@@ -20,6 +19,12 @@ from dataclasses import dataclass, asdict
 from datetime import datetime
 import logging
 import re
+from collections import defaultdict
+
+from tecdoc_db import ArticleOENumberWriter, ProductUpdateWriter, log_timing_summary, postgres_pool
+from tecdoc_metrics import metrics
+from tecdoc_snapshot import connect_tecdoc
+from tecdoc_normalize import is_placeholder_oem, normalize_number, oem_variants
 
 # Setup logging
 logging.basicConfig(
@@ -31,6 +36,27 @@ logging.basicConfig(
     ]
 )
 
+# Normalizovani OENbr (isti izraz kao functional index u tecdoc_normalized_indexes.sql)
+NORMALIZED_OENBR_SQL = "REPLACE(REPLACE(REPLACE(REPLACE(UPPER(OENbr), ' ', ''), '-', ''), '.', ''), '/', '')"
+
+# Broj OEM varijanti po IN (...) upitu
+OEM_VARIANT_CHUNK_SIZE = 500
+
+# Buffered ArticleOENumber redova prije upsert-a (i uvijek na kraju batch-a)
+OEM_FLUSH_SIZE = 5000
+
+# Product kolone koje update_product mijenja (jedan UPDATE ... FROM (VALUES ...) po flush-u)
+PRODUCT_UPDATE_COLUMNS = [
+    ('tecdocArticleId', 'integer', None),
+    ('tecdocProductId', 'integer', None),
+    ('eanCode', 'text', 'COALESCE(v."eanCode", p."eanCode")'),
+    ('technicalSpecs', 'jsonb', None),
+]
+PRODUCT_UPDATE_EXTRA_SET = ('"tecdocEnrichedAt" = NOW()', '"updatedAt" = NOW()')
+
+# Broj proizvoda po flush-u (Product UPDATE + OEM upsert + commit)
+PRODUCT_FLUSH_SIZE = 500
+
 @dataclass
 class MatchResult:
     """Rezultat matchinga"""
@@ -59,29 +85,48 @@ class TecDocAdvancedEnricher:
     Napredni TecDoc obogaćivač
     """
 
-    def __init__(self):
-        # TecDoc MySQL (read-only)
-        self.tecdoc_conn = mysql.connector.connect(
+    def __init__(self, tecdoc_snapshot: Optional[str] = None, flush_size: int = PRODUCT_FLUSH_SIZE):
+        # TecDoc MySQL (read-only) - iz zajedničkog pool-a (health check + reconnect),
+        # ili lokalni snapshot (tecdoc_snapshot / TECDOC_SNAPSHOT env)
+        self.tecdoc_conn = connect_tecdoc(
+            tecdoc_snapshot,
             host="localhost",
             user="tecdoc_user",
             password="tecdoc_password_2025",
             database="tecdoc1q2019",
-            charset='utf8mb4'
+            charset='utf8mb4',
+            autocommit=True,
+            connection_timeout=300
         )
 
         # Postgres (read-write)
-        self.postgres_conn = psycopg2.connect(
+        self.postgres_conn = postgres_pool(
             host="localhost",
             database="omerbasicdb",
             user="postgres",
             password="123456789EmIna!"
-        )
+        ).connection()
 
         # Cache
         self.manufacturer_cache = {}
         self.vehicle_generation_cache = {}
         self.vehicle_engine_cache = {}
 
+        # OEM → article_id (nivo 4), puni se za cijeli batch odjednom
+        self.oem_normalized_cache: Dict[str, Optional[int]] = {}
+
+        # ArticleOENumber redovi se skupljaju kroz batch i pišu jednim upsert-om
+        self.oem_writer = ArticleOENumberWriter(page_size=OEM_FLUSH_SIZE)
+
+        # Product izmjene se buffer-uju i pišu jednim UPDATE-om svakih flush_size proizvoda
+        self.product_writer = ProductUpdateWriter(
+            PRODUCT_UPDATE_COLUMNS,
+            extra_set=PRODUCT_UPDATE_EXTRA_SET,
+            flush_size=flush_size
+        )
+        # product_id -> stats ključevi koji se broje tek nakon commit-a (flush_pending_writes)
+        self.pending_stats: Dict[str, List[str]] = {}
+
         # Statistics
         self.stats = {
             'total': 0,
@@ -101,126 +146,56 @@ class TecDocAdvancedEnricher:
         Sprječava MySQL connection timeout greške.
         """
         try:
-            # Pokušaj jednostavan query da testiraš konekciju
-            self.tecdoc_conn.ping(reconnect=True, attempts=3, delay=1)
+            self.tecdoc_conn.ensure_alive()
         except mysql.connector.Error as e:
-            logging.warning(f"MySQL connection lost, reconnecting... Error: {e}")
-            try:
-                self.tecdoc_conn = mysql.connector.connect(
-                    host="localhost",
-                    user="tecdoc_user",
-                    password="tecdoc_password_2025",
-                    database="tecdoc1q2019",
-                    charset='utf8mb4',
-                    autocommit=True,
-                    connection_timeout=300
-                )
-                logging.info("✅ MySQL reconnected successfully")
-            except mysql.connector.Error as reconnect_error:
-                logging.error(f"❌ Failed to reconnect to MySQL: {reconnect_error}")
-                raise
+            logging.error(f"❌ Failed to reconnect to MySQL: {e}")
+            raise
 
     # ===================================================================
     # NORMALIZACIJA FUNKCIJA
     # ===================================================================
 
     def normalize_catalog(self, catalog: str) -> str:
-        """Normalizacija kataloš   kog broja"""
-        if not catalog:
-            return ""
-
-        # Uppercase + remove spaces, dashes, dots
-        normalized = catalog.upper()
-        normalized = re.sub(r'[\s\-\./]', '', normalized)
-
-        return normalized
+        """Normalizacija kataloškog broja (uppercase, bez razmaka, -, ., /)"""
+        return normalize_number(catalog)
 
     def should_skip_oem_matching(self, oem: str) -> bool:
-        """
-        Provjeri da li je OEM vrijednost placeholder/invalid
-
-        Skipuje:
-        - Prazne vrijednosti
-        - Placeholder vrijednosti kao "0", "N/A", "NONE"
-        - Veoma kratke vrijednosti (< 3 karaktera)
-        """
-        if not oem:
-            return True
-
-        oem_clean = oem.strip().upper()
-
-        # Placeholder values
-        placeholder_values = ['0', 'N/A', 'NA', 'NONE', '-', '/', 'X', 'XX', 'XXX']
-        if oem_clean in placeholder_values:
-            return True
-
-        # Too short to be a valid OEM
-        if len(oem_clean) < 3:
-            return True
-
-        # All zeros (0, 00, 000, 0000, etc.)
-        if oem_clean.replace('0', '') == '':
-            return True
-
-        return False
+        """Provjeri da li je OEM vrijednost placeholder/invalid (vidi tecdoc_normalize.PLACEHOLDER_PATTERNS)"""
+        return is_placeholder_oem(oem)
 
     def normalize_oem(self, oem: str) -> List[str]:
         """
         Normalizacija OEM broja - vraća liste varijanti
 
         Primjer:
-        "A 004 094 24 04" → ["A00409424 04", "00409424 04"]
+        "A 004 094 24 04" → ["A0040942404", "0040942404"]
         """
-        if not oem:
-            return []
-
-        # Uppercase + remove spaces, dashes, slashes
-        normalized = oem.upper()
-        normalized = re.sub(r'[\s\-\./]', '', normalized)
-
-        variants = [normalized]
-
-        # Varijante sa/bez početnog "A"
-        if normalized.startswith('A'):
-            variants.append(normalized[1:])
-        else:
-            variants.append('A' + normalized)
-
-        # Varijante sa/bez vodećih nula (opcionalno)
-        # no_leading_zeros = normalized.lstrip('0')
-        # if no_leading_zeros and no_leading_zeros != normalized:
-        #     variants.append(no_leading_zeros)
-
-        return list(set(variants))  # Remove duplicates
+        return oem_variants(oem)
 
     # ===================================================================
     # MATCHING FUNKCIJE (5 NIVOA)
     # ===================================================================
 
+    @metrics.timed('db')
     def find_by_catalog_exact(self, catalog: str) -> Optional[int]:
         """Nivo 1: Exact match kataloškog broja"""
-        cursor = self.tecdoc_conn.cursor()
-
         query = """
             SELECT id FROM articles
             WHERE DataSupplierArticleNumber = %s
             LIMIT 1
         """
 
-        cursor.execute(query, (catalog,))
-        result = cursor.fetchone()
-        cursor.close()
+        result = self.tecdoc_conn.fetchone_cached(query, (catalog,))
 
         return result[0] if result else None
 
+    @metrics.timed('db')
     def find_by_catalog_normalized(self, catalog: str) -> Optional[int]:
         """Nivo 2: Normalized match kataloškog broja"""
         normalized = self.normalize_catalog(catalog)
         if not normalized:
             return None
 
-        cursor = self.tecdoc_conn.cursor()
-
         # Search by normalized (uppercase, no spaces)
         query = """
             SELECT id FROM articles
@@ -230,47 +205,39 @@ class TecDocAdvancedEnricher:
             LIMIT 1
         """
 
-        cursor.execute(query, (normalized,))
-        result = cursor.fetchone()
-        cursor.close()
+        result = self.tecdoc_conn.fetchone_cached(query, (normalized,))
 
         return result[0] if result else None
 
+    @metrics.timed('db')
     def find_by_ean_exact(self, ean: str) -> Optional[int]:
         """Nivo 0: EAN exact match (najviši prioritet!)"""
         if not ean:
             return None
 
-        cursor = self.tecdoc_conn.cursor()
-
         query = """
             SELECT article_id FROM article_ea_numbers
             WHERE EAN = %s
             LIMIT 1
         """
 
-        cursor.execute(query, (ean,))
-        result = cursor.fetchone()
-        cursor.close()
+        result = self.tecdoc_conn.fetchone_cached(query, (ean,))
 
         return result[0] if result else None
 
+    @metrics.timed('db')
     def find_by_oem_exact(self, oem: str) -> Optional[int]:
         """Nivo 3: Exact match OEM broja"""
         if not oem:
             return None
 
-        cursor = self.tecdoc_conn.cursor()
-
         query = """
             SELECT article_id FROM article_oe_numbers
             WHERE OENbr = %s
             LIMIT 1
         """
 
-        cursor.execute(query, (oem,))
-        result = cursor.fetchone()
-        cursor.close()
+        result = self.tecdoc_conn.fetchone_cached(query, (oem,))
 
         return result[0] if result else None
 
@@ -279,29 +246,63 @@ class TecDocAdvancedEnricher:
         if not oem:
             return None
 
-        variants = self.normalize_oem(oem)
+        if oem not in self.oem_normalized_cache:
+            self.oem_normalized_cache.update(self.find_by_oem_normalized_bulk([oem]))
+        return self.oem_normalized_cache.get(oem)
+
+    @metrics.timed('db')
+    def find_by_oem_normalized_bulk(self, oems: List[str]) -> Dict[str, Optional[int]]:
+        """
+        Normalized match za više OEM-ova odjednom.
+
+        Sve varijante svih OEM-ova idu u jedan IN upit (po chunk-u) nad
+        normalizovanim OENbr; za svaki OEM bira se pogodak sa najboljim
+        rangom varijante (0 = normalizovani OEM, 1 = sa/bez "A").
 
+        Returns:
+            {oem: article_id ili None}
+        """
+        variant_owners = defaultdict(list)  # variant → [(oem, rank)]
+        for oem in set(filter(None, oems)):
+            for rank, variant in enumerate(self.normalize_oem(oem)):
+                variant_owners[variant].append((oem, rank))
+
+        best = {}  # oem → (rank, article_id)
+        variants = list(variant_owners)
         cursor = self.tecdoc_conn.cursor()
 
-        for variant in variants:
-            query = """
-                SELECT article_id FROM article_oe_numbers
-                WHERE REPLACE(REPLACE(REPLACE(REPLACE(
-                    UPPER(OENbr),
-                    ' ', ''), '-', ''), '.', ''), '/', '') = %s
-                LIMIT 1
+        for start in range(0, len(variants), OEM_VARIANT_CHUNK_SIZE):
+            chunk = variants[start:start + OEM_VARIANT_CHUNK_SIZE]
+            placeholders = ','.join(['%s'] * len(chunk))
+            query = f"""
+                SELECT {NORMALIZED_OENBR_SQL} AS variant, MIN(article_id)
+                FROM article_oe_numbers
+                WHERE {NORMALIZED_OENBR_SQL} IN ({placeholders})
+                GROUP BY variant
             """
+            cursor.execute(query, chunk)
+            for variant, article_id in cursor.fetchall():
+                # MySQL collation je case/accent-insensitive - vrati se na naš ključ
+                owners = variant_owners.get(variant) or variant_owners.get(variant.upper(), [])
+                for oem, rank in owners:
+                    if oem not in best or rank < best[oem][0]:
+                        best[oem] = (rank, article_id)
 
-            cursor.execute(query, (variant,))
-            result = cursor.fetchone()
+        cursor.close()
 
-            if result:
-                cursor.close()
-                return result[0]
+        result = {oem: None for oem in oems if oem}
+        result.update({oem: article_id for oem, (rank, article_id) in best.items()})
+        return result
 
-        cursor.close()
-        return None
+    def prefetch_oem_normalized(self, products: List[Dict]):
+        """Nivo 4 za cijeli batch u jednom upitu (samo proizvodi koji još nemaju TecDoc artikal)"""
+        oems = [
+            product.get('oemNumber') for product in products
+            if not product.get('tecdocArticleId') and not self.should_skip_oem_matching(product.get('oemNumber'))
+        ]
+        self.oem_normalized_cache = self.find_by_oem_normalized_bulk(oems) if oems else {}
 
+    @metrics.timed('match')
     def advanced_match(self, catalog: str, oem: str = None, ean: str = None) -> MatchResult:
         """
         Multi-level matching strategy
@@ -354,6 +355,7 @@ class TecDocAdvancedEnricher:
     # DATA EXTRACTION FUNKCIJE
     # ===================================================================
 
+    @metrics.timed('db')
     def get_basic_article_data(self, article_id: int) -> Dict:
         """Osnovni podaci o artiklu"""
         cursor = self.tecdoc_conn.cursor()
@@ -385,6 +387,7 @@ class TecDocAdvancedEnricher:
 
         return {}
 
+    @metrics.timed('db')
     def get_ean_codes(self, article_id: int) -> List[str]:
         """Izvuci EAN kodove"""
         cursor = self.tecdoc_conn.cursor()
@@ -401,6 +404,7 @@ class TecDocAdvancedEnricher:
 
         return ean_codes
 
+    @metrics.timed('db')
     def get_oem_numbers_with_manufacturers(self, article_id: int) -> List[Dict]:
         """Izvuci OEM brojeve sa proizvođačima"""
         cursor = self.tecdoc_conn.cursor()
@@ -427,6 +431,7 @@ class TecDocAdvancedEnricher:
         cursor.close()
         return oem_numbers
 
+    @metrics.timed('db')
     def get_technical_specs(self, article_id: int) -> Dict:
         """
         Izvuci tehničke specifikacije
@@ -468,6 +473,7 @@ class TecDocAdvancedEnricher:
         cursor.close()
         return specs
 
+    @metrics.timed('db')
     def get_vehicles_from_tree_node(self, article_id: int, limit: int = 500) -> List[Dict]:
         """
         KOREKTNO izvlačenje vozila preko tree_node_products
@@ -530,6 +536,7 @@ class TecDocAdvancedEnricher:
         cursor.close()
         return vehicles
 
+    @metrics.timed('db')
     def get_cross_references(self, article_id: int, limit: int = 20) -> List[Dict]:
         """Pronađi ekvivalentne proizvode"""
         # Prvo izvuci OEM brojeve
@@ -601,64 +608,74 @@ class TecDocAdvancedEnricher:
 
     def update_product(self, product_id: str, tecdoc_data: TecDocData):
         """
-        Update Product tabelu
+        Dodaj Product izmjene u buffer (UPDATE radi flush_pending_writes)
         """
-        cursor = self.postgres_conn.cursor()
-
         # Konstruiraj EAN string (prvi EAN ili prazan string)
         ean_code = tecdoc_data.ean_codes[0] if tecdoc_data.ean_codes else None
 
-        query = """
-            UPDATE "Product"
-            SET
-                "tecdocArticleId" = %s,
-                "tecdocProductId" = %s,
-                "eanCode" = COALESCE(%s, "eanCode"),
-                "technicalSpecs" = %s,
-                "tecdocEnrichedAt" = NOW(),
-                "updatedAt" = NOW()
-            WHERE id = %s
-        """
-
-        cursor.execute(query, (
-            tecdoc_data.article_id,
-            tecdoc_data.tecdoc_product_id,
-            ean_code,
-            json.dumps(tecdoc_data.technical_specs),
-            product_id
-        ))
-
-        self.postgres_conn.commit()
-        cursor.close()
+        self.product_writer.add(
+            product_id,
+            tecdocArticleId=tecdoc_data.article_id,
+            tecdocProductId=tecdoc_data.tecdoc_product_id,
+            eanCode=ean_code,
+            technicalSpecs=json.dumps(tecdoc_data.technical_specs)
+        )
 
     def upsert_oem_numbers(self, product_id: str, oem_numbers: List[Dict]):
         """
-        Insert/Update OEM brojeve u ArticleOENumber tabelu
+        Dodaj OEM brojeve u batch buffer (ArticleOENumber upsert radi flush_pending_writes)
         """
-        cursor = self.postgres_conn.cursor()
-
         for oem_data in oem_numbers:
-            query = """
-                INSERT INTO "ArticleOENumber" (
-                    id, "productId", "oemNumber", manufacturer, "referenceType", "createdAt", "updatedAt"
-                )
-                VALUES (
-                    gen_random_uuid()::text, %s, %s, %s, 'Original', NOW(), NOW()
-                )
-                ON CONFLICT ("productId", "oemNumber") DO UPDATE
-                SET manufacturer = EXCLUDED.manufacturer,
-                    "updatedAt" = NOW()
-            """
+            self.oem_writer.add(product_id, oem_data['oem'], oem_data['manufacturer'])
 
-            cursor.execute(query, (
-                product_id,
-                oem_data['oem'],
-                oem_data['manufacturer']
-            ))
+    @metrics.timed('write')
+    def flush_pending_writes(self):
+        """
+        Jedna transakcija: UPDATE "Product" ... FROM (VALUES ...) za buffered
+        proizvode + jedan ArticleOENumber upsert, pa commit.
 
-        self.postgres_conn.commit()
-        cursor.close()
+        Proizvodi čiji UPDATE ne prođe (writer ih ponavlja red po red) ne dobijaju
+        ni OEM redove; ako propadne cijela transakcija, greška se bilježi za
+        svaki proizvod iz buffera. Uspješni se tek tada broje u stats.
+        """
+        products = len(self.product_writer)
+        oems = len(self.oem_writer)
+        if not products and not oems:
+            return
 
+        try:
+            written = self.product_writer.flush(self.postgres_conn)
+            failed = dict(self.product_writer.failed)
+            for product_id in failed:
+                self.oem_writer.discard_product(product_id)
+            oems = len(self.oem_writer)
+            inserted = self.oem_writer.flush(self.postgres_conn)
+            self.postgres_conn.commit()
+        except Exception as e:
+            self.postgres_conn.rollback()
+            logging.error(f"❌ Flush failed ({products} products, {oems} OEM rows): {e}")
+            failed = {product_id: str(e) for product_id in self.product_writer.product_ids()}
+            failed.update(self.product_writer.failed)
+            self.oem_writer.take()
+            written = inserted = 0
+        self.product_writer.clear()
+
+        for product_id, keys in self.pending_stats.items():
+            if product_id in failed:
+                continue
+            for key in keys:
+                self.stats[key] += 1
+        self.pending_stats = {}
+
+        for product_id, error in failed.items():
+            logging.error(f"  ❌ Product {product_id} not updated: {error}")
+        self.stats['errors'] += len(failed)
+
+        if written:
+            logging.info(f"💾 Flushed {written}/{products} products ({self.product_writer.rows_per_second:.0f} rows/s), "
+                         f"OEM: {oems} rows ({inserted} new)")
+
+    @metrics.timed('db')
     def get_or_create_manufacturer(self, tecdoc_manufacturer: str, tecdoc_id: int) -> Optional[str]:
         """
         Pronađi ili kreiraj proizvođača u Manufacturer tabeli
@@ -715,6 +732,7 @@ class TecDocAdvancedEnricher:
     # MAIN PROCESSING
     # ===================================================================
 
+    @metrics.timed('product')
     def process_product(self, product: Dict) -> bool:
         """
         Procesira jedan proizvod
@@ -742,6 +760,7 @@ class TecDocAdvancedEnricher:
                 # Napredno pretraživanje
                 match_result = self.advanced_match(catalog, oem, ean)
 
+                metrics.count(f"match.{match_result.method}")
                 if not match_result.article_id:
                     logging.warning(f"  → NOT FOUND in TecDoc")
                     self.stats['not_found'] += 1
@@ -759,15 +778,17 @@ class TecDocAdvancedEnricher:
             # Update OEM brojeve
             if tecdoc_data.oem_numbers:
                 self.upsert_oem_numbers(product_id, tecdoc_data.oem_numbers)
-                self.stats['oem_updated'] += 1
 
-            # Update EAN if found
-            if tecdoc_data.ean_codes:
-                self.stats['ean_updated'] += 1
+            # EAN/OEM/specs se broje tek kad flush_pending_writes commit-uje izmjene
+            self.pending_stats[product_id] = [
+                key for key, found in (('ean_updated', tecdoc_data.ean_codes),
+                                       ('oem_updated', tecdoc_data.oem_numbers),
+                                       ('specs_updated', tecdoc_data.technical_specs))
+                if found
+            ]
 
-            # Update specs
-            if tecdoc_data.technical_specs:
-                self.stats['specs_updated'] += 1
+            if self.product_writer.is_full() or len(self.oem_writer) >= OEM_FLUSH_SIZE:
+                self.flush_pending_writes()
 
             # Update vozila (TODO: implement vehicle mapping)
             if tecdoc_data.vehicles:
@@ -783,6 +804,9 @@ class TecDocAdvancedEnricher:
         except Exception as e:
             logging.error(f"  ❌ ERROR processing {catalog}: {str(e)}")
             self.stats['errors'] += 1
+            self.product_writer.discard_product(product_id)
+            self.oem_writer.discard_product(product_id)
+            self.pending_stats.pop(product_id, None)
             return False
 
     def run_batch(self, limit: int = 50, offset: int = 0, filter_mode: str = 'all'):
@@ -840,6 +864,9 @@ class TecDocAdvancedEnricher:
         logging.info(f"BATCH START: {total} products (filter: {filter_mode})")
         logging.info(f"=" * 70)
 
+        # Nivo 4 (OEM normalized) za cijeli batch u jednom upitu
+        self.prefetch_oem_normalized(products)
+
         # Process each product
         for i, product in enumerate(products, 1):
             self.stats['total'] += 1
@@ -858,6 +885,8 @@ class TecDocAdvancedEnricher:
                 logging.info(f"Specs updated: {self.stats['specs_updated']}")
                 logging.info(f"Errors: {self.stats['errors']}")
 
+        self.flush_pending_writes()
+
         # Final stats
         logging.info(f"\n" + "=" * 70)
         logging.info(f"BATCH COMPLETED")
@@ -866,9 +895,12 @@ class TecDocAdvancedEnricher:
         logging.info(f"=" * 70)
 
     def close(self):
-        """Zatvori konekcije"""
+        """Zatvori konekcije (vraćaju se u pool) i ispiši DB timing"""
+        self.flush_pending_writes()
         self.tecdoc_conn.close()
         self.postgres_conn.close()
+        log_timing_summary()
+        metrics.finish(stats=self.stats)
 
 
 # ===================================================================
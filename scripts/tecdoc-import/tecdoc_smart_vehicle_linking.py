@@ -7,22 +7,36 @@ Features:
 - Smart mapping: Marke → Modeli → Generacije → Motori
 - ExternalId tracking (TecDoc ID → tvoj ID)
 - Validacija (max vozila per proizvod)
-- DRY RUN mode (prvo loguj, pa onda update)
-- Cleanup mode (obriši postojeće pogrešne linkove)
+- OEM filter marki za cijeli batch jednim upitom (proizvod → dozvoljene marke),
+  grupe proizvođača i normalizacija imena marki kao lookup tabele
+- DRY RUN mode (prvo loguj, pa onda update) - plan se računa set-based
+  (staging tabela + jedan upit), CSV report iz plana
+- Cleanup mode (obriši postojeće pogrešne linkove) - replace-set po batch-u:
+  briše samo fitmente kojih više nema, upisuje samo nove
 - Auto-create marki/modela/generacija/motora ako ne postoje
+- LIVE batch kao pipeline: TecDoc readeri (threadovi) → validator → jedan
+  Postgres writer koji commit-uje po batch-u proizvoda; bounded queue-ovi
+  (backpressure) i throughput po fazi na kraju run-a
 
 Autor: Claude Code
 Datum: 22. decembar 2025.
 """
 
 import psycopg2
-import mysql.connector
+from psycopg2.extras import execute_values
 from typing import Dict, List, Optional, Tuple
 import json
 import logging
+import queue
+import threading
+import time
 from datetime import datetime
 import re
 
+from tecdoc_db import chunked, log_timing_summary, postgres_pool
+from tecdoc_metrics import metrics
+from tecdoc_snapshot import connect_tecdoc
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -33,31 +47,73 @@ logging.basicConfig(
     ]
 )
 
+# Kraj toka u pipeline queue-ovima
+_PIPELINE_DONE = object()
+
+
+class StageMetrics:
+    """
+    Throughput jedne faze pipeline-a
+
+    busy    - rad faze (upiti, validacija)
+    idle    - čekanje na ulazni queue (faza prije je sporija)
+    blocked - čekanje na pun izlazni queue (backpressure - faza poslije je sporija)
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        self.idle = 0.0
+        self.blocked = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, items: int = 0, busy: float = 0.0, idle: float = 0.0, blocked: float = 0.0):
+        with self._lock:
+            self.items += items
+            self.busy += busy
+            self.idle += idle
+            self.blocked += blocked
+
+    def log(self, elapsed: float):
+        rate = self.items / elapsed if elapsed > 0 else 0.0
+        logging.info(f"  {self.name:10} {self.items:>6} items  {rate:>8.1f}/s  "
+                     f"busy {self.busy:>7.1f}s  idle {self.idle:>7.1f}s  blocked {self.blocked:>7.1f}s")
+
+
 class SmartVehicleLinker:
     """
     Pametno linkovanje vozila iz TecDoc-a u tvoju strukturu
     """
 
-    def __init__(self, dry_run: bool = True):
-        # TecDoc MySQL (read-only)
-        self.tecdoc_conn = mysql.connector.connect(
+    def __init__(self, dry_run: bool = True, tecdoc_snapshot: Optional[str] = None):
+        # TecDoc MySQL (read-only) - iz zajedničkog pool-a (health check + reconnect),
+        # ili lokalni snapshot (tecdoc_snapshot / TECDOC_SNAPSHOT env).
+        # Pipeline readeri otvaraju svoje konekcije sa istim config-om.
+        self.tecdoc_snapshot = tecdoc_snapshot
+        self.tecdoc_config = dict(
             host="localhost",
             user="tecdoc_user",
             password="tecdoc_password_2025",
             database="tecdoc1q2019",
-            charset='utf8mb4'
+            charset='utf8mb4',
+            autocommit=True
         )
+        self.tecdoc_conn = connect_tecdoc(tecdoc_snapshot, **self.tecdoc_config)
 
         # Postgres (read-write)
-        self.postgres_conn = psycopg2.connect(
+        self.postgres_conn = postgres_pool(
             host="localhost",
             database="omerbasicdb",
             user="postgres",
             password="123456789EmIna!"
-        )
+        ).connection()
 
         self.dry_run = dry_run
 
+        # Pipeline writer odgađa commit (commit po batch-u proizvoda)
+        self.defer_commits = False
+
         # Cache za performance
         self.brand_cache = {}  # {tecdoc_name: {id, externalId}}
         self.model_cache = {}  # {tecdoc_model_id: {id, externalId}}
@@ -76,10 +132,14 @@ class SmartVehicleLinker:
             'engines_created': 0,
             'engines_found': 0,
             'fitments_created': 0,
+            'fitments_updated': 0,
+            'fitments_deleted': 0,
+            'fitments_unchanged': 0,
             'fitments_skipped_universal': 0,
             'fitments_skipped_too_many': 0,
             'errors': 0
         }
+        self._stats_lock = threading.Lock()
 
         # Config - BALANCED MODE (sa OEM filteringom!)
         self.MAX_VEHICLES_PER_PRODUCT = 200   # Max total vehicles
@@ -89,6 +149,11 @@ class SmartVehicleLinker:
         self.MAX_ENGINES_PER_GENERATION = 15   # Max engine variants per generation
         self.REQUIRE_ENGINE_SPEC = True        # Obavezno engine_id
 
+        # Pipeline (LIVE run_batch)
+        self.PIPELINE_READERS = 4              # TecDoc reader threadova (svaki svoja konekcija)
+        self.PIPELINE_QUEUE_SIZE = 32          # Bounded queue između faza (backpressure)
+        self.WRITE_BATCH_PRODUCTS = 20         # Proizvoda po Postgres commit-u
+
         # Manufacturer Groups (za OEM filtering)
         self.MANUFACTURER_GROUPS = {
             'VW': ['VOLKSWAGEN', 'VW', 'AUDI', 'SEAT', 'SKODA', 'ŠKODA', 'PORSCHE', 'BENTLEY', 'LAMBORGHINI', 'BUGATTI', 'VAG'],
@@ -104,15 +169,33 @@ class SmartVehicleLinker:
             'HYUNDAI': ['HYUNDAI', 'KIA', 'GENESIS']
         }
 
+        # Lookup tabele (računaju se jednom, ne po proizvodu):
+        # proizvođač → sve marke njegove grupe (prva grupa pobjeđuje)
+        self.manufacturer_group_lookup = {}
+        for brands in self.MANUFACTURER_GROUPS.values():
+            group = frozenset(b.upper() for b in brands)
+            for brand in group:
+                self.manufacturer_group_lookup.setdefault(brand, group)
+
+        # TecDoc ime marke → normalizovano ime (load_brand_name_lookup)
+        self.brand_name_lookup = {}
+
     # ===================================================================
     # HELPER FUNCTIONS
     # ===================================================================
 
     def normalize_brand_name(self, name: str) -> str:
-        """Normalizuj ime marke za matching"""
+        """Normalizuj ime marke za matching (lookup tabela, vidi load_brand_name_lookup)"""
         if not name:
             return ""
 
+        normalized = self.brand_name_lookup.get(name)
+        if normalized is None:
+            normalized = self._normalize_brand_name(name)
+            self.brand_name_lookup[name] = normalized
+        return normalized
+
+    def _normalize_brand_name(self, name: str) -> str:
         # VW/Volkswagen special case
         if name.upper() in ['VW', 'VOLKSWAGEN', 'VAG']:
             return 'Volkswagen'
@@ -128,6 +211,17 @@ class SmartVehicleLinker:
         # Capitalize first letter
         return name.strip().title()
 
+    @metrics.timed('db')
+    def load_brand_name_lookup(self):
+        """Sve TecDoc marke (manufacturers) → normalizovano ime, jednim upitom"""
+        cursor = self.tecdoc_conn.cursor()
+        cursor.execute("SELECT DISTINCT Description FROM manufacturers WHERE Description IS NOT NULL")
+        for (name,) in cursor.fetchall():
+            self.brand_name_lookup[name] = self._normalize_brand_name(name)
+        cursor.close()
+
+        logging.info(f"  → Brand name lookup: {len(self.brand_name_lookup)} TecDoc manufacturers")
+
     def create_slug(self, text: str) -> str:
         """Kreiraj slug za model"""
         slug = text.lower()
@@ -136,25 +230,30 @@ class SmartVehicleLinker:
         slug = slug.strip('-')
         return slug[:100]  # Limit length
 
-    def get_oem_manufacturers(self, product_id: str) -> List[str]:
+    def _count(self, key: str, n: int = 1):
+        """Thread-safe brojač (pipeline readeri i validator dijele pragove)"""
+        with self._stats_lock:
+            self.stats[key] += n
+
+    def _commit(self):
+        """Commit upisa - u pipeline-u ga odgađa writer (commit po batch-u)"""
+        if not self.defer_commits:
+            self.postgres_conn.commit()
+
+    def _rollback(self, error: Exception):
         """
-        Izvuci OEM manufacturers za proizvod iz ArticleOENumber
+        Rollback nakon greške upisa. U pipeline-u bi rollback odbacio cijeli
+        batch, pa se greška propušta writer-u (ROLLBACK TO SAVEPOINT proizvoda)
         """
-        cursor = self.postgres_conn.cursor()
+        if self.defer_commits:
+            raise error
+        self.postgres_conn.rollback()
 
-        query = """
-            SELECT DISTINCT manufacturer
-            FROM "ArticleOENumber"
-            WHERE "productId" = %s
-              AND manufacturer IS NOT NULL
-              AND manufacturer != ''
+    def get_oem_manufacturers(self, product_id: str) -> List[str]:
         """
-
-        cursor.execute(query, (product_id,))
-        manufacturers = [row[0].upper() for row in cursor.fetchall()]
-        cursor.close()
-
-        return manufacturers
+        Izvuci OEM manufacturers za proizvod iz ArticleOENumber
+        """
+        return self.get_oem_manufacturers_bulk([product_id]).get(product_id, [])
 
     def get_allowed_vehicle_brands(self, oem_manufacturers: List[str]) -> List[str]:
         """
@@ -170,22 +269,41 @@ class SmartVehicleLinker:
         for oem_mfr in oem_manufacturers:
             oem_upper = oem_mfr.upper()
 
-            # Nađi grupu kojoj pripada
-            for group_name, brands in self.MANUFACTURER_GROUPS.items():
-                if oem_upper in brands:
-                    # Dodaj sve brendove iz iste grupe
-                    allowed_brands.update([b.upper() for b in brands])
-                    break
+            # Sve marke iz iste grupe, ili (ako nije u grupi) samo taj proizvođač
+            group = self.manufacturer_group_lookup.get(oem_upper)
+            if group:
+                allowed_brands.update(group)
             else:
-                # Ako nije u grupi, dodaj samo tog proizvođača
                 allowed_brands.add(oem_upper)
 
         return list(allowed_brands)
 
+    @metrics.timed('db')
+    def get_allowed_brands_bulk(self, product_ids: List[str]) -> Dict[str, List[str]]:
+        """
+        Proizvod → dozvoljene vehicle marke za cijeli batch
+
+        Jedan grupisani upit nad ArticleOENumber; proizvodi sa istim skupom
+        OEM proizvođača dijele izračunatu listu. Proizvodi bez OEM brojeva
+        nisu u rezultatu (ne filtriraju se po marki).
+        """
+        allowed_by_set = {}
+        allowed = {}
+        for product_id, manufacturers in self.get_oem_manufacturers_bulk(product_ids).items():
+            key = frozenset(manufacturers)
+            if key not in allowed_by_set:
+                allowed_by_set[key] = self.get_allowed_vehicle_brands(manufacturers)
+            allowed[product_id] = allowed_by_set[key]
+
+        logging.info(f"  → OEM brand filter: {len(allowed)}/{len(product_ids)} products, "
+                     f"{len(allowed_by_set)} distinct brand sets")
+        return allowed
+
     # ===================================================================
     # GET OR CREATE FUNCTIONS
     # ===================================================================
 
+    @metrics.timed('db')
     def get_or_create_brand(self, tecdoc_manufacturer_name: str, tecdoc_manufacturer_id: int) -> Optional[str]:
         """
         Pronađi ili kreiraj marku
@@ -237,7 +355,7 @@ class SmartVehicleLinker:
                     WHERE id = %s AND "externalId" IS NULL
                 """
                 cursor.execute(update_query, (str(tecdoc_manufacturer_id), brand_id))
-                self.postgres_conn.commit()
+                self._commit()
 
             self.brand_cache[cache_key] = {'id': brand_id, 'externalId': str(tecdoc_manufacturer_id)}
             cursor.close()
@@ -261,7 +379,7 @@ class SmartVehicleLinker:
         try:
             cursor.execute(query, (normalized_name, str(tecdoc_manufacturer_id)))
             brand_id = cursor.fetchone()[0]
-            self.postgres_conn.commit()
+            self._commit()
 
             self.brand_cache[cache_key] = {'id': brand_id, 'externalId': str(tecdoc_manufacturer_id)}
             self.stats['brands_created'] += 1
@@ -270,10 +388,11 @@ class SmartVehicleLinker:
 
         except Exception as e:
             logging.error(f"    ERROR creating brand {normalized_name}: {str(e)}")
-            self.postgres_conn.rollback()
             cursor.close()
+            self._rollback(e)
             return None
 
+    @metrics.timed('db')
     def get_or_create_model(self, brand_id: str, tecdoc_model_name: str, tecdoc_model_id: int) -> Optional[str]:
         """
         Pronađi ili kreiraj model
@@ -322,7 +441,7 @@ class SmartVehicleLinker:
                     WHERE id = %s AND "externalId" IS NULL
                 """
                 cursor.execute(update_query, (str(tecdoc_model_id), model_id))
-                self.postgres_conn.commit()
+                self._commit()
 
             self.model_cache[cache_key] = {'id': model_id, 'externalId': str(tecdoc_model_id)}
             cursor.close()
@@ -346,7 +465,7 @@ class SmartVehicleLinker:
         try:
             cursor.execute(query, (tecdoc_model_name, brand_id, str(tecdoc_model_id)))
             model_id = cursor.fetchone()[0]
-            self.postgres_conn.commit()
+            self._commit()
 
             self.model_cache[cache_key] = {'id': model_id, 'externalId': str(tecdoc_model_id)}
             self.stats['models_created'] += 1
@@ -355,10 +474,11 @@ class SmartVehicleLinker:
 
         except Exception as e:
             logging.error(f"      ERROR creating model {tecdoc_model_name}: {str(e)}")
-            self.postgres_conn.rollback()
             cursor.close()
+            self._rollback(e)
             return None
 
+    @metrics.timed('db')
     def get_or_create_generation(
         self,
         model_id: str,
@@ -414,7 +534,7 @@ class SmartVehicleLinker:
                     WHERE id = %s AND "externalId" IS NULL
                 """
                 cursor.execute(update_query, (str(tecdoc_vehicle_id), generation_id))
-                self.postgres_conn.commit()
+                self._commit()
 
             self.generation_cache[cache_key] = {'id': generation_id, 'externalId': str(tecdoc_vehicle_id)}
             cursor.close()
@@ -456,7 +576,7 @@ class SmartVehicleLinker:
                 production_end
             ))
             generation_id = cursor.fetchone()[0]
-            self.postgres_conn.commit()
+            self._commit()
 
             self.generation_cache[cache_key] = {'id': generation_id, 'externalId': str(tecdoc_vehicle_id)}
             self.stats['generations_created'] += 1
@@ -465,10 +585,11 @@ class SmartVehicleLinker:
 
         except Exception as e:
             logging.error(f"        ERROR creating generation {tecdoc_vehicle_name}: {str(e)}")
-            self.postgres_conn.rollback()
             cursor.close()
+            self._rollback(e)
             return None
 
+    @metrics.timed('db')
     def get_or_create_engine(
         self,
         generation_id: str,
@@ -526,7 +647,7 @@ class SmartVehicleLinker:
                     WHERE id = %s AND "externalId" IS NULL
                 """
                 cursor.execute(update_query, (str(tecdoc_engine_id), engine_id))
-                self.postgres_conn.commit()
+                self._commit()
 
             self.engine_cache[cache_key] = {'id': engine_id, 'externalId': str(tecdoc_engine_id)}
             cursor.close()
@@ -556,7 +677,7 @@ class SmartVehicleLinker:
         try:
             cursor.execute(query, (generation_id, tecdoc_engine_desc, str(tecdoc_engine_id)))
             engine_id = cursor.fetchone()[0]
-            self.postgres_conn.commit()
+            self._commit()
 
             self.engine_cache[cache_key] = {'id': engine_id, 'externalId': str(tecdoc_engine_id)}
             self.stats['engines_created'] += 1
@@ -565,15 +686,17 @@ class SmartVehicleLinker:
 
         except Exception as e:
             logging.error(f"          ERROR creating engine {tecdoc_engine_desc}: {str(e)}")
-            self.postgres_conn.rollback()
             cursor.close()
+            self._rollback(e)
             return None
 
     # ===================================================================
     # VEHICLE EXTRACTION FROM TECDOC
     # ===================================================================
 
-    def get_vehicles_from_tecdoc(self, tecdoc_article_id: int, limit: int = 200, allowed_brands: List[str] = None) -> List[Dict]:
+    @metrics.timed('db')
+    def get_vehicles_from_tecdoc(self, tecdoc_article_id: int, limit: int = 200, allowed_brands: List[str] = None,
+                                 conn=None) -> List[Dict]:
         """
         Izvuci vozila iz TecDoc-a za dati article_id
 
@@ -583,8 +706,9 @@ class SmartVehicleLinker:
             tecdoc_article_id: TecDoc article ID
             limit: Max broj vozila
             allowed_brands: Optional lista dozvoljenih marki (primjenjuje se PRE LIMIT-a!)
+            conn: TecDoc konekcija (pipeline reader) - default self.tecdoc_conn
         """
-        cursor = self.tecdoc_conn.cursor()
+        cursor = (conn or self.tecdoc_conn).cursor()
 
         # Prvo dohvati product_id
         query = "SELECT CurrentProduct FROM articles WHERE id = %s"
@@ -695,64 +819,191 @@ class SmartVehicleLinker:
         # Log summary
         logging.info(f"  📊 Summary: {vehicle_count} vehicles, {unique_generations} gen, {unique_models} models, {unique_manufacturers} brands (max {max_engines_in_gen} engines/gen)")
 
+        if not self._check_limits(vehicle_count, unique_manufacturers, unique_models,
+                                  unique_generations, max_engines_in_gen):
+            return False
+
+        # Show top generations
+        from collections import Counter
+        generation_counts = Counter()
+        for v in vehicles:
+            gen_key = f"{v['manufacturer_name']} {v['model_name']} {v['vehicle_name']}"
+            generation_counts[gen_key] += 1
+
+        logging.info(f"  📋 Top generations:")
+        for gen, count in generation_counts.most_common(5):
+            logging.info(f"     - {gen}: {count} variants")
+
+        if len(generation_counts) > 5:
+            logging.info(f"     ... and {len(generation_counts) - 5} more generations")
+
+        logging.info(f"  ✅ Validation PASSED")
+        return True
+
+    def _check_limits(self, vehicle_count: int, unique_manufacturers: int, unique_models: int,
+                      unique_generations: int, max_engines_in_gen: int) -> bool:
+        """Pragovi (MAX_*) - zajednički za validate_vehicle_count i COUNT probe"""
         # Validation 1: Too many total vehicles
         if vehicle_count > self.MAX_VEHICLES_PER_PRODUCT:
             logging.warning(f"  ⚠️  TOO MANY vehicles ({vehicle_count} > {self.MAX_VEHICLES_PER_PRODUCT})! SKIPPING.")
-            self.stats['fitments_skipped_too_many'] += 1
+            self._count('fitments_skipped_too_many')
             return False
 
         # Validation 2: Too many brands
         if unique_manufacturers > self.MAX_BRANDS:
             logging.warning(f"  ⚠️  TOO MANY brands ({unique_manufacturers} > {self.MAX_BRANDS})! SKIPPING.")
-            self.stats['fitments_skipped_universal'] += 1
+            self._count('fitments_skipped_universal')
             return False
 
         # Validation 3: Too many different models
         if unique_models > self.MAX_MODELS:
             logging.warning(f"  ⚠️  TOO MANY models ({unique_models} > {self.MAX_MODELS})! SKIPPING.")
-            self.stats['fitments_skipped_universal'] += 1
+            self._count('fitments_skipped_universal')
             return False
 
         # Validation 4: Too many different generations
         if unique_generations > self.MAX_GENERATIONS:
             logging.warning(f"  ⚠️  TOO MANY generations ({unique_generations} > {self.MAX_GENERATIONS})! SKIPPING.")
-            self.stats['fitments_skipped_universal'] += 1
+            self._count('fitments_skipped_universal')
             return False
 
         # Validation 5: Too many engines per generation (NOVO!)
         if max_engines_in_gen > self.MAX_ENGINES_PER_GENERATION:
             logging.warning(f"  ⚠️  TOO MANY engine variants per generation ({max_engines_in_gen} > {self.MAX_ENGINES_PER_GENERATION})! SKIPPING.")
-            self.stats['fitments_skipped_universal'] += 1
+            self._count('fitments_skipped_universal')
             return False
 
-        # Show top generations
-        from collections import Counter
-        generation_counts = Counter()
-        for v in vehicles:
-            gen_key = f"{v['manufacturer_name']} {v['model_name']} {v['vehicle_name']}"
-            generation_counts[gen_key] += 1
+        return True
 
-        logging.info(f"  📋 Top generations:")
-        for gen, count in generation_counts.most_common(5):
-            logging.info(f"     - {gen}: {count} variants")
+    @metrics.timed('db')
+    def probe_vehicle_counts(self, tecdoc_article_ids: List[int], chunk_size: int = 500) -> Dict[int, Dict[str, Dict]]:
+        """
+        COUNT-first probe: agregati vozila za više artikala, bez prenosa redova
 
-        if len(generation_counts) > 5:
-            logging.info(f"     ... and {len(generation_counts) - 5} more generations")
+        Isti DISTINCT skup kao get_vehicles_from_tecdoc, ali se u MySQL-u
+        odmah agregira po (TecDoc product, marka). Agregati po marki su
+        aditivni, pa se OEM filter marki (različit po proizvodu) primjenjuje
+        naknadno u validate_probe().
 
-        logging.info(f"  ✅ Validation PASSED")
-        return True
+        Returns: {article_id: {manufacturer_name: {vehicles, models, generations, max_engines}}}
+        """
+        cursor = self.tecdoc_conn.cursor()
+        probes = {}
+
+        for article_chunk in chunked(dict.fromkeys(tecdoc_article_ids), chunk_size):
+            placeholders = ', '.join(['%s'] * len(article_chunk))
+            cursor.execute(
+                f"SELECT id, CurrentProduct FROM articles WHERE id IN ({placeholders})",
+                tuple(article_chunk)
+            )
+            article_products = {article_id: product_id for article_id, product_id in cursor.fetchall() if product_id}
+            if not article_products:
+                continue
+
+            product_ids = list(set(article_products.values()))
+            placeholders = ', '.join(['%s'] * len(product_ids))
+            query = f"""
+                SELECT
+                    g.product_id,
+                    g.manufacturer_name,
+                    SUM(g.vehicles),
+                    COUNT(DISTINCT g.model_name),
+                    COUNT(DISTINCT g.vehicle_internal_id),
+                    MAX(g.engines)
+                FROM (
+                    SELECT
+                        d.product_id,
+                        d.manufacturer_name,
+                        d.model_name,
+                        d.vehicle_internal_id,
+                        COUNT(*) as vehicles,
+                        COUNT(DISTINCT d.engine_id) as engines
+                    FROM (
+                        SELECT DISTINCT
+                            tnp.product_id as product_id,
+                            mf.Description as manufacturer_name,
+                            mf.id as manufacturer_id,
+                            m.Description as model_name,
+                            m.id as model_id,
+                            pc.Description as vehicle_name,
+                            pc.internalID as vehicle_internal_id,
+                            YEAR(pc.From) as year_from,
+                            YEAR(pc.To) as year_to,
+                            e.Description as engine_desc,
+                            e.id as engine_id
+                        FROM tree_node_products tnp
+                        JOIN passengercars pc ON tnp.itemId = pc.internalID AND tnp.tree_id = 1
+                        JOIN models m ON pc.Model = m.id
+                        JOIN manufacturers mf ON m.ManufacturerId = mf.id
+                        JOIN passengercars_link_engines ple ON pc.id = ple.car_id
+                        JOIN engines e ON ple.engine_id = e.id
+                        WHERE tnp.product_id IN ({placeholders})
+                          AND tnp.valid_state = 1
+                          AND e.id IS NOT NULL
+                    ) d
+                    GROUP BY d.product_id, d.manufacturer_name, d.model_name, d.vehicle_internal_id
+                ) g
+                GROUP BY g.product_id, g.manufacturer_name
+            """
+            cursor.execute(query, tuple(product_ids))
+
+            by_product = {}
+            for product_id, manufacturer_name, vehicles, models, generations, max_engines in cursor.fetchall():
+                by_product.setdefault(product_id, {})[manufacturer_name] = {
+                    'vehicles': int(vehicles),
+                    'models': int(models),
+                    'generations': int(generations),
+                    'max_engines': int(max_engines or 0)
+                }
+
+            for article_id, product_id in article_products.items():
+                probes[article_id] = by_product.get(product_id, {})
+
+        cursor.close()
+        return probes
+
+    def validate_probe(self, probe: Dict[str, Dict], allowed_brands: Optional[List[str]] = None) -> bool:
+        """
+        Pragovi nad COUNT probe-om (prije get_vehicles_from_tecdoc)
+
+        Probe vidi cijeli skup vozila (bez LIMIT-a), pa se proizvodi preko
+        MAX_VEHICLES_PER_PRODUCT odbijaju umjesto da se validira odsječena lista.
+
+        Returns: True ako treba dohvatiti vozila, False ako se proizvod preskače
+        """
+        if allowed_brands:
+            allowed = {brand.upper() for brand in allowed_brands}
+            probe = {name: counts for name, counts in probe.items() if name and name.upper() in allowed}
+
+        if not probe:
+            logging.warning(f"  ⚠️  No vehicles found")
+            return False
+
+        vehicle_count = sum(counts['vehicles'] for counts in probe.values())
+        unique_models = sum(counts['models'] for counts in probe.values())
+        unique_generations = sum(counts['generations'] for counts in probe.values())
+        max_engines_in_gen = max(counts['max_engines'] for counts in probe.values())
+
+        logging.info(f"  🔎 Probe: {vehicle_count} vehicles, {unique_generations} gen, {unique_models} models, {len(probe)} brands (max {max_engines_in_gen} engines/gen)")
+
+        return self._check_limits(vehicle_count, len(probe), unique_models,
+                                  unique_generations, max_engines_in_gen)
 
     # ===================================================================
     # FITMENT CREATION
     # ===================================================================
 
-    def upsert_vehicle_fitments(self, product_id: str, vehicles: List[Dict]):
+    @metrics.timed('write')
+    def upsert_vehicle_fitments(self, product_id: str, vehicles: List[Dict], fitments: Optional[List[Tuple]] = None):
         """
         Kreiraj/update ProductVehicleFitment zapise
 
         Logika:
         - Ako ima engine_id → linkuj sa engine
         - Ako nema engine_id → linkuj samo sa generation
+
+        fitments: ako je zadana lista, fitmenti se samo skupljaju u nju
+        (za replace_fitments), umjesto upisa red po red
         """
         cursor = self.postgres_conn.cursor()
 
@@ -812,7 +1063,7 @@ class SmartVehicleLinker:
             # 4. Linkuj sa generacijom (bez motora ako nema)
             if not data['engines']:
                 # Nema motora → linkuj samo sa generacijom
-                self._create_fitment(product_id, generation_id, None, vehicle)
+                self._create_fitment(product_id, generation_id, None, vehicle, fitments)
             else:
                 # Ima motore → linkuj sa svakim motorom
                 for engine_data in data['engines']:
@@ -823,23 +1074,36 @@ class SmartVehicleLinker:
                     )
 
                     if engine_id:
-                        self._create_fitment(product_id, generation_id, engine_id, vehicle)
+                        self._create_fitment(product_id, generation_id, engine_id, vehicle, fitments)
                     else:
                         # Ako nije kreiran motor, linkuj samo sa generacijom
-                        self._create_fitment(product_id, generation_id, None, vehicle)
+                        self._create_fitment(product_id, generation_id, None, vehicle, fitments)
 
         cursor.close()
 
+    @metrics.timed('write')
     def _create_fitment(
         self,
         product_id: str,
         generation_id: str,
         engine_id: Optional[str],
-        vehicle_data: Dict
+        vehicle_data: Dict,
+        fitments: Optional[List[Tuple]] = None
     ):
         """
-        Kreiraj jedan ProductVehicleFitment zapis
+        Kreiraj jedan ProductVehicleFitment zapis (ili ga dodaj u fitments)
         """
+        if fitments is not None:
+            fitments.append((
+                product_id,
+                generation_id,
+                engine_id,
+                vehicle_data['year_from'],
+                vehicle_data['year_to'],
+                str(vehicle_data['vehicle_internal_id'])
+            ))
+            return
+
         if self.dry_run:
             engine_info = f" + Engine: {vehicle_data.get('engine_desc')}" if engine_id else ""
             logging.info(
@@ -902,7 +1166,7 @@ class SmartVehicleLinker:
                 str(vehicle_data['vehicle_internal_id'])
             ))
 
-        self.postgres_conn.commit()
+        self._commit()
         self.stats['fitments_created'] += 1
         cursor.close()
 
@@ -910,6 +1174,7 @@ class SmartVehicleLinker:
     # CLEANUP
     # ===================================================================
 
+    @metrics.timed('write')
     def cleanup_existing_fitments(self, product_id: str):
         """
         Obriši postojeće fitmente za proizvod
@@ -927,19 +1192,670 @@ class SmartVehicleLinker:
 
         cursor.execute(query, (product_id,))
         deleted_count = cursor.rowcount
-        self.postgres_conn.commit()
+        self._commit()
         cursor.close()
 
         if deleted_count > 0:
             logging.info(f"  🗑️  Deleted {deleted_count} existing fitments")
 
+    @metrics.timed('write')
+    def replace_fitments(self, product_ids: List[str], fitments: List[Tuple], delete: bool = True) -> Dict[str, int]:
+        """
+        Replace-set fitmenata za batch proizvoda
+
+        Novi skup (product_id, generation_id, engine_id, year_from, year_to,
+        external_vehicle_id) ide u temp tabelu, pa se poredi sa postojećim po
+        ključu @@unique([productId, generationId, engineId]):
+        - delete=True (cleanup): DELETE redova kojih nema u novom skupu i
+          UPDATE redova kojima su se promijenile godine/externalVehicleId
+        - INSERT samo ključeva koji ne postoje
+
+        Nepromijenjeni redovi se ne diraju (nema DELETE + INSERT cijelog skupa,
+        pa ni bloat-a tabele). Commit radi pozivalac - cijeli batch je jedna
+        transakcija.
+
+        Returns: {'deleted', 'updated', 'inserted', 'unchanged'}
+        """
+        # Isti ključ više puta: prvi pobjeđuje (kao INSERT ... ON CONFLICT)
+        unique = {}
+        for row in fitments:
+            unique.setdefault(row[:3], row)
+
+        cursor = self.postgres_conn.cursor()
+        try:
+            cursor.execute("""
+                CREATE TEMP TABLE IF NOT EXISTS replace_fitments (
+                    product_id text,
+                    generation_id text,
+                    engine_id text,
+                    year_from integer,
+                    year_to integer,
+                    external_vehicle_id text
+                ) ON COMMIT DELETE ROWS
+            """)
+            cursor.execute("TRUNCATE replace_fitments")
+            if unique:
+                execute_values(cursor, "INSERT INTO replace_fitments VALUES %s",
+                               list(unique.values()), page_size=5000)
+
+            deleted = updated = 0
+            if delete:
+                cursor.execute("""
+                    DELETE FROM "ProductVehicleFitment" f
+                    WHERE f."productId" = ANY(%s)
+                      AND NOT EXISTS (
+                          SELECT 1 FROM replace_fitments n
+                          WHERE n.product_id = f."productId"
+                            AND n.generation_id = f."generationId"
+                            AND n.engine_id IS NOT DISTINCT FROM f."engineId"
+                      )
+                """, (product_ids,))
+                deleted = cursor.rowcount
+
+                cursor.execute("""
+                    UPDATE "ProductVehicleFitment" f
+                    SET "yearFrom" = n.year_from,
+                        "yearTo" = n.year_to,
+                        "externalVehicleId" = n.external_vehicle_id,
+                        "updatedAt" = NOW()
+                    FROM replace_fitments n
+                    WHERE f."productId" = n.product_id
+                      AND f."generationId" = n.generation_id
+                      AND f."engineId" IS NOT DISTINCT FROM n.engine_id
+                      AND (f."yearFrom", f."yearTo", f."externalVehicleId")
+                          IS DISTINCT FROM (n.year_from, n.year_to, n.external_vehicle_id)
+                """)
+                updated = cursor.rowcount
+
+            # engineId NULL ne pravi konflikt na unique indeksu - zato NOT EXISTS
+            cursor.execute("""
+                INSERT INTO "ProductVehicleFitment" (
+                    id, "productId", "generationId", "engineId",
+                    "yearFrom", "yearTo", "isUniversal",
+                    "externalVehicleId", "createdAt", "updatedAt"
+                )
+                SELECT
+                    gen_random_uuid()::text, n.product_id, n.generation_id, n.engine_id,
+                    n.year_from, n.year_to, FALSE,
+                    n.external_vehicle_id, NOW(), NOW()
+                FROM replace_fitments n
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM "ProductVehicleFitment" f
+                    WHERE f."productId" = n.product_id
+                      AND f."generationId" = n.generation_id
+                      AND f."engineId" IS NOT DISTINCT FROM n.engine_id
+                )
+                ON CONFLICT ("productId", "generationId", "engineId") DO NOTHING
+            """)
+            inserted = cursor.rowcount
+        finally:
+            cursor.close()
+
+        return {
+            'deleted': deleted,
+            'updated': updated,
+            'inserted': inserted,
+            'unchanged': max(len(unique) - updated - inserted, 0)
+        }
+
+    def _count_fitments(self, result: Dict[str, int]):
+        """Statistika replace_fitments (tek nakon uspješnog commit-a)"""
+        self.stats['fitments_created'] += result['inserted']
+        self.stats['fitments_updated'] += result['updated']
+        self.stats['fitments_deleted'] += result['deleted']
+        self.stats['fitments_unchanged'] += result['unchanged']
+
+    # ===================================================================
+    # DRY RUN PLAN (set-based)
+    # ===================================================================
+
+    @metrics.timed('db')
+    def get_oem_manufacturers_bulk(self, product_ids: List[str]) -> Dict[str, List[str]]:
+        """
+        OEM manufacturers za više proizvoda jednim upitom
+
+        Returns: {product_id: [MANUFACTURER, ...]}
+        """
+        cursor = self.postgres_conn.cursor()
+        cursor.execute("""
+            SELECT "productId", array_agg(DISTINCT UPPER(manufacturer))
+            FROM "ArticleOENumber"
+            WHERE "productId" = ANY(%s)
+              AND manufacturer IS NOT NULL
+              AND manufacturer != ''
+            GROUP BY "productId"
+        """, (product_ids,))
+
+        manufacturers = {product_id: list(names) for product_id, names in cursor.fetchall()}
+        cursor.close()
+
+        return manufacturers
+
+    @metrics.timed('plan')
+    def plan_dry_run(self, products: List[Dict], report_path: Optional[str] = None, cleanup: bool = False):
+        """
+        Dry run bez per-row Postgres upita
+
+        1. Dozvoljene marke za sve proizvode (jedan upit)
+        2. Vozila iz TecDoc-a + validacija (po proizvodu, kao u live modu)
+        3. Sva vozila → staging tabela dry_run_vehicles (execute_values)
+        4. Jedan upit razrješava marku/model/generaciju/motor (externalId,
+           pa ime - isti redoslijed kao get_or_create_*) i postojeći fitment
+           → dry_run_plan sa akcijom po vozilu
+        5. CSV report direktno iz dry_run_plan (COPY)
+        6. cleanup: koliko postojećih fitmenata bi replace_fitments obrisao
+           (ključ nije u planu) i ažurirao (promijenjene godine/externalVehicleId)
+           - za iste proizvode kao live mod (obrađeni + preskočeni)
+
+        Staging tabele su ON COMMIT DROP, a transakcija se na kraju
+        rollback-uje - baza ostaje netaknuta.
+        """
+        allowed_by_product = self.get_allowed_brands_bulk([p['id'] for p in products])
+        probes = self.probe_vehicle_counts([p['tecdocArticleId'] for p in products if p.get('tecdocArticleId')])
+
+        staged = []
+        cleanup_ids = []
+        for i, product in enumerate(products, 1):
+            tecdoc_article_id = product.get('tecdocArticleId')
+            if not tecdoc_article_id:
+                logging.warning(f"[{product['catalogNumber']}] No tecdocArticleId, skipping")
+                continue
+
+            logging.info(f"[{i}/{len(products)}] [{product['catalogNumber']}] {product['name']}")
+
+            try:
+                allowed_brands = allowed_by_product.get(product['id'])
+
+                if not self.validate_probe(probes.get(tecdoc_article_id, {}), allowed_brands):
+                    cleanup_ids.append(product['id'])
+                    continue
+
+                vehicles = self.get_vehicles_from_tecdoc(tecdoc_article_id, allowed_brands=allowed_brands)
+                if not vehicles:
+                    logging.warning(f"  ⚠️  No vehicles found")
+                    cleanup_ids.append(product['id'])
+                    continue
+
+                if not self.validate_vehicle_count(vehicles, product['name']):
+                    cleanup_ids.append(product['id'])
+                    continue
+
+                for vehicle in vehicles:
+                    staged.append((
+                        product['id'],
+                        str(vehicle['manufacturer_id']),
+                        self.normalize_brand_name(vehicle['manufacturer_name']),
+                        str(vehicle['model_id']),
+                        vehicle['model_name'],
+                        str(vehicle['vehicle_internal_id']),
+                        vehicle['vehicle_name'],
+                        vehicle['year_from'],
+                        vehicle['year_to'],
+                        str(vehicle['engine_id']) if vehicle['engine_id'] else None,
+                        vehicle['engine_desc'],
+                        len(staged)
+                    ))
+                cleanup_ids.append(product['id'])
+                self.stats['products_processed'] += 1
+
+            except Exception as e:
+                logging.error(f"  ❌ ERROR: {str(e)}")
+                self.stats['errors'] += 1
+
+        cursor = self.postgres_conn.cursor()
+        try:
+            cursor.execute("""
+                CREATE TEMP TABLE dry_run_vehicles (
+                    product_id text,
+                    manufacturer_id text,
+                    manufacturer_name text,
+                    model_id text,
+                    model_name text,
+                    vehicle_internal_id text,
+                    vehicle_name text,
+                    year_from integer,
+                    year_to integer,
+                    engine_id text,
+                    engine_desc text,
+                    position integer
+                ) ON COMMIT DROP
+            """)
+            execute_values(cursor, "INSERT INTO dry_run_vehicles VALUES %s", staged, page_size=5000)
+
+            cursor.execute("""
+                CREATE TEMP TABLE dry_run_plan ON COMMIT DROP AS
+                SELECT
+                    v.*,
+                    b.id AS brand_id,
+                    m.id AS vehicle_model_id,
+                    g.id AS generation_id,
+                    e.id AS vehicle_engine_id,
+                    f.id AS fitment_id,
+                    CASE
+                        WHEN b.id IS NULL THEN 'create_brand'
+                        WHEN m.id IS NULL THEN 'create_model'
+                        WHEN g.id IS NULL THEN 'create_generation'
+                        -- bez TecDoc motora linker linkuje samo generaciju (engineId NULL)
+                        WHEN e.id IS NULL AND v.engine_id IS NOT NULL
+                             AND COALESCE(v.engine_desc, '') <> '' THEN 'create_engine'
+                        WHEN f.id IS NOT NULL THEN 'exists'
+                        ELSE 'link'
+                    END AS action
+                FROM dry_run_vehicles v
+                LEFT JOIN LATERAL (
+                    SELECT id FROM "VehicleBrand"
+                    WHERE "externalId" = v.manufacturer_id OR LOWER(name) = LOWER(v.manufacturer_name)
+                    ORDER BY ("externalId" = v.manufacturer_id) DESC NULLS LAST
+                    LIMIT 1
+                ) b ON TRUE
+                LEFT JOIN LATERAL (
+                    SELECT id FROM "VehicleModel"
+                    WHERE "brandId" = b.id
+                      AND ("externalId" = v.model_id OR LOWER(name) = LOWER(v.model_name))
+                    ORDER BY ("externalId" = v.model_id) DESC NULLS LAST
+                    LIMIT 1
+                ) m ON TRUE
+                LEFT JOIN LATERAL (
+                    SELECT id FROM "VehicleGeneration"
+                    WHERE "modelId" = m.id
+                      AND ("externalId" = v.vehicle_internal_id OR LOWER(name) = LOWER(v.vehicle_name))
+                    ORDER BY ("externalId" = v.vehicle_internal_id) DESC NULLS LAST
+                    LIMIT 1
+                ) g ON TRUE
+                LEFT JOIN LATERAL (
+                    SELECT id FROM "VehicleEngine"
+                    WHERE "generationId" = g.id
+                      AND COALESCE(v.engine_desc, '') <> ''
+                      AND ("externalId" = v.engine_id OR LOWER("engineType") = LOWER(v.engine_desc))
+                    ORDER BY ("externalId" = v.engine_id) DESC NULLS LAST
+                    LIMIT 1
+                ) e ON TRUE
+                LEFT JOIN "ProductVehicleFitment" f
+                    ON f."productId" = v.product_id
+                   AND f."generationId" = g.id
+                   AND f."engineId" IS NOT DISTINCT FROM e.id
+            """)
+
+            cursor.execute("""
+                SELECT
+                    COUNT(DISTINCT manufacturer_id) FILTER (WHERE action = 'create_brand'),
+                    COUNT(DISTINCT (manufacturer_id, model_id))
+                        FILTER (WHERE action IN ('create_brand', 'create_model')),
+                    COUNT(DISTINCT (manufacturer_id, model_id, vehicle_internal_id))
+                        FILTER (WHERE action IN ('create_brand', 'create_model', 'create_generation')),
+                    COUNT(DISTINCT (manufacturer_id, model_id, vehicle_internal_id, engine_id))
+                        FILTER (WHERE action != 'link' AND action != 'exists'),
+                    COUNT(*) FILTER (WHERE action != 'exists'),
+                    COUNT(*) FILTER (WHERE action = 'exists')
+                FROM dry_run_plan
+            """)
+            (brands, models, generations, engines, fitments, existing) = cursor.fetchone()
+            self.stats['brands_created'] += brands
+            self.stats['models_created'] += models
+            self.stats['generations_created'] += generations
+            self.stats['engines_created'] += engines
+            self.stats['fitments_created'] += fitments
+
+            logging.info(f"\n  📋 DRY RUN plan: {fitments} fitments to link ({existing} already exist), "
+                         f"new: {brands} brands, {models} models, {generations} generations, {engines} engines")
+
+            if cleanup:
+                # Isto poređenje kao replace_fitments: postojeći red ostaje samo ako ga
+                # 'exists' red plana pogađa (isti ključ, prvi po redoslijedu pobjeđuje)
+                cursor.execute("""
+                    SELECT
+                        COUNT(*) FILTER (WHERE n.fitment_id IS NULL),
+                        COUNT(*) FILTER (
+                            WHERE n.fitment_id IS NOT NULL
+                              AND (f."yearFrom", f."yearTo", f."externalVehicleId")
+                                  IS DISTINCT FROM (n.year_from, n.year_to, n.vehicle_internal_id)
+                        )
+                    FROM "ProductVehicleFitment" f
+                    LEFT JOIN (
+                        SELECT DISTINCT ON (fitment_id) fitment_id, year_from, year_to, vehicle_internal_id
+                        FROM dry_run_plan
+                        WHERE action = 'exists'
+                        ORDER BY fitment_id, position
+                    ) n ON n.fitment_id = f.id
+                    WHERE f."productId" = ANY(%s)
+                """, (cleanup_ids,))
+                deleted, updated = cursor.fetchone()
+                self.stats['fitments_deleted'] += deleted
+                self.stats['fitments_updated'] += updated
+                logging.info(f"  🧹 DRY RUN cleanup ({len(cleanup_ids)} products): "
+                             f"{deleted} fitments to delete, {updated} to update")
+
+            if report_path:
+                with open(report_path, 'w', newline='', encoding='utf-8') as f:
+                    cursor.copy_expert("""
+                        COPY (
+                            SELECT
+                                pl.product_id,
+                                p."catalogNumber" AS catalog_number,
+                                pl.action,
+                                pl.manufacturer_name,
+                                pl.model_name,
+                                pl.vehicle_name,
+                                pl.engine_desc,
+                                pl.year_from,
+                                pl.year_to,
+                                pl.manufacturer_id AS tecdoc_manufacturer_id,
+                                pl.model_id AS tecdoc_model_id,
+                                pl.vehicle_internal_id AS tecdoc_vehicle_id,
+                                pl.engine_id AS tecdoc_engine_id,
+                                pl.generation_id,
+                                pl.vehicle_engine_id AS engine_id
+                            FROM dry_run_plan pl
+                            JOIN "Product" p ON p.id = pl.product_id
+                            ORDER BY p."catalogNumber", pl.manufacturer_name, pl.model_name,
+                                     pl.vehicle_name, pl.engine_desc
+                        ) TO STDOUT WITH CSV HEADER
+                    """, f)
+                logging.info(f"  📄 Report: {report_path} ({fitments + existing} rows)")
+        finally:
+            cursor.close()
+            # Dry run - ništa se ne commit-uje (staging tabele nestaju)
+            self.postgres_conn.rollback()
+
+    # ===================================================================
+    # PIPELINE (LIVE run_batch)
+    # ===================================================================
+
+    def _pipeline_put(self, q: queue.Queue, item, stop: threading.Event, stage_metrics: StageMetrics):
+        """put sa backpressure-om: čeka mjesto u queue-u dok pipeline radi"""
+        started = time.perf_counter()
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                break
+            except queue.Full:
+                continue
+        stage_metrics.add(blocked=time.perf_counter() - started)
+
+    def _pipeline_get(self, q: queue.Queue, stop: threading.Event, stage_metrics: StageMetrics):
+        """get koji odustaje kad se pipeline zaustavi (vraća None)"""
+        started = time.perf_counter()
+        item = None
+        while not stop.is_set():
+            try:
+                item = q.get(timeout=0.5)
+                break
+            except queue.Empty:
+                continue
+        stage_metrics.add(idle=time.perf_counter() - started)
+        return item
+
+    def _clear_vehicle_caches(self):
+        """Nakon rollback-a keš može sadržavati ID-eve koji nisu commit-ovani"""
+        self.brand_cache.clear()
+        self.model_cache.clear()
+        self.generation_cache.clear()
+        self.engine_cache.clear()
+
+    @metrics.timed('product')
+    def _read_product(self, conn, index: int, total: int, product: Dict,
+                      allowed_by_product: Dict[str, List[str]], probes: Dict[int, Dict]) -> Optional[Dict]:
+        """
+        Jedan proizvod u reader fazi: OEM filter → COUNT probe → vozila
+
+        Returns: {'product', 'vehicles'}, {'product', 'skipped'} (ne prolazi
+        pragove - writer ga uključuje u cleanup) ili {'product', 'error'};
+        None ako proizvod nema TecDoc artikal
+        """
+        tecdoc_article_id = product.get('tecdocArticleId')
+        if not tecdoc_article_id:
+            logging.warning(f"[{product['catalogNumber']}] No tecdocArticleId, skipping")
+            return None
+
+        logging.info(f"[{index}/{total}] [{product['catalogNumber']}] {product['name']}")
+
+        try:
+            allowed_brands = allowed_by_product.get(product['id'])
+
+            if not self.validate_probe(probes.get(tecdoc_article_id, {}), allowed_brands):
+                return {'product': product, 'skipped': True}
+
+            vehicles = self.get_vehicles_from_tecdoc(tecdoc_article_id, allowed_brands=allowed_brands, conn=conn)
+            if not vehicles:
+                logging.warning(f"  ⚠️  [{product['catalogNumber']}] No vehicles found")
+                return {'product': product, 'skipped': True}
+
+            return {'product': product, 'vehicles': vehicles}
+
+        except Exception as e:
+            logging.error(f"  ❌ [{product['catalogNumber']}] ERROR: {str(e)}")
+            return {'product': product, 'error': e}
+
+    def _pipeline_reader(self, products_queue: queue.Queue, vehicles_queue: queue.Queue, total: int,
+                         allowed_by_product: Dict[str, List[str]], probes: Dict[int, Dict],
+                         stop: threading.Event, stage_metrics: StageMetrics):
+        """Faza 1 (thread): TecDoc reader sa svojom konekcijom"""
+        conn = None
+        try:
+            conn = connect_tecdoc(self.tecdoc_snapshot, **self.tecdoc_config)
+            while not stop.is_set():
+                try:
+                    index, product = products_queue.get_nowait()
+                except queue.Empty:
+                    break
+
+                started = time.perf_counter()
+                item = self._read_product(conn, index, total, product, allowed_by_product, probes)
+                stage_metrics.add(items=1, busy=time.perf_counter() - started)
+
+                if item is not None:
+                    self._pipeline_put(vehicles_queue, item, stop, stage_metrics)
+
+        except Exception as e:
+            # Konekcija nije otvorena - ostali readeri preuzimaju proizvode
+            logging.error(f"  ❌ Reader ERROR: {str(e)}")
+        finally:
+            if conn is not None:
+                conn.close()
+            self._pipeline_put(vehicles_queue, _PIPELINE_DONE, stop, stage_metrics)
+
+    def _pipeline_validator(self, vehicles_queue: queue.Queue, write_queue: queue.Queue, readers: int,
+                            stop: threading.Event, stage_metrics: StageMetrics):
+        """Faza 2 (thread): pragovi nad listom vozila"""
+        done = 0
+        try:
+            while done < readers:
+                item = self._pipeline_get(vehicles_queue, stop, stage_metrics)
+                if item is None:
+                    break
+                if item is _PIPELINE_DONE:
+                    done += 1
+                    continue
+
+                # Greške i preskočeni proizvodi idu dalje - writer ih broji / čisti
+                started = time.perf_counter()
+                if 'vehicles' in item:
+                    try:
+                        if not self.validate_vehicle_count(item['vehicles'], item['product']['name']):
+                            item = {'product': item['product'], 'skipped': True}
+                    except Exception as e:
+                        item = {'product': item['product'], 'error': e}
+                stage_metrics.add(items=1, busy=time.perf_counter() - started)
+
+                self._pipeline_put(write_queue, item, stop, stage_metrics)
+        finally:
+            self._pipeline_put(write_queue, _PIPELINE_DONE, stop, stage_metrics)
+
+    def _new_write_batch(self) -> Dict:
+        return {'product_ids': [], 'fitments': [], 'linked': 0}
+
+    @metrics.timed('write')
+    def _write_product(self, cursor, item: Dict, batch: Dict, cleanup: bool):
+        """
+        Jedan proizvod u writer fazi (savepoint - greška poništava samo njega)
+
+        Marke/modeli/generacije/motori se razrješavaju odmah, a fitmenti se
+        skupljaju u batch za replace_fitments. Preskočeni proizvod (cleanup)
+        ulazi u batch bez fitmenata - postojeći linkovi mu se brišu.
+        """
+        product = item['product']
+        if 'error' in item:
+            self.stats['errors'] += 1
+            return
+        if item.get('skipped'):
+            if cleanup:
+                batch['product_ids'].append(product['id'])
+            return
+
+        fitments = []
+        cursor.execute("SAVEPOINT link_product")
+        try:
+            logging.info(f"  → [{product['catalogNumber']}] Linking {len(item['vehicles'])} vehicles...")
+            self.upsert_vehicle_fitments(product['id'], item['vehicles'], fitments=fitments)
+            cursor.execute("RELEASE SAVEPOINT link_product")
+
+        except Exception as e:
+            logging.error(f"  ❌ [{product['catalogNumber']}] ERROR: {str(e)}")
+            cursor.execute("ROLLBACK TO SAVEPOINT link_product")
+            self._clear_vehicle_caches()
+            self.stats['errors'] += 1
+            return
+
+        batch['product_ids'].append(product['id'])
+        batch['fitments'].extend(fitments)
+        batch['linked'] += 1
+
+    @metrics.timed('write')
+    def _flush_writes(self, batch: Dict, cleanup: bool) -> Dict:
+        """
+        Replace-set fitmenata + commit batch-a (jedna transakcija)
+
+        Returns: prazan batch
+        """
+        linked = batch['linked']
+        try:
+            result = None
+            if batch['product_ids']:
+                result = self.replace_fitments(batch['product_ids'], batch['fitments'], delete=cleanup)
+            self.postgres_conn.commit()
+
+            self.stats['products_processed'] += linked
+            if result:
+                self._count_fitments(result)
+                logging.info(f"  💾 Committed {linked} products: +{result['inserted']} "
+                             f"~{result['updated']} -{result['deleted']} ={result['unchanged']} fitments")
+        except psycopg2.Error as e:
+            logging.error(f"  ❌ Batch commit failed ({linked} products): {str(e)}")
+            self.postgres_conn.rollback()
+            self._clear_vehicle_caches()
+            self.stats['errors'] += linked
+        return self._new_write_batch()
+
+    def _pipeline_writer(self, write_queue: queue.Queue, cleanup: bool,
+                         stop: threading.Event, stage_metrics: StageMetrics):
+        """Faza 3 (main thread): jedini Postgres writer, commit po WRITE_BATCH_PRODUCTS"""
+        cursor = self.postgres_conn.cursor()
+        batch = self._new_write_batch()
+        self.defer_commits = True
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    item = write_queue.get(timeout=1.0)
+                except queue.Empty:
+                    stage_metrics.add(idle=time.perf_counter() - started)
+                    # Readeri kasne - ne drži otvorenu transakciju
+                    if batch['product_ids']:
+                        batch = self._flush_writes(batch, cleanup)
+                    continue
+                stage_metrics.add(idle=time.perf_counter() - started)
+
+                if item is _PIPELINE_DONE:
+                    break
+
+                started = time.perf_counter()
+                self._write_product(cursor, item, batch, cleanup)
+                if len(batch['product_ids']) >= self.WRITE_BATCH_PRODUCTS:
+                    batch = self._flush_writes(batch, cleanup)
+                stage_metrics.add(items=1, busy=time.perf_counter() - started)
+
+            self._flush_writes(batch, cleanup)
+        finally:
+            self.defer_commits = False
+            cursor.close()
+
+    def run_pipeline(self, products: List[Dict], cleanup: bool = False):
+        """
+        LIVE linkovanje kao pipeline
+
+        1. Dozvoljene marke + COUNT probe za sve proizvode (po jedan upit)
+        2. PIPELINE_READERS threadova: vozila iz TecDoc-a → vehicles_queue
+        3. Validator thread: validate_vehicle_count → write_queue
+        4. Writer (ovaj thread): jedina Postgres konekcija, savepoint po
+           proizvodu; po WRITE_BATCH_PRODUCTS proizvoda replace_fitments +
+           commit (cleanup briše samo fitmente kojih više nema)
+
+        Queue-ovi su bounded (PIPELINE_QUEUE_SIZE) - kad writer kasni, readeri
+        čekaju umjesto da gomilaju vozila u memoriji. Na kraju se loguje
+        throughput i busy/idle/blocked vrijeme po fazi.
+        """
+        total = len(products)
+        allowed_by_product = self.get_allowed_brands_bulk([p['id'] for p in products])
+        probes = self.probe_vehicle_counts([p['tecdocArticleId'] for p in products if p['tecdocArticleId']])
+
+        products_queue = queue.Queue()
+        for index, product in enumerate(products, 1):
+            products_queue.put((index, product))
+        vehicles_queue = queue.Queue(maxsize=self.PIPELINE_QUEUE_SIZE)
+        write_queue = queue.Queue(maxsize=self.PIPELINE_QUEUE_SIZE)
+
+        stop = threading.Event()
+        stage_metrics = {name: StageMetrics(name) for name in ('read', 'validate', 'write')}
+        readers = max(1, min(self.PIPELINE_READERS, total))
+
+        threads = [
+            threading.Thread(
+                target=self._pipeline_reader,
+                args=(products_queue, vehicles_queue, total, allowed_by_product, probes, stop, stage_metrics['read']),
+                name=f"tecdoc-reader-{n}",
+                daemon=True
+            )
+            for n in range(readers)
+        ]
+        threads.append(threading.Thread(
+            target=self._pipeline_validator,
+            args=(vehicles_queue, write_queue, readers, stop, stage_metrics['validate']),
+            name="validator",
+            daemon=True
+        ))
+
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        try:
+            self._pipeline_writer(write_queue, cleanup, stop, stage_metrics['write'])
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        elapsed = time.perf_counter() - started
+
+        # Proizvodi koje nijedan reader nije preuzeo (npr. TecDoc konekcija pala)
+        unread = products_queue.qsize()
+        if unread:
+            logging.error(f"  ❌ {unread} products not read from TecDoc")
+            self.stats['errors'] += unread
+
+        logging.info(f"\n⏱️  Pipeline: {readers} readers, {elapsed:.1f}s")
+        for stage in stage_metrics.values():
+            stage.log(elapsed)
+
     # ===================================================================
     # MAIN PROCESSING
     # ===================================================================
 
-    def process_product(self, product: Dict, cleanup: bool = False):
+    @metrics.timed('product')
+    def process_product(self, product: Dict, cleanup: bool = False, probe: Optional[Dict[str, Dict]] = None):
         """
         Procesira jedan proizvod - linkuje vozila
+
+        probe: rezultat probe_vehicle_counts za ovaj artikal - ako ne prođe
+        pragove, vozila se uopće ne dohvataju iz TecDoc-a
         """
         product_id = product['id']
         catalog = product['catalogNumber']
@@ -955,8 +1871,9 @@ class SmartVehicleLinker:
         logging.info(f"TecDoc Article ID: {tecdoc_article_id}")
 
         try:
-            # 1. Cleanup existing fitments if requested
-            if cleanup:
+            # 1. Cleanup (LIVE): replace-set na kraju - postojeći fitmenti kojih
+            #    nema u novom skupu se brišu, nepromijenjeni ostaju
+            if cleanup and self.dry_run:
                 self.cleanup_existing_fitments(product_id)
 
             # 2. Get OEM manufacturers and allowed brands (BEFORE getting vehicles!)
@@ -968,33 +1885,51 @@ class SmartVehicleLinker:
                 logging.info(f"  → OEM Manufacturers: {', '.join(oem_manufacturers)}")
                 logging.info(f"  → Allowed vehicle brands: {', '.join(allowed_brands[:5])}{'...' if len(allowed_brands) > 5 else ''}")
 
-            # 3. Get vehicles from TecDoc (sa OEM filteringom u SQL upitu!)
-            vehicles = self.get_vehicles_from_tecdoc(tecdoc_article_id, allowed_brands=allowed_brands)
+            vehicles = []
 
-            if not vehicles:
-                if allowed_brands:
-                    logging.warning(f"  ⚠️  No vehicles found matching allowed brands")
-                else:
-                    logging.warning(f"  ⚠️  No vehicles found in TecDoc")
-                return
+            # COUNT probe (ako je batch-iran) - preskoči prije prenosa redova
+            if probe is None or self.validate_probe(probe, allowed_brands):
+                # 3. Get vehicles from TecDoc (sa OEM filteringom u SQL upitu!)
+                vehicles = self.get_vehicles_from_tecdoc(tecdoc_article_id, allowed_brands=allowed_brands)
 
-            # Log kako je filtering prosao
-            if allowed_brands:
-                logging.info(f"  ✅ Found {len(vehicles)} vehicles matching OEM brands")
+                if not vehicles:
+                    if allowed_brands:
+                        logging.warning(f"  ⚠️  No vehicles found matching allowed brands")
+                    else:
+                        logging.warning(f"  ⚠️  No vehicles found in TecDoc")
+
+                # Log kako je filtering prosao
+                elif allowed_brands:
+                    logging.info(f"  ✅ Found {len(vehicles)} vehicles matching OEM brands")
 
-            # 3. Validate vehicle count
-            if not self.validate_vehicle_count(vehicles, name):
+                # 3. Validate vehicle count
+                if vehicles and not self.validate_vehicle_count(vehicles, name):
+                    vehicles = []
+
+            if not vehicles:
+                # Preskočen proizvod - cleanup briše njegove postojeće fitmente
+                if cleanup and not self.dry_run:
+                    self.replace_fitments([product_id], [], delete=True)
+                    self.postgres_conn.commit()
                 return
 
             # 4. Create fitments
             logging.info(f"  → Linking {len(vehicles)} vehicles...")
-            self.upsert_vehicle_fitments(product_id, vehicles)
+            if self.dry_run:
+                self.upsert_vehicle_fitments(product_id, vehicles)
+            else:
+                fitments = []
+                self.upsert_vehicle_fitments(product_id, vehicles, fitments=fitments)
+                result = self.replace_fitments([product_id], fitments, delete=cleanup)
+                self.postgres_conn.commit()
+                self._count_fitments(result)
 
             self.stats['products_processed'] += 1
             logging.info(f"  ✅ SUCCESS")
 
         except Exception as e:
             logging.error(f"  ❌ ERROR: {str(e)}")
+            self.postgres_conn.rollback()
             self.stats['errors'] += 1
             import traceback
             traceback.print_exc()
@@ -1004,7 +1939,8 @@ class SmartVehicleLinker:
         limit: int = 50,
         offset: int = 0,
         cleanup: bool = False,
-        filter_mode: str = 'has_tecdoc'
+        filter_mode: str = 'has_tecdoc',
+        report_path: Optional[str] = None
     ):
         """
         Pokreni batch processing
@@ -1017,6 +1953,7 @@ class SmartVehicleLinker:
                 - 'has_tecdoc': Samo proizvodi sa tecdocArticleId
                 - 'no_fitments': Proizvodi sa tecdocArticleId ali bez fitmenata
                 - 'has_fitments': Proizvodi koji već imaju fitmente (re-link)
+            report_path: CSV report plana (samo DRY RUN)
         """
         cursor = self.postgres_conn.cursor()
 
@@ -1070,10 +2007,15 @@ class SmartVehicleLinker:
         logging.info(f"Max vehicles per product: {self.MAX_VEHICLES_PER_PRODUCT}")
         logging.info(f"{'='*70}\n")
 
-        # Process each product
-        for i, product in enumerate(products, 1):
-            logging.info(f"\n[{i}/{total}] Progress: {(i/total*100):.1f}%")
-            self.process_product(product, cleanup=cleanup)
+        # Normalizacija imena marki - jednom za sve TecDoc proizvođače
+        self.load_brand_name_lookup()
+
+        if self.dry_run:
+            # Set-based plan umjesto per-row lookup-a
+            self.plan_dry_run(products, report_path, cleanup=cleanup)
+        else:
+            # TecDoc čitanje, validacija i Postgres upis se preklapaju
+            self.run_pipeline(products, cleanup)
 
         # Final stats
         logging.info(f"\n{'='*70}")
@@ -1083,9 +2025,11 @@ class SmartVehicleLinker:
         logging.info(f"{'='*70}\n")
 
     def close(self):
-        """Zatvori konekcije"""
+        """Zatvori konekcije (vraćaju se u pool) i ispiši DB/hot-path timing (export: TECDOC_METRICS_OUT)"""
         self.tecdoc_conn.close()
         self.postgres_conn.close()
+        log_timing_summary()
+        metrics.finish(stats=self.stats)
 
 
 # ===================================================================
@@ -1101,6 +2045,7 @@ if __name__ == "__main__":
     CLEANUP = False  # ← Obriši postojeće fitmente prije linkovanja?
     LIMIT = 20  # Broj proizvoda
     FILTER = 'has_tecdoc'  # 'has_tecdoc', 'no_fitments', 'has_fitments'
+    REPORT = 'tecdoc_smart_vehicle_linking_plan.csv'  # CSV plan (samo DRY RUN)
 
     # ===================================================================
     # POKRETANJE
@@ -1122,7 +2067,8 @@ if __name__ == "__main__":
             limit=LIMIT,
             offset=0,
             cleanup=CLEANUP,
-            filter_mode=FILTER
+            filter_mode=FILTER,
+            report_path=REPORT
         )
 
     except Exception as e:
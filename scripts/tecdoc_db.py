@@ -0,0 +1,583 @@
+"""
+Zajednički DB helperi za TecDoc import/enrichment skripte
+=========================================================
+
+1) Pool konekcija sa health check-om i transparentnim reconnect-om
+
+   Umjesto da svaka klasa otvara svoje sirove konekcije, koristi se
+   zajednički pool po konfiguraciji (isti host/baza = isti pool):
+
+       from tecdoc_db import mysql_pool, postgres_pool
+
+       self.tecdoc_conn = mysql_pool(host="localhost", database="tecdoc1q2019", ...).connection()
+       self.postgres_conn = postgres_pool("postgresql://...").connection()
+
+   Dobijeni objekat se ponaša kao obična konekcija (cursor, commit,
+   rollback, close), ali:
+     - prije korištenja, ako je konekcija neaktivna duže od
+       health_check_interval, radi ping i po potrebi se ponovo spaja
+     - close() vraća konekciju u pool umjesto da je zatvori
+     - svaki cursor.execute() se mjeri (pool.timings)
+     - fetchone_cached / fetchall_cached koriste pripremljene upite
+       (MySQL prepared cursor, Postgres PREPARE/EXECUTE) za hot lookup-e
+
+   Na Neon pooler-u (PgBouncer, transaction mode) PREPARE ne preživljava
+   između transakcija, pa je tamo isključen - koristi se običan execute.
+
+2) Streaming čitanje velikih rezultata bez fetchall():
+
+  - MySQL (mysql.connector): unbuffered cursor + fetchmany
+  - Postgres (psycopg2): named (server-side) cursor sa itersize
+
+Redovi se vraćaju kao tuple, jedan po jedan, a sa servera se vuku u
+chunk-ovima, pa memorija ostaje ista bez obzira na veličinu rezultata.
+
+Primjer:
+    from tecdoc_db import stream_mysql, stream_postgres, chunked
+
+    for row in stream_mysql(tecdoc_conn, "SELECT id FROM articles"):
+        ...
+
+    for batch in chunked(stream_postgres(prod_conn, 'SELECT id FROM "Product"'), 500):
+        ...
+
+VAŽNO: dok se MySQL stream ne potroši do kraja, ista konekcija ne može
+izvršavati druge upite - za ugniježđene upite koristi zasebnu konekciju.
+
+Ova kopija (scripts/) sadrži samo pool, streaming i timing za
+tecdoc_image_linker.py; bulk writeri (ArticleOENumberWriter,
+ProductCrossReferenceSync, ProductUpdateWriter) i VehicleGenerationResolver
+su u kopijama uz enrichere (tecdoc-import-plan/, scripts/tecdoc-import/).
+"""
+
+import atexit
+import hashlib
+import itertools
+import logging
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def stream_mysql(conn, query: str, params: Optional[Sequence] = None,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[tuple]:
+    """
+    Streama redove iz MySQL-a preko unbuffered cursora.
+
+    Args:
+        conn: mysql.connector konekcija (ne smije se koristiti za druge upite dok stream traje)
+        query: SQL upit
+        params: Parametri upita
+        chunk_size: Broj redova po fetchmany pozivu
+
+    Yields:
+        Redovi kao tuple
+    """
+    cursor = conn.cursor(buffered=False)
+    try:
+        cursor.execute(query, params or ())
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                yield tuple(row)
+    finally:
+        # Unbuffered cursor mora pročitati ostatak rezultata prije zatvaranja
+        try:
+            while cursor.fetchmany(chunk_size):
+                pass
+        except Exception:
+            pass
+        cursor.close()
+
+
+def stream_postgres(conn, query: str, params: Optional[Sequence] = None,
+                    itersize: int = DEFAULT_CHUNK_SIZE, withhold: bool = False) -> Iterator[tuple]:
+    """
+    Streama redove iz Postgres-a preko named (server-side) cursora.
+
+    Args:
+        conn: psycopg2 konekcija
+        query: SQL upit
+        params: Parametri upita
+        itersize: Broj redova po round-tripu
+        withhold: True ako se na istoj konekciji radi commit/rollback dok stream
+                  traje. WITH HOLD cursor se commit-uje odmah nakon otvaranja,
+                  pa kasniji commit/rollback pozivaoca ne zatvaraju stream.
+
+    Yields:
+        Redovi kao tuple
+    """
+    cursor = conn.cursor(name=f"stream_{uuid.uuid4().hex[:12]}", withhold=withhold)
+    cursor.itersize = itersize
+    try:
+        cursor.execute(query, params)
+        if withhold and not conn.autocommit:
+            conn.commit()
+        for row in cursor:
+            yield tuple(row)
+    finally:
+        cursor.close()
+
+
+def chunked(rows: Iterable, size: int) -> Iterator[List]:
+    """
+    Grupiše bilo koji iterable u liste od najviše `size` elemenata.
+    """
+    iterator = iter(rows)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# ===================================================================
+# TIMING
+# ===================================================================
+
+class QueryTimings:
+    """
+    Broj izvršavanja i ukupno vrijeme po upitu (ključ = skraćeni SQL).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data: Dict[str, List[float]] = {}
+
+    @staticmethod
+    def label(query) -> str:
+        if isinstance(query, bytes):
+            query = query.decode('utf-8', 'replace')
+        return re.sub(r'\s+', ' ', str(query)).strip()[:80]
+
+    def record(self, label: str, seconds: float):
+        with self._lock:
+            entry = self._data.setdefault(label, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+
+    def summary(self) -> List[Dict]:
+        """Lista upita sortirana po ukupnom vremenu"""
+        with self._lock:
+            rows = [
+                {
+                    'query': label,
+                    'count': int(count),
+                    'total_s': round(total, 3),
+                    'avg_ms': round(total / count * 1000, 2) if count else 0.0,
+                    'max_ms': round(slowest * 1000, 2),
+                }
+                for label, (count, total, slowest) in self._data.items()
+            ]
+        return sorted(rows, key=lambda row: row['total_s'], reverse=True)
+
+    def log_summary(self, title: str = "DB timing", top: int = 10):
+        rows = self.summary()
+        if not rows:
+            return
+        logging.info(f"⏱️  {title} (top {min(top, len(rows))} po ukupnom vremenu):")
+        for row in rows[:top]:
+            logging.info(
+                f"   {row['total_s']:>8.2f}s  {row['count']:>7}x  "
+                f"avg {row['avg_ms']:>7.2f}ms  max {row['max_ms']:>8.2f}ms  {row['query']}"
+            )
+
+
+class TimedCursor:
+    """Omotač oko DB cursora koji mjeri svaki execute()"""
+
+    def __init__(self, cursor, timings: QueryTimings):
+        self._cursor = cursor
+        self._timings = timings
+
+    def execute(self, query, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(query, *args, **kwargs)
+        finally:
+            self._timings.record(QueryTimings.label(query), time.perf_counter() - started)
+
+    def executemany(self, query, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(query, *args, **kwargs)
+        finally:
+            self._timings.record(QueryTimings.label(query), time.perf_counter() - started)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        if name in ('_cursor', '_timings'):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._cursor, name, value)
+
+
+# ===================================================================
+# POOL + MANAGED CONNECTION
+# ===================================================================
+
+class ConnectionPool:
+    """
+    Jednostavan thread-safe pool konekcija jedne baze.
+
+    Driver-specifične stvari (connect, ping, transakcija, prepare) su
+    proslijeđene kao funkcije, pa isti pool radi za MySQL i Postgres.
+    """
+
+    def __init__(self, name: str, connect: Callable, ping: Callable, in_transaction: Callable,
+                 reset: Callable, max_idle: int = 4, health_check_interval: float = 30.0,
+                 prepare: bool = True, connection_errors: tuple = ()):
+        self.name = name
+        self._connect = connect
+        self._ping = ping
+        self._in_transaction = in_transaction
+        self._reset = reset
+        self.max_idle = max_idle
+        self.health_check_interval = health_check_interval
+        self.prepare = prepare
+        self.connection_errors = connection_errors
+
+        self.timings = QueryTimings()
+        self.reconnects = 0
+
+        self._lock = threading.Lock()
+        self._idle: List = []
+        self._statements: Dict[int, Dict] = {}  # id(raw) -> {sql: prepared handle}
+
+    def open_raw(self):
+        raw = self._connect()
+        self._statements[id(raw)] = {}
+        return raw
+
+    def discard_raw(self, raw):
+        self._statements.pop(id(raw), None)
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def statements(self, raw) -> Dict:
+        return self._statements.setdefault(id(raw), {})
+
+    def connection(self) -> 'ManagedConnection':
+        """Uzmi konekciju iz pool-a (ili otvori novu)"""
+        with self._lock:
+            raw = self._idle.pop() if self._idle else None
+        return ManagedConnection(self, raw)
+
+    @contextmanager
+    def acquire(self):
+        """with pool.acquire() as conn: ... (konekcija se vraća u pool na kraju)"""
+        conn = self.connection()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def release(self, raw):
+        """Vrati sirovu konekciju u pool (nezavršena transakcija se rollback-uje)"""
+        try:
+            if self._in_transaction(raw):
+                self._reset(raw)
+        except Exception:
+            self.discard_raw(raw)
+            return
+
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(raw)
+                return
+        self.discard_raw(raw)
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for raw in idle:
+            self.discard_raw(raw)
+
+
+class ManagedConnection:
+    """
+    Konekcija iz pool-a sa health check-om i transparentnim reconnect-om.
+
+    Sve što nije definisano ovdje (commit, rollback, autocommit, ...)
+    prosljeđuje se sirovoj konekciji.
+    """
+
+    def __init__(self, pool: ConnectionPool, raw=None):
+        object.__setattr__(self, '_pool', pool)
+        object.__setattr__(self, '_raw', raw)
+        object.__setattr__(self, '_last_check', 0.0)
+
+    # --- health check / reconnect ---
+
+    def _reconnect(self):
+        if self._raw is not None:
+            self._pool.discard_raw(self._raw)
+            self._pool.reconnects += 1
+            logging.warning(f"🔌 {self._pool.name}: konekcija izgubljena, ponovno spajanje...")
+        object.__setattr__(self, '_raw', self._pool.open_raw())
+        object.__setattr__(self, '_last_check', time.monotonic())
+
+    @property
+    def raw(self):
+        """Zdrava sirova konekcija (ping ako je neaktivna duže od intervala)"""
+        if self._raw is None:
+            self._reconnect()
+            return self._raw
+
+        now = time.monotonic()
+        if now - self._last_check > self._pool.health_check_interval:
+            # Usred transakcije se ne radi ping (reconnect bi izgubio transakciju)
+            if not self._pool._in_transaction(self._raw) and not self._pool._ping(self._raw):
+                self._reconnect()
+            object.__setattr__(self, '_last_check', now)
+        return self._raw
+
+    def ensure_alive(self):
+        """Forsiraj health check odmah"""
+        object.__setattr__(self, '_last_check', 0.0)
+        return self.raw
+
+    # --- cursor / execute ---
+
+    def cursor(self, *args, **kwargs):
+        return TimedCursor(self.raw.cursor(*args, **kwargs), self._pool.timings)
+
+    def _run(self, fn):
+        """Izvrši fn(raw); ako konekcija pukne van transakcije, spoji se ponovo i pokušaj još jednom"""
+        raw = self.raw
+        was_idle = not self._pool._in_transaction(raw)
+        try:
+            return fn(raw)
+        except self._pool.connection_errors:
+            if not was_idle:
+                raise
+            self._reconnect()
+            return fn(self._raw)
+
+    def fetchone(self, query, params=None):
+        def run(raw):
+            cursor = TimedCursor(raw.cursor(), self._pool.timings)
+            try:
+                cursor.execute(query, params)
+                return cursor.fetchone()
+            finally:
+                cursor.close()
+        return self._run(run)
+
+    def fetchall(self, query, params=None):
+        def run(raw):
+            cursor = TimedCursor(raw.cursor(), self._pool.timings)
+            try:
+                cursor.execute(query, params)
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+        return self._run(run)
+
+    def fetchone_cached(self, query, params=None):
+        """fetchone preko pripremljenog (keširanog) upita - za hot lookup-e"""
+        return self._run(lambda raw: self._pool.execute_prepared(raw, query, params, one=True))
+
+    def fetchall_cached(self, query, params=None):
+        """fetchall preko pripremljenog (keširanog) upita - za hot lookup-e"""
+        return self._run(lambda raw: self._pool.execute_prepared(raw, query, params, one=False))
+
+    # --- pool ---
+
+    def close(self):
+        """Vrati konekciju u pool"""
+        if self._raw is not None:
+            self._pool.release(self._raw)
+            object.__setattr__(self, '_raw', None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.raw, name, value)
+
+
+# ===================================================================
+# DRIVER-SPECIFIČNO
+# ===================================================================
+
+_POOLS: Dict[tuple, ConnectionPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def _mysql_execute_prepared(pool: ConnectionPool, raw, query, params, one):
+    statements = pool.statements(raw)
+    cursor = statements.get(query)
+    if cursor is None:
+        cursor = raw.cursor(prepared=True)
+        statements[query] = cursor
+    started = time.perf_counter()
+    try:
+        cursor.execute(query, params or ())
+        rows = cursor.fetchall()
+    finally:
+        pool.timings.record(QueryTimings.label(query), time.perf_counter() - started)
+    if one:
+        return rows[0] if rows else None
+    return rows
+
+
+def mysql_pool(max_idle: int = 4, health_check_interval: float = 30.0, **config) -> ConnectionPool:
+    """
+    Zajednički MySQL pool za datu konfiguraciju (mysql.connector.connect kwargs).
+    """
+    import mysql.connector
+
+    key = ('mysql', tuple(sorted(config.items())))
+    with _POOLS_LOCK:
+        if key in _POOLS:
+            return _POOLS[key]
+
+        def ping(raw):
+            try:
+                raw.ping(reconnect=False)
+                return True
+            except mysql.connector.Error:
+                return False
+
+        pool = ConnectionPool(
+            name=f"mysql:{config.get('host', 'localhost')}/{config.get('database', '')}",
+            connect=lambda: mysql.connector.connect(**config),
+            ping=ping,
+            in_transaction=lambda raw: bool(getattr(raw, 'in_transaction', False)),
+            reset=lambda raw: raw.rollback(),
+            max_idle=max_idle,
+            health_check_interval=health_check_interval,
+            connection_errors=(mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError),
+        )
+        pool.execute_prepared = lambda raw, query, params, one: _mysql_execute_prepared(pool, raw, query, params, one)
+        _POOLS[key] = pool
+        return pool
+
+
+def _pg_placeholders(query: str) -> str:
+    """%s → $1, $2, ... (za PREPARE)"""
+    counter = itertools.count(1)
+    return re.sub(r'(?<!%)%s', lambda _: f"${next(counter)}", query).replace('%%', '%')
+
+
+def _pg_execute_prepared(pool: ConnectionPool, raw, query, params, one):
+    cursor = TimedCursor(raw.cursor(), pool.timings)
+    try:
+        if not pool.prepare:
+            cursor.execute(query, params)
+        else:
+            statements = pool.statements(raw)
+            name = statements.get(query)
+            if name is None:
+                name = 'stmt_' + hashlib.md5(query.encode('utf-8')).hexdigest()[:16]
+                cursor.execute(f"PREPARE {name} AS {_pg_placeholders(query)}")
+                statements[query] = name
+            if params:
+                placeholders = ', '.join(['%s'] * len(params))
+                cursor.execute(f"EXECUTE {name} ({placeholders})", params)
+            else:
+                cursor.execute(f"EXECUTE {name}")
+        return cursor.fetchone() if one else cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def postgres_pool(dsn: Optional[str] = None, max_idle: int = 4, health_check_interval: float = 30.0,
+                  prepare: Optional[bool] = None, **config) -> ConnectionPool:
+    """
+    Zajednički Postgres pool za DSN ili psycopg2.connect kwargs.
+
+    prepare=None → automatski: isključeno za Neon pooler (-pooler u hostu).
+    """
+    import psycopg2
+    import psycopg2.extensions
+
+    key = ('postgres', dsn, tuple(sorted(config.items())))
+    with _POOLS_LOCK:
+        if key in _POOLS:
+            return _POOLS[key]
+
+        if prepare is None:
+            prepare = '-pooler' not in (dsn or '') and '-pooler' not in str(config.get('host', ''))
+
+        def connect():
+            return psycopg2.connect(dsn, **config) if dsn else psycopg2.connect(**config)
+
+        def in_transaction(raw):
+            if raw.closed:
+                return False
+            return raw.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+        def ping(raw):
+            if raw.closed:
+                return False
+            try:
+                cursor = raw.cursor()
+                cursor.execute("SELECT 1")
+                cursor.close()
+                if not raw.autocommit:
+                    raw.rollback()
+                return True
+            except psycopg2.Error:
+                return False
+
+        host = config.get('host') or (dsn.split('@')[-1].split('/')[0] if dsn else 'localhost')
+        pool = ConnectionPool(
+            name=f"postgres:{host}",
+            connect=connect,
+            ping=ping,
+            in_transaction=in_transaction,
+            reset=lambda raw: raw.rollback(),
+            max_idle=max_idle,
+            health_check_interval=health_check_interval,
+            prepare=prepare,
+            connection_errors=(psycopg2.OperationalError, psycopg2.InterfaceError),
+        )
+        pool.execute_prepared = lambda raw, query, params, one: _pg_execute_prepared(pool, raw, query, params, one)
+        _POOLS[key] = pool
+        return pool
+
+
+def all_pools() -> List[ConnectionPool]:
+    with _POOLS_LOCK:
+        return list(_POOLS.values())
+
+
+def log_timing_summary(top: int = 10):
+    """Ispiši timing za sve pool-ove (poziva se na kraju run-a)"""
+    for pool in all_pools():
+        pool.timings.log_summary(title=f"{pool.name} (reconnects: {pool.reconnects})", top=top)
+
+
+@atexit.register
+def _close_pools():
+    for pool in all_pools():
+        pool.close_all()
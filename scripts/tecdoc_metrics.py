@@ -0,0 +1,353 @@
+"""
+Zajednička instrumentacija za TecDoc/Spareto enrichment skripte
+===============================================================
+
+Mjeri gdje odlazi vrijeme run-a: spanovi oko DB upita, HTTP fetch-a,
+parsiranja i upisa, brojači događaja i histogrami latencije.
+
+    from tecdoc_metrics import metrics
+
+    @metrics.timed('db')                  # span "db.get_vehicles_from_tecdoc"
+    def get_vehicles_from_tecdoc(self, ...):
+        ...
+
+    with metrics.span('http.search'):
+        response = requests.get(...)
+
+    metrics.count('products.matched')
+
+    # na kraju run-a: summary u log + export (--metrics-out / TECDOC_METRICS_OUT)
+    metrics.finish(path, stats=self.stats)
+
+Kategorije spanova (prefiks imena): db, http, parse, write, product.
+Spanovi se mogu gnijezditi (po thread-u); za svaki span se vodi ukupno
+vrijeme i "self" vrijeme (bez ugniježđenih spanova), pa se vidi koji
+lookup stvarno dominira, a ne samo process_product koji sve obuhvata.
+
+Export:
+  - *.prom  → Prometheus textfile (node_exporter textfile collector)
+  - ostalo  → JSON (za poređenje run-ova / release-ova)
+
+Uz spanove se exportuje i per-upit timing iz tecdoc_db pool-ova.
+
+Poređenje dva run-a (regresije između release-ova):
+    python3 tecdoc_metrics.py compare stari.json novi.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, List, Optional
+
+METRICS_ENV = 'TECDOC_METRICS_OUT'
+
+# Granice histograma (sekunde) - od keširanog lookup-a do HTTP fetch-a
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Histogram latencije sa fiksnim granicama (kumulativno tek u exportu)"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # zadnji = +Inf
+        self.count = 0
+        self.total = 0.0
+        self.self_total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float, self_seconds: Optional[float] = None):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.self_total += seconds if self_seconds is None else self_seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """Procjena kvantila - gornja granica bucket-a (ograničena na max)"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+        return self.max
+
+    def to_dict(self) -> Dict:
+        buckets = {str(bound): n for bound, n in zip(self.buckets, self.counts)}
+        buckets['+Inf'] = self.counts[-1]
+        return {
+            'count': self.count,
+            'total_s': round(self.total, 4),
+            'self_s': round(self.self_total, 4),
+            'avg_ms': round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            'p50_ms': round(self.quantile(0.5) * 1000, 3),
+            'p95_ms': round(self.quantile(0.95) * 1000, 3),
+            'max_ms': round(self.max * 1000, 3),
+            'buckets': buckets,
+        }
+
+
+class Metrics:
+    """
+    Registar spanova i brojača jednog run-a (thread-safe).
+
+    Modul exportuje zajedničku instancu `metrics`; skripte je koriste
+    direktno (decorator / context manager), bez prosljeđivanja.
+    """
+
+    def __init__(self, script: Optional[str] = None):
+        self.script = script or os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0] or 'python'
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.spans: Dict[str, Histogram] = {}
+            self.counters: Dict[str, float] = {}
+            self.started_at = time.time()
+            self._started = time.perf_counter()
+
+    # --- snimanje ---
+
+    def _stack(self) -> List[List[float]]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def observe(self, name: str, seconds: float, self_seconds: Optional[float] = None):
+        with self._lock:
+            histogram = self.spans.get(name)
+            if histogram is None:
+                histogram = self.spans[name] = Histogram()
+            histogram.observe(seconds, self_seconds)
+
+    @contextmanager
+    def span(self, name: str):
+        """with metrics.span('http.fetch_product'): ..."""
+        stack = self._stack()
+        frame = [0.0]  # vrijeme ugniježđenih spanova
+        stack.append(frame)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            stack.pop()
+            if stack:
+                stack[-1][0] += elapsed
+            self.observe(name, elapsed, elapsed - frame[0])
+
+    def timed(self, category: str, name: Optional[str] = None):
+        """Decorator: span '<category>.<ime funkcije>' oko svakog poziva"""
+        def decorator(func):
+            span_name = f"{category}.{name or func.__name__}"
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def count(self, name: str, n: float = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    # --- izvještaj ---
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._started
+
+    def summary(self) -> List[Dict]:
+        """Spanovi sortirani po self vremenu (ono što stvarno troši run)"""
+        with self._lock:
+            rows = [dict(span=name, **histogram.to_dict()) for name, histogram in self.spans.items()]
+        return sorted(rows, key=lambda row: row['self_s'], reverse=True)
+
+    def log_summary(self, top: int = 15):
+        rows = self.summary()
+        if not rows:
+            return
+        elapsed = self.elapsed()
+        logging.info(f"⏱️  Hot path ({self.script}, {elapsed:.1f}s, top {min(top, len(rows))} po self vremenu):")
+        for row in rows[:top]:
+            # udio u wall-clock vremenu run-a (sa paralelnim thread-ovima može preći 100%)
+            share = row['self_s'] / elapsed * 100 if elapsed else 0.0
+            logging.info(
+                f"   {row['self_s']:>8.2f}s {share:>5.1f}%  {row['count']:>7}x  "
+                f"p50 {row['p50_ms']:>8.2f}ms  p95 {row['p95_ms']:>8.2f}ms  "
+                f"max {row['max_ms']:>8.2f}ms  {row['span']}"
+            )
+        with self._lock:
+            counters = dict(self.counters)
+        if counters:
+            logging.info("   " + ", ".join(f"{name}={value:g}" for name, value in sorted(counters.items())))
+
+    def to_dict(self, stats: Optional[Dict] = None) -> Dict:
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            'script': self.script,
+            'started_at': self.started_at,
+            'finished_at': time.time(),
+            'duration_s': round(self.elapsed(), 3),
+            'spans': {row.pop('span'): row for row in self.summary()},
+            'counters': counters,
+            'stats': {k: v for k, v in (stats or {}).items() if isinstance(v, (int, float))},
+            'db_queries': _db_query_timings(),
+        }
+
+    def to_prometheus(self, stats: Optional[Dict] = None) -> str:
+        data = self.to_dict(stats)
+        script = _prom_escape(self.script)
+        lines = [
+            '# HELP tecdoc_span_seconds Trajanje spanova (db, http, parse, write, product)',
+            '# TYPE tecdoc_span_seconds histogram',
+        ]
+        with self._lock:
+            spans = {name: (list(h.buckets), list(h.counts), h.total, h.count) for name, h in self.spans.items()}
+        for name in sorted(spans):
+            buckets, counts, total, count = spans[name]
+            labels = f'script="{script}",span="{_prom_escape(name)}"'
+            cumulative = 0
+            for bound, n in zip(buckets, counts):
+                cumulative += n
+                lines.append(f'tecdoc_span_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'tecdoc_span_seconds_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'tecdoc_span_seconds_sum{{{labels}}} {total:.6f}')
+            lines.append(f'tecdoc_span_seconds_count{{{labels}}} {count}')
+
+        lines += ['# HELP tecdoc_span_self_seconds_total Self vrijeme spana (bez ugniježđenih)',
+                  '# TYPE tecdoc_span_self_seconds_total counter']
+        for name, row in sorted(data['spans'].items()):
+            lines.append(f'tecdoc_span_self_seconds_total{{script="{script}",span="{_prom_escape(name)}"}} '
+                         f'{row["self_s"]}')
+
+        lines += ['# HELP tecdoc_events_total Brojači događaja', '# TYPE tecdoc_events_total counter']
+        for name, value in sorted(data['counters'].items()):
+            lines.append(f'tecdoc_events_total{{script="{script}",name="{_prom_escape(name)}"}} {value:g}')
+
+        lines += ['# HELP tecdoc_run_stat Statistika run-a (self.stats)', '# TYPE tecdoc_run_stat gauge']
+        for name, value in sorted(data['stats'].items()):
+            lines.append(f'tecdoc_run_stat{{script="{script}",name="{_prom_escape(name)}"}} {value:g}')
+
+        lines += ['# HELP tecdoc_db_query_seconds_total Ukupno vrijeme po upitu (tecdoc_db pool)',
+                  '# TYPE tecdoc_db_query_seconds_total counter']
+        for row in data['db_queries']:
+            labels = f'script="{script}",pool="{_prom_escape(row["pool"])}",query="{_prom_escape(row["query"])}"'
+            lines.append(f'tecdoc_db_query_seconds_total{{{labels}}} {row["total_s"]}')
+        lines += ['# TYPE tecdoc_db_queries_total counter']
+        for row in data['db_queries']:
+            labels = f'script="{script}",pool="{_prom_escape(row["pool"])}",query="{_prom_escape(row["query"])}"'
+            lines.append(f'tecdoc_db_queries_total{{{labels}}} {row["count"]}')
+
+        lines += ['# TYPE tecdoc_run_duration_seconds gauge',
+                  f'tecdoc_run_duration_seconds{{script="{script}"}} {data["duration_s"]}',
+                  '# TYPE tecdoc_run_last_finished_timestamp_seconds gauge',
+                  f'tecdoc_run_last_finished_timestamp_seconds{{script="{script}"}} {data["finished_at"]:.0f}']
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path: str, stats: Optional[Dict] = None):
+        """*.prom → Prometheus textfile, inače JSON (atomski: tmp + rename)"""
+        if path.endswith('.prom'):
+            content = self.to_prometheus(stats)
+        else:
+            content = json.dumps(self.to_dict(stats), indent=2, ensure_ascii=False) + '\n'
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+        logging.info(f"📈 Metrike zapisane: {path}")
+
+    def finish(self, path: Optional[str] = None, stats: Optional[Dict] = None):
+        """Summary u log + export (path ili TECDOC_METRICS_OUT env)"""
+        self.log_summary()
+        path = path or os.getenv(METRICS_ENV)
+        if path:
+            try:
+                self.export(path, stats)
+            except OSError as e:
+                logging.warning(f"⚠️  Metrike nisu zapisane ({path}): {e}")
+
+
+def _prom_escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _db_query_timings() -> List[Dict]:
+    """Per-upit timing iz tecdoc_db pool-ova (ako su korišteni)"""
+    try:
+        from tecdoc_db import all_pools
+    except ImportError:
+        return []
+    return [dict(pool=pool.name, **row) for pool in all_pools() for row in pool.timings.summary()]
+
+
+metrics = Metrics()
+
+
+def add_metrics_argument(parser: argparse.ArgumentParser):
+    """--metrics-out za CLI skripti (default: TECDOC_METRICS_OUT env)"""
+    parser.add_argument('--metrics-out', default=os.getenv(METRICS_ENV),
+                        help='Zapiši metrike run-a: *.prom (Prometheus textfile) ili *.json '
+                             f'(default: ${METRICS_ENV})')
+
+
+def compare(old_path: str, new_path: str, threshold: float = 0.2) -> int:
+    """Uporedi dva JSON exporta: avg/p95 po spanu; vraća broj regresija"""
+    with open(old_path, encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, encoding='utf-8') as f:
+        new = json.load(f)
+
+    regressions = 0
+    print(f"{'span':<50} {'avg old':>10} {'avg new':>10} {'p95 old':>10} {'p95 new':>10}  Δavg")
+    for name in sorted(set(old['spans']) | set(new['spans'])):
+        a, b = old['spans'].get(name), new['spans'].get(name)
+        if not a or not b:
+            print(f"{name:<50} {'-' if not a else a['avg_ms']:>10} {'-' if not b else b['avg_ms']:>10}")
+            continue
+        change = (b['avg_ms'] - a['avg_ms']) / a['avg_ms'] if a['avg_ms'] else 0.0
+        flag = ''
+        if change > threshold:
+            flag = '  ⚠ REGRESIJA'
+            regressions += 1
+        print(f"{name:<50} {a['avg_ms']:>10.2f} {b['avg_ms']:>10.2f} {a['p95_ms']:>10.2f} {b['p95_ms']:>10.2f}"
+              f"  {change * 100:+.0f}%{flag}")
+    print(f"\nTrajanje: {old['duration_s']}s → {new['duration_s']}s, regresija (> {threshold * 100:.0f}%): {regressions}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Alati za metrike enrichment run-ova')
+    sub = parser.add_subparsers(dest='command', required=True)
+    cmp_parser = sub.add_parser('compare', help='Uporedi dva JSON exporta (regresije)')
+    cmp_parser.add_argument('old')
+    cmp_parser.add_argument('new')
+    cmp_parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Relativni rast avg latencije koji se broji kao regresija (default: 0.2)')
+    args = parser.parse_args()
+
+    regressions = compare(args.old, args.new, args.threshold)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
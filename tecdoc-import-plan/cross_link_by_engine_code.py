@@ -183,6 +183,133 @@ class EngineCodeLinker:
             self.stats["errors"] += 1
             return None
 
+    # ===================================================================
+    # DRY-RUN PLANER (set-based)
+    # ===================================================================
+
+    async def plan_dry_run(self, code_limit: Optional[int] = None):
+        """
+        Izračunaj sve planirane fitmente bez per-row upita.
+
+        Engine kodovi idu u staging tabelu dry_run_codes, a jedan
+        INSERT ... SELECT puni dry_run_plan (isti izbor kao
+        process_engine_code: proizvod dobija sve motore iste verzije
+        snaga/kapacitet koju već ima). CSV report se pravi direktno iz
+        dry_run_plan (COPY).
+        """
+        await self.conn.execute("""
+            DROP TABLE IF EXISTS dry_run_codes;
+            DROP TABLE IF EXISTS dry_run_plan;
+            CREATE TEMP TABLE dry_run_codes (
+                engine_code text PRIMARY KEY
+            );
+            CREATE TEMP TABLE dry_run_plan (
+                product_id text,
+                engine_code text,
+                power_kw double precision,
+                capacity_ccm integer,
+                generation_id text,
+                engine_id text,
+                brand text,
+                model text,
+                generation text,
+                tecdoc_id text,
+                already_linked boolean,
+                planned_at timestamptz DEFAULT now()
+            );
+        """)
+
+        # Isti izbor kao get_engine_codes_with_products
+        await self.conn.execute("""
+            INSERT INTO dry_run_codes (engine_code)
+            SELECT DISTINCT ve."engineCode"
+            FROM "VehicleEngine" ve
+            INNER JOIN "ProductVehicleFitment" pvf ON ve.id = pvf."engineId"
+            WHERE ve."engineCode" IS NOT NULL
+              AND ve."engineCode" != ''
+              AND ($1::text IS NULL OR ve."engineCode" = $1)
+            ORDER BY ve."engineCode"
+            LIMIT $2
+        """, self.engine_code, code_limit)
+
+        await self.conn.execute("""
+            WITH product_versions AS (
+                -- Verzije (snaga/kapacitet) koje proizvod već ima za engine kod
+                SELECT DISTINCT
+                    pvf."productId" AS product_id,
+                    ve."engineCode" AS engine_code,
+                    ve."enginePowerKW" AS power_kw,
+                    ve."engineCapacity" AS capacity_ccm
+                FROM "ProductVehicleFitment" pvf
+                INNER JOIN "VehicleEngine" ve ON pvf."engineId" = ve.id
+                INNER JOIN dry_run_codes dc ON dc.engine_code = ve."engineCode"
+                INNER JOIN "VehicleGeneration" vg ON ve."generationId" = vg.id
+                INNER JOIN "VehicleModel" vm ON vg."modelId" = vm.id
+                INNER JOIN "VehicleBrand" vb ON vm."brandId" = vb.id
+            )
+            INSERT INTO dry_run_plan (
+                product_id, engine_code, power_kw, capacity_ccm, generation_id, engine_id,
+                brand, model, generation, tecdoc_id, already_linked
+            )
+            SELECT
+                pv.product_id, pv.engine_code, pv.power_kw, pv.capacity_ccm, vg.id, ve.id,
+                vb.name, vm.name, vg.name, ve."externalId",
+                EXISTS (
+                    SELECT 1 FROM "ProductVehicleFitment" pvf
+                    WHERE pvf."productId" = pv.product_id
+                      AND pvf."generationId" = vg.id
+                      AND pvf."engineId" = ve.id
+                )
+            FROM product_versions pv
+            INNER JOIN "VehicleEngine" ve
+                ON ve."engineCode" = pv.engine_code
+               AND ve."enginePowerKW" IS NOT DISTINCT FROM pv.power_kw
+               AND ve."engineCapacity" IS NOT DISTINCT FROM pv.capacity_ccm
+            INNER JOIN "VehicleGeneration" vg ON ve."generationId" = vg.id
+            INNER JOIN "VehicleModel" vm ON vg."modelId" = vm.id
+            INNER JOIN "VehicleBrand" vb ON vm."brandId" = vb.id
+        """)
+
+        summary = await self.conn.fetchrow("""
+            SELECT
+                (SELECT COUNT(*) FROM dry_run_codes) AS codes,
+                COUNT(DISTINCT product_id) AS products,
+                COUNT(*) FILTER (WHERE NOT already_linked) AS planned,
+                COUNT(*) FILTER (WHERE already_linked) AS skipped
+            FROM dry_run_plan
+        """)
+
+        self.stats["unique_engine_codes"] = summary["codes"]
+        self.stats["products_processed"] = summary["products"]
+        self.stats["fitments_created"] = summary["planned"]
+        self.stats["fitments_skipped"] = summary["skipped"]
+
+        print(f"\n📋 Planirano {summary['planned']} novih fitmenta za {summary['products']} proizvod(a) "
+              f"u {summary['codes']} engine code-ova")
+
+        if self.report_path:
+            await self.conn.copy_from_query("""
+                SELECT
+                    to_char(pl.planned_at, 'YYYY-MM-DD"T"HH24:MI:SS.US') AS timestamp,
+                    pl.product_id,
+                    p.name AS product_name,
+                    p."catalogNumber" AS catalog_number,
+                    'dry_run_created' AS action,
+                    pl.engine_code,
+                    pl.power_kw,
+                    pl.capacity_ccm,
+                    pl.brand,
+                    pl.model,
+                    pl.generation,
+                    pl.tecdoc_id,
+                    'Auto-linked by engine code ' || pl.engine_code AS notes
+                FROM dry_run_plan pl
+                INNER JOIN "Product" p ON p.id = pl.product_id
+                WHERE NOT pl.already_linked
+                ORDER BY pl.engine_code, pl.power_kw, pl.capacity_ccm, p.name, pl.brand, pl.model
+            """, output=self.report_path, format='csv', header=True)
+            print(f"\n📄 Report upisano: {self.report_path} ({summary['planned']} redaka)")
+
     async def process_engine_code(self, engine_code: str) -> int:
         """
         Obradi sve proizvode za dati engine code
@@ -299,6 +426,10 @@ class EngineCodeLinker:
 
             if self.dry_run:
                 print("⚠️  DRY-RUN MODE - Bez stvarnih promjena u bazi\n")
+                # Isti obim kao pravi run (bez --engine-code samo prvih 5)
+                await self.plan_dry_run(code_limit=None if self.engine_code else 5)
+                self._print_stats()
+                return
 
             # Pronađi sve engine codes sa produktima
             engine_codes = await self.get_engine_codes_with_products()
@@ -319,15 +450,7 @@ class EngineCodeLinker:
                     print(f"\n... (prikazani samo prvi 5 engine codes)")
                     break
 
-            print("\n" + "="*80)
-            print("📊 STATISTIKA")
-            print("="*80)
-            print(f"Različitih engine code-ova: {self.stats['unique_engine_codes']}")
-            print(f"Proizvoda obrađeno: {self.stats['products_processed']}")
-            print(f"Novih fitmenta kreiranog: {self.stats['fitments_created']}")
-            print(f"Fitmenta preskočeno (duplikata): {self.stats['fitments_skipped']}")
-            print(f"Greške: {self.stats['errors']}")
-            print("="*80)
+            self._print_stats()
 
             # Ispis reporta
             if self.report_path:
@@ -336,6 +459,18 @@ class EngineCodeLinker:
         finally:
             await self.disconnect()
 
+    def _print_stats(self):
+        """Ispiši statistiku"""
+        print("\n" + "="*80)
+        print("📊 STATISTIKA")
+        print("="*80)
+        print(f"Različitih engine code-ova: {self.stats['unique_engine_codes']}")
+        print(f"Proizvoda obrađeno: {self.stats['products_processed']}")
+        print(f"Novih fitmenta kreiranog: {self.stats['fitments_created']}")
+        print(f"Fitmenta preskočeno (duplikata): {self.stats['fitments_skipped']}")
+        print(f"Greške: {self.stats['errors']}")
+        print("="*80)
+
     def _write_report(self):
         """Upiši CSV report"""
         import csv
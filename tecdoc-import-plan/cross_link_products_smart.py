@@ -183,6 +183,128 @@ class SmartProductLinker:
             self.stats["errors"] += 1
             return None
 
+    # ===================================================================
+    # DRY-RUN PLANER (set-based)
+    # ===================================================================
+
+    async def plan_dry_run(self):
+        """
+        Izračunaj sve planirane fitmente bez per-row upita.
+
+        Proizvodi idu u staging tabelu dry_run_products, a jedan
+        INSERT ... SELECT puni dry_run_plan (isti izbor kao process_product:
+        isključena marka = marka prvog fitmenta sa tim engine kodom).
+        CSV report se pravi direktno iz dry_run_plan (COPY).
+        """
+        await self.conn.execute("""
+            DROP TABLE IF EXISTS dry_run_products;
+            DROP TABLE IF EXISTS dry_run_plan;
+            CREATE TEMP TABLE dry_run_products (
+                id text PRIMARY KEY,
+                name text,
+                catalog_number text
+            );
+            CREATE TEMP TABLE dry_run_plan (
+                product_id text,
+                engine_code text,
+                original_brand text,
+                generation_id text,
+                engine_id text,
+                new_brand text,
+                new_model text,
+                new_generation text,
+                already_linked boolean,
+                planned_at timestamptz DEFAULT now()
+            );
+        """)
+
+        # Isti izbor kao get_products_with_fitments
+        await self.conn.execute("""
+            INSERT INTO dry_run_products (id, name, catalog_number)
+            SELECT p.id, p.name, p."catalogNumber"
+            FROM "Product" p
+            WHERE EXISTS (SELECT 1 FROM "ProductVehicleFitment" pvf WHERE pvf."productId" = p.id)
+              AND (p.id = $1 OR ($1::text IS NULL AND p."isArchived" = false))
+            ORDER BY p.name
+            LIMIT $2
+        """, self.product_id, self.limit)
+
+        await self.conn.execute("""
+            WITH source_codes AS (
+                -- Prvi fitment (po marki/modelu/generaciji) za svaki engine kod
+                SELECT DISTINCT ON (pvf."productId", ve."engineCode")
+                    pvf."productId" AS product_id,
+                    ve."engineCode" AS engine_code,
+                    vb.id AS brand_id,
+                    vb.name AS brand_name
+                FROM "ProductVehicleFitment" pvf
+                INNER JOIN dry_run_products dp ON dp.id = pvf."productId"
+                INNER JOIN "VehicleEngine" ve ON pvf."engineId" = ve.id
+                LEFT JOIN "VehicleGeneration" vg ON pvf."generationId" = vg.id
+                LEFT JOIN "VehicleModel" vm ON vg."modelId" = vm.id
+                LEFT JOIN "VehicleBrand" vb ON vm."brandId" = vb.id
+                WHERE ve."engineCode" IS NOT NULL AND ve."engineCode" != ''
+                ORDER BY pvf."productId", ve."engineCode", vb.name, vm.name, vg.name
+            )
+            INSERT INTO dry_run_plan (
+                product_id, engine_code, original_brand, generation_id, engine_id,
+                new_brand, new_model, new_generation, already_linked
+            )
+            SELECT
+                sc.product_id, sc.engine_code, sc.brand_name, vg.id, ve.id,
+                vb.name, vm.name, vg.name,
+                EXISTS (
+                    SELECT 1 FROM "ProductVehicleFitment" pvf
+                    WHERE pvf."productId" = sc.product_id
+                      AND pvf."generationId" = vg.id
+                      AND pvf."engineId" IS NOT DISTINCT FROM ve.id
+                )
+            FROM source_codes sc
+            INNER JOIN "VehicleEngine" ve ON ve."engineCode" = sc.engine_code
+            INNER JOIN "VehicleGeneration" vg ON ve."generationId" = vg.id
+            INNER JOIN "VehicleModel" vm ON vg."modelId" = vm.id
+            INNER JOIN "VehicleBrand" vb ON vm."brandId" = vb.id
+            WHERE vb.id != sc.brand_id
+        """)
+
+        products = await self.conn.fetchval("SELECT COUNT(*) FROM dry_run_products")
+        summary = await self.conn.fetchrow("""
+            SELECT
+                COUNT(DISTINCT (product_id, engine_code)) AS engine_codes,
+                COUNT(*) FILTER (WHERE NOT already_linked) AS planned,
+                COUNT(*) FILTER (WHERE already_linked) AS skipped
+            FROM dry_run_plan
+        """)
+
+        self.stats["products_processed"] = products
+        self.stats["engine_codes_found"] = summary["engine_codes"]
+        self.stats["matching_generations"] = summary["planned"]
+        self.stats["fitments_created"] = summary["planned"]
+        self.stats["fitments_skipped"] = summary["skipped"]
+
+        print(f"📋 Planirano {summary['planned']} novih fitmenta za {products} proizvod(a)")
+
+        if self.report_path:
+            await self.conn.copy_from_query("""
+                SELECT
+                    to_char(pl.planned_at, 'YYYY-MM-DD"T"HH24:MI:SS.US') AS timestamp,
+                    pl.product_id,
+                    p.name AS product_name,
+                    p.catalog_number,
+                    'dry_run_created' AS action,
+                    pl.original_brand,
+                    pl.engine_code,
+                    pl.new_brand,
+                    pl.new_model,
+                    pl.new_generation,
+                    'Auto-linked by engine code ' || pl.engine_code AS notes
+                FROM dry_run_plan pl
+                INNER JOIN dry_run_products p ON p.id = pl.product_id
+                WHERE NOT pl.already_linked
+                ORDER BY p.name, pl.product_id, pl.engine_code, pl.new_brand, pl.new_model, pl.new_generation
+            """, output=self.report_path, format='csv', header=True)
+            print(f"\n📄 Report upisano: {self.report_path} ({summary['planned']} redaka)")
+
     async def process_product(self, product: Dict) -> int:
         """Obradi jedan proizvod"""
         product_id = product['id']
@@ -297,21 +419,22 @@ class SmartProductLinker:
 
             if self.dry_run:
                 print("⚠️  DRY-RUN MODE - Bez stvarnih promjena u bazi\n")
+                await self.plan_dry_run()
+            else:
+                # Pronađi proizvode
+                products = await self.get_products_with_fitments()
 
-            # Pronađi proizvode
-            products = await self.get_products_with_fitments()
-
-            if not products:
-                print(f"❌ Nema pronađenih proizvoda")
-                return
+                if not products:
+                    print(f"❌ Nema pronađenih proizvoda")
+                    return
 
-            print(f"\n📋 Obrađujem {len(products)} proizvod(a)")
+                print(f"\n📋 Obrađujem {len(products)} proizvod(a)")
 
-            total_new = 0
-            for product in products:
-                new = await self.process_product(product)
-                total_new += new
-                self.stats["products_processed"] += 1
+                total_new = 0
+                for product in products:
+                    new = await self.process_product(product)
+                    total_new += new
+                    self.stats["products_processed"] += 1
 
             print("\n" + "="*80)
             print("📊 STATISTIKA")
@@ -324,7 +447,7 @@ class SmartProductLinker:
             print(f"Greške: {self.stats['errors']}")
             print("="*80)
 
-            if self.report_path:
+            if self.report_path and not self.dry_run:
                 self._write_report()
 
         finally:
@@ -0,0 +1,555 @@
+"""
+BULK Import Vozila iz TecDoc-a
+==============================
+Ista struktura kao import_vehicles_v2.py (ili import_vehicles_final.py sa
+--layout final), ali bez upita po redu:
+
+  1. Izvuci cijelo TecDoc stablo (modeli → passengercars → motori → specs)
+     od year_from u nekoliko velikih upita
+  2. Učitaj postojeće Postgres stablo (VehicleModel / VehicleGeneration /
+     VehicleEngine) jednom i uporedi u memoriji
+  3. Upiši sve nove redove preko COPY u staging tabele pa INSERT ... SELECT,
+     sve u JEDNOJ transakciji
+
+Upotreba:
+    python import_vehicles_bulk.py                  # year_from = 1990, V2 struktura
+    python import_vehicles_bulk.py 2000 --dry-run   # samo izračunaj diff
+    python import_vehicles_bulk.py 1990 --layout final
+"""
+
+import argparse
+import csv
+import io
+import logging
+import time
+from collections import defaultdict
+
+# Logging se podešava prije importa V2/Final modula da njihov basicConfig
+# ne bi preusmjerio log u import_vehicles_v2.log
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('import_vehicles_bulk.log'),
+        logging.StreamHandler()
+    ]
+)
+
+from import_vehicles_v2 import VehicleImporterV2
+from import_vehicles_final import VehicleImporterFinal
+
+# Filter za modele - isti kao u get_models_from_tecdoc
+MODELS_FILTER = """
+    m.IsPassengerCar = 1
+    AND (YEAR(m.`From`) >= %s OR YEAR(m.`To`) >= %s OR YEAR(m.`To`) = 0)
+    AND m.ManufacturerId IS NOT NULL
+    AND m.Description IS NOT NULL
+"""
+
+COPY_NULL = '\\N'
+
+
+class VehicleImporterBulk(VehicleImporterV2):
+    """Set-based import TecDoc stabla vozila"""
+
+    # Parsiranje za "final" strukturu (generacija = passengercar)
+    parse_model_name = VehicleImporterFinal.parse_model_name
+    parse_generation_code = VehicleImporterFinal.parse_generation_code
+
+    def __init__(self, layout='v2'):
+        super().__init__()
+        self.layout = layout
+
+        self.stats.update({
+            'passengercars_total': 0,
+            'engine_links_total': 0,
+        })
+
+    # ------------------------------------------------------------------
+    # TecDoc extract (nekoliko velikih upita)
+    # ------------------------------------------------------------------
+
+    def get_passengercars_tree(self, year_from):
+        """Učitaj sve passengercars za filtrirane modele, grupisano po modelu"""
+        cursor = self.tecdoc_conn.cursor()
+
+        query = f"""
+            SELECT
+                pc.Model as model_id,
+                pc.id as car_id,
+                pc.Description as car_description,
+                YEAR(pc.`From`) as year_from,
+                YEAR(pc.`To`) as year_to
+            FROM passengercars pc
+            JOIN models m ON m.id = pc.Model
+            WHERE {MODELS_FILTER}
+            ORDER BY pc.Model, pc.`From`, pc.Description
+        """
+
+        cursor.execute(query, (year_from, year_from))
+
+        cars_by_model = defaultdict(list)
+        for model_id, car_id, car_description, car_year_from, car_year_to in cursor.fetchall():
+            cars_by_model[model_id].append((car_id, car_description, car_year_from, car_year_to))
+        cursor.close()
+
+        self.stats['passengercars_total'] = sum(len(cars) for cars in cars_by_model.values())
+        logging.info(f"📦 Loaded {self.stats['passengercars_total']} passengercars from TecDoc")
+        return cars_by_model
+
+    def get_engines_tree(self, year_from):
+        """Učitaj sve veze passengercar → motor za filtrirane modele"""
+        cursor = self.tecdoc_conn.cursor()
+
+        query = f"""
+            SELECT ple.car_id, e.id, e.Description
+            FROM passengercars_link_engines ple
+            JOIN engines e ON e.id = ple.engine_id
+            JOIN passengercars pc ON pc.id = ple.car_id
+            JOIN models m ON m.id = pc.Model
+            WHERE {MODELS_FILTER}
+        """
+
+        cursor.execute(query, (year_from, year_from))
+
+        engines_by_car = defaultdict(list)
+        for car_id, engine_id, engine_code in cursor.fetchall():
+            engines_by_car[car_id].append((engine_id, engine_code))
+        cursor.close()
+
+        self.stats['engine_links_total'] = sum(len(engines) for engines in engines_by_car.values())
+        logging.info(f"📦 Loaded {self.stats['engine_links_total']} engine links from TecDoc")
+        return engines_by_car
+
+    def get_engine_specs_tree(self, year_from):
+        """Učitaj Power/Capacity za sve motore iz filtriranog stabla"""
+        cursor = self.tecdoc_conn.cursor()
+
+        query = f"""
+            SELECT ia.item_id, ia.DisplayTitle, ia.DisplayValue
+            FROM items_atributes ia
+            WHERE ia.IsEngine = 1
+            AND ia.DisplayTitle IN ('Power', 'Capacity')
+            AND ia.item_id IN (
+                SELECT DISTINCT ple.engine_id
+                FROM passengercars_link_engines ple
+                JOIN passengercars pc ON pc.id = ple.car_id
+                JOIN models m ON m.id = pc.Model
+                WHERE {MODELS_FILTER}
+            )
+        """
+
+        cursor.execute(query, (year_from, year_from))
+
+        raw_specs = defaultdict(list)
+        for engine_id, title, value in cursor.fetchall():
+            raw_specs[engine_id].append((title, value))
+        cursor.close()
+
+        specs = {engine_id: self.parse_engine_specs(rows) for engine_id, rows in raw_specs.items()}
+        logging.info(f"📦 Loaded specs for {len(specs)} engines from TecDoc")
+        return specs
+
+    # ------------------------------------------------------------------
+    # Postojeće Postgres stablo
+    # ------------------------------------------------------------------
+
+    def get_existing_tree(self, brand_ids):
+        """Učitaj postojeće modele, generacije i motore za date marke"""
+        cursor = self.prod_conn.cursor()
+
+        cursor.execute("""
+            SELECT id, "brandId", name
+            FROM "VehicleModel"
+            WHERE "brandId" = ANY(%s)
+            ORDER BY id
+        """, (brand_ids,))
+        models = {}
+        for model_id, brand_id, name in cursor.fetchall():
+            models.setdefault((brand_id, name), model_id)
+
+        cursor.execute("""
+            SELECT id, "brandId", "externalId"
+            FROM "VehicleModel"
+            WHERE "brandId" = ANY(%s) AND "externalId" IS NOT NULL
+        """, (brand_ids,))
+        model_external_ids = {(brand_id, external_id): model_id for model_id, brand_id, external_id in cursor.fetchall()}
+
+        cursor.execute("""
+            SELECT vg.id, vg."modelId", vg.name
+            FROM "VehicleGeneration" vg
+            JOIN "VehicleModel" vm ON vm.id = vg."modelId"
+            WHERE vm."brandId" = ANY(%s)
+        """, (brand_ids,))
+        generations = {(model_id, name): generation_id for generation_id, model_id, name in cursor.fetchall()}
+
+        cursor.execute("""
+            SELECT ve."generationId", ve."engineCode", ve."externalId"
+            FROM "VehicleEngine" ve
+            JOIN "VehicleGeneration" vg ON vg.id = ve."generationId"
+            JOIN "VehicleModel" vm ON vm.id = vg."modelId"
+            WHERE vm."brandId" = ANY(%s)
+        """, (brand_ids,))
+        engine_codes = set()
+        engine_external_ids = set()
+        for generation_id, engine_code, external_id in cursor.fetchall():
+            engine_codes.add((generation_id, engine_code))
+            engine_external_ids.add((generation_id, external_id))
+
+        cursor.close()
+
+        logging.info(
+            f"📋 Existing tree: {len(models)} models, {len(generations)} generations, "
+            f"{len(engine_codes)} engines"
+        )
+
+        return {
+            'models': models,
+            'model_external_ids': model_external_ids,
+            'generations': generations,
+            'engine_codes': engine_codes,
+            'engine_external_ids': engine_external_ids,
+        }
+
+    # ------------------------------------------------------------------
+    # Diff u memoriji
+    # ------------------------------------------------------------------
+
+    def resolve_model(self, tree, new_rows, brand_id, model_name, model_data):
+        """Vrati ID postojećeg modela ili pripremi novi red"""
+        key = (brand_id, model_name)
+        if key in tree['models']:
+            self.stats['models_skipped'] += 1
+            return tree['models'][key]
+
+        tecdoc_model_id, _, _, year_from, year_to = model_data
+        existing_id = tree['model_external_ids'].get((brand_id, str(tecdoc_model_id)))
+        if existing_id:
+            # Isti TecDoc model je već uvezen pod drugim imenom (@@unique([brandId, externalId]))
+            self.stats['models_skipped'] += 1
+            return existing_id
+
+        generated_id = self.generate_cuid()
+        new_rows['models'].append((
+            generated_id,
+            brand_id,
+            model_name,
+            f"{year_from}-01-01" if year_from and year_from > 0 else None,
+            f"{year_to}-12-31" if year_to and year_to > 0 else None,
+            str(tecdoc_model_id),
+        ))
+        tree['models'][key] = generated_id
+        tree['model_external_ids'][(brand_id, str(tecdoc_model_id))] = generated_id
+        self.stats['models_imported'] += 1
+        return generated_id
+
+    def resolve_generation(self, tree, new_rows, model_id, generation_name, period, vin_code, external_id):
+        """Vrati ID postojeće generacije ili pripremi novi red"""
+        key = (model_id, generation_name)
+        if key in tree['generations']:
+            self.stats['generations_skipped'] += 1
+            return tree['generations'][key]
+
+        generated_id = self.generate_cuid()
+        new_rows['generations'].append((
+            generated_id,
+            model_id,
+            generation_name,
+            period,
+            vin_code,
+            str(external_id),
+        ))
+        tree['generations'][key] = generated_id
+        self.stats['generations_imported'] += 1
+        return generated_id
+
+    def add_engine(self, tree, new_rows, generation_id, car_description, engine_data, specs, year_from, year_to):
+        """Pripremi novi VehicleEngine red ako ne postoji (isto pravilo kao V2)"""
+        engine_id, engine_code = engine_data
+
+        if ((generation_id, engine_code) in tree['engine_codes']
+                or (generation_id, str(engine_id)) in tree['engine_external_ids']):
+            self.stats['engines_skipped'] += 1
+            return
+
+        power_kw, power_hp, capacity = specs.get(engine_id, (None, None, None))
+        engine_type = "DIESEL" if "TDI" in car_description or "D" in car_description else "PETROL"
+
+        new_rows['engines'].append((
+            self.generate_cuid(),
+            generation_id,
+            engine_type,
+            engine_code,
+            power_kw,
+            power_hp,
+            capacity,
+            f"{car_description} {engine_code}",
+            str(engine_id),
+            f"{year_from}-01-01" if year_from and year_from > 0 else None,
+            f"{year_to}-12-31" if year_to and year_to > 0 else None,
+        ))
+        tree['engine_codes'].add((generation_id, engine_code))
+        tree['engine_external_ids'].add((generation_id, str(engine_id)))
+        self.stats['engines_imported'] += 1
+
+    @staticmethod
+    def format_period(year_from, year_to):
+        year_from_str = str(year_from) if year_from and year_from > 0 else "?"
+        year_to_str = str(year_to) if year_to and year_to > 0 else "present"
+        return f"{year_from_str}-{year_to_str}"
+
+    def diff_v2(self, models, manufacturers, brand_mapping, cars_by_model, engines_by_car, specs, tree):
+        """Marka → Model → Generacija (po TecDoc modelu) → Motori"""
+        new_rows = {'models': [], 'generations': [], 'engines': []}
+
+        for model_data in models:
+            tecdoc_model_id, model_description, manufacturer_id, year_from, year_to = model_data
+
+            manufacturer_name = manufacturers.get(manufacturer_id, '').lower()
+            brand_id = brand_mapping.get(manufacturer_name)
+            if not brand_id:
+                self.stats['models_skipped'] += 1
+                continue
+
+            model_name, generation_name = self.parse_model_and_generation(model_description)
+
+            model_id = self.resolve_model(tree, new_rows, brand_id, model_name, model_data)
+
+            generation_id = self.resolve_generation(
+                tree, new_rows, model_id, generation_name,
+                self.format_period(year_from, year_to), None, tecdoc_model_id
+            )
+
+            cars = cars_by_model.get(tecdoc_model_id, [])
+            self.stats['engines_total'] += len(cars)
+
+            for car_id, car_description, car_year_from, car_year_to in cars:
+                for engine_data in engines_by_car.get(car_id, []):
+                    self.add_engine(
+                        tree, new_rows, generation_id, car_description,
+                        engine_data, specs, car_year_from, car_year_to
+                    )
+
+        return new_rows
+
+    def diff_final(self, models, manufacturers, brand_mapping, cars_by_model, engines_by_car, specs, tree):
+        """Marka → Model → Generacija (po passengercar, sa vinCode specs)"""
+        new_rows = {'models': [], 'generations': [], 'engines': []}
+
+        for model_data in models:
+            tecdoc_model_id, model_description, manufacturer_id, year_from, year_to = model_data
+
+            manufacturer_name = manufacturers.get(manufacturer_id, '').lower()
+            brand_id = brand_mapping.get(manufacturer_name)
+            if not brand_id:
+                self.stats['models_skipped'] += 1
+                continue
+
+            model_name = self.parse_model_name(model_description)
+            model_id = self.resolve_model(tree, new_rows, brand_id, model_name, model_data)
+
+            generation_code = self.parse_generation_code(model_description)
+            cars = cars_by_model.get(tecdoc_model_id, [])
+            self.stats['generations_total'] += len(cars)
+
+            for car_id, car_description, car_year_from, car_year_to in cars:
+                engines = engines_by_car.get(car_id, [])
+
+                vin_data = {}
+                engine_codes_str = ""
+                if engines:
+                    engine_id, engine_codes_str = engines[0]
+                    power_kw, power_hp, capacity = specs.get(engine_id, (None, None, None))
+                    vin_data['engineCode'] = engine_codes_str
+                    if power_kw:
+                        vin_data['powerKW'] = power_kw
+                    if power_hp:
+                        vin_data['powerHP'] = power_hp
+                    if capacity:
+                        vin_data['engineCC'] = capacity
+
+                if generation_code and engine_codes_str:
+                    generation_name = f"{generation_code} - {car_description} {engine_codes_str}"
+                elif generation_code:
+                    generation_name = f"{generation_code} - {car_description}"
+                elif engine_codes_str:
+                    generation_name = f"{car_description} {engine_codes_str}"
+                else:
+                    generation_name = car_description
+
+                self.resolve_generation(
+                    tree, new_rows, model_id, generation_name,
+                    self.format_period(car_year_from, car_year_to),
+                    str(vin_data) if vin_data else None,
+                    car_id
+                )
+
+        return new_rows
+
+    # ------------------------------------------------------------------
+    # COPY upis
+    # ------------------------------------------------------------------
+
+    def copy_rows(self, cursor, table, columns, rows):
+        """COPY redova u temp tabelu (CSV, None → NULL)"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([COPY_NULL if value is None else value for value in row])
+        buffer.seek(0)
+
+        column_list = ', '.join(f'"{column}"' for column in columns)
+        cursor.copy_expert(
+            f"COPY {table} ({column_list}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')",
+            buffer
+        )
+
+    def write_new_rows(self, new_rows):
+        """Upiši sve nove redove u jednoj transakciji"""
+        cursor = self.prod_conn.cursor()
+
+        try:
+            cursor.execute("""
+                CREATE TEMP TABLE stage_vehicle_model (
+                    id TEXT, "brandId" TEXT, name TEXT,
+                    "productionStart" TIMESTAMP(3), "productionEnd" TIMESTAMP(3),
+                    "externalId" TEXT
+                ) ON COMMIT DROP;
+
+                CREATE TEMP TABLE stage_vehicle_generation (
+                    id TEXT, "modelId" TEXT, name TEXT, period TEXT,
+                    "vinCode" TEXT, "externalId" TEXT
+                ) ON COMMIT DROP;
+
+                CREATE TEMP TABLE stage_vehicle_engine (
+                    id TEXT, "generationId" TEXT, "engineType" TEXT, "engineCode" TEXT,
+                    "enginePowerKW" DOUBLE PRECISION, "enginePowerHP" DOUBLE PRECISION,
+                    "engineCapacity" INTEGER, description TEXT, "externalId" TEXT,
+                    "yearFrom" TIMESTAMP(3), "yearTo" TIMESTAMP(3)
+                ) ON COMMIT DROP;
+            """)
+
+            model_columns = ['id', 'brandId', 'name', 'productionStart', 'productionEnd', 'externalId']
+            generation_columns = ['id', 'modelId', 'name', 'period', 'vinCode', 'externalId']
+            engine_columns = [
+                'id', 'generationId', 'engineType', 'engineCode', 'enginePowerKW', 'enginePowerHP',
+                'engineCapacity', 'description', 'externalId', 'yearFrom', 'yearTo'
+            ]
+
+            self.copy_rows(cursor, 'stage_vehicle_model', model_columns, new_rows['models'])
+            self.copy_rows(cursor, 'stage_vehicle_generation', generation_columns, new_rows['generations'])
+            self.copy_rows(cursor, 'stage_vehicle_engine', engine_columns, new_rows['engines'])
+
+            model_list = ', '.join(f'"{column}"' for column in model_columns)
+            cursor.execute(f"""
+                INSERT INTO "VehicleModel" ({model_list})
+                SELECT {model_list} FROM stage_vehicle_model
+                ON CONFLICT DO NOTHING
+            """)
+            models_written = cursor.rowcount
+
+            generation_list = ', '.join(f'"{column}"' for column in generation_columns)
+            cursor.execute(f"""
+                INSERT INTO "VehicleGeneration" ({generation_list}, "createdAt", "updatedAt")
+                SELECT {generation_list}, NOW(), NOW() FROM stage_vehicle_generation
+                ON CONFLICT DO NOTHING
+            """)
+            generations_written = cursor.rowcount
+
+            engine_list = ', '.join(f'"{column}"' for column in engine_columns)
+            cursor.execute(f"""
+                INSERT INTO "VehicleEngine" ({engine_list}, "createdAt", "updatedAt")
+                SELECT {engine_list}, NOW(), NOW() FROM stage_vehicle_engine
+                ON CONFLICT DO NOTHING
+            """)
+            engines_written = cursor.rowcount
+
+            self.prod_conn.commit()
+        except Exception:
+            self.prod_conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+        logging.info(
+            f"💾 Written: {models_written} models, {generations_written} generations, "
+            f"{engines_written} engines"
+        )
+
+    # ------------------------------------------------------------------
+
+    def run(self, year_from=1990, dry_run=False):
+        """Pokreni bulk import"""
+        started = time.time()
+
+        logging.info(f"\n{'#'*70}")
+        logging.info(f"🚗 BULK Import Vozila iz TecDoc-a (>= {year_from}, layout: {self.layout})")
+        logging.info(f"{'#'*70}\n")
+
+        # 1. Mapiranja i TecDoc stablo
+        brand_mapping = self.get_brand_mapping()
+        manufacturers = self.get_tecdoc_manufacturers()
+
+        # Diff treba cijelo stablo u memoriji, pa se stream modela materijalizuje
+        models = list(self.get_models_from_tecdoc(year_from))
+        self.stats['models_total'] = len(models)
+
+        cars_by_model = self.get_passengercars_tree(year_from)
+        engines_by_car = self.get_engines_tree(year_from)
+        specs = self.get_engine_specs_tree(year_from) if engines_by_car else {}
+
+        # 2. Postojeće stablo i diff
+        tree = self.get_existing_tree(list(set(brand_mapping.values())))
+
+        diff = self.diff_final if self.layout == 'final' else self.diff_v2
+        new_rows = diff(models, manufacturers, brand_mapping, cars_by_model, engines_by_car, specs, tree)
+
+        logging.info(f"\n{'='*70}")
+        logging.info(f"📊 Diff ({time.time() - started:.1f}s):")
+        logging.info(f"   New models: {len(new_rows['models'])}")
+        logging.info(f"   New generations: {len(new_rows['generations'])}")
+        logging.info(f"   New engines: {len(new_rows['engines'])}")
+        logging.info(f"{'='*70}\n")
+
+        # 3. Upis
+        if dry_run:
+            logging.info("🔍 DRY RUN - ništa nije upisano")
+        elif any(new_rows.values()):
+            self.write_new_rows(new_rows)
+        else:
+            logging.info("✅ Stablo je već ažurno")
+
+        logging.info(f"\n{'#'*70}")
+        logging.info(f"✅ BULK IMPORT COMPLETED ({time.time() - started:.1f}s)")
+        logging.info(f"{'#'*70}")
+        logging.info("📊 Final Stats:")
+        for key, value in self.stats.items():
+            logging.info(f"   {key}: {value}")
+        logging.info(f"{'#'*70}\n")
+
+
+def main():
+    """Main funkcija"""
+    parser = argparse.ArgumentParser(description="Bulk import TecDoc stabla vozila")
+    parser.add_argument("year_from", type=int, nargs="?", default=1990, help="Modeli od godine (default: 1990)")
+    parser.add_argument(
+        "--layout",
+        choices=["v2", "final"],
+        default="v2",
+        help="v2 = generacija po modelu + VehicleEngine; final = generacija po passengercar"
+    )
+    parser.add_argument("--dry-run", action="store_true", help="Samo izračunaj diff, bez upisa")
+    args = parser.parse_args()
+
+    importer = VehicleImporterBulk(layout=args.layout)
+
+    try:
+        importer.run(year_from=args.year_from, dry_run=args.dry_run)
+    except Exception as e:
+        logging.error(f"❌ Fatal error: {e}")
+        raise
+    finally:
+        importer.close()
+
+if __name__ == "__main__":
+    main()
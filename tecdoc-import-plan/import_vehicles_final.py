@@ -19,6 +19,8 @@ import secrets
 import string
 import re
 
+from tecdoc_db import stream_mysql
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -150,10 +152,28 @@ class VehicleImporterFinal:
         logging.info(f"📋 Loaded {len(manufacturers)} manufacturers from TecDoc")
         return manufacturers
     
-    def get_models_from_tecdoc(self, year_from=1990):
-        """Učitaj MODELE"""
+    def count_models_from_tecdoc(self, year_from=1990):
+        """Prebroji MODELE (za progress, bez učitavanja redova)"""
         cursor = self.tecdoc_conn.cursor()
         
+        query = """
+            SELECT COUNT(DISTINCT m.id)
+            FROM models m
+            WHERE m.IsPassengerCar = 1
+            AND (YEAR(m.`From`) >= %s OR YEAR(m.`To`) >= %s OR YEAR(m.`To`) = 0)
+            AND m.ManufacturerId IS NOT NULL
+            AND m.Description IS NOT NULL
+        """
+        
+        cursor.execute(query, (year_from, year_from))
+        total = cursor.fetchone()[0]
+        cursor.close()
+        
+        logging.info(f"📦 Found {total} models in TecDoc (>= {year_from})")
+        return total
+    
+    def get_models_from_tecdoc(self, year_from=1990):
+        """Streamaj MODELE (generator, redovi se ne drže u memoriji)"""
         query = """
             SELECT DISTINCT
                 m.id as model_id,
@@ -169,12 +189,7 @@ class VehicleImporterFinal:
             ORDER BY m.ManufacturerId, m.Description
         """
         
-        cursor.execute(query, (year_from, year_from))
-        models = cursor.fetchall()
-        cursor.close()
-        
-        logging.info(f"📦 Loaded {len(models)} models from TecDoc (>= {year_from})")
-        return models
+        return stream_mysql(self.tecdoc_conn, query, (year_from, year_from))
     
     def model_exists(self, brand_id, model_name):
         """Provjeri da li model postoji"""
@@ -425,8 +440,9 @@ class VehicleImporterFinal:
         manufacturers = self.get_tecdoc_manufacturers()
         
         # 2. Učitaj MODELE
+        self.stats['models_total'] = self.count_models_from_tecdoc(year_from)
         models = self.get_models_from_tecdoc(year_from)
-        self.stats['models_total'] = len(models)
+        total_models = self.stats['models_total']
         
         logging.info(f"\n{'='*70}")
         logging.info(f"📦 FAZA 1: Import MODELA")
@@ -444,7 +460,7 @@ class VehicleImporterFinal:
                 
                 if not brand_id:
                     if idx % 100 == 0:
-                        logging.debug(f"⏭️  [{idx}/{len(models)}] Skipped: {manufacturer_name} - not in database")
+                        logging.debug(f"⏭️  [{idx}/{total_models}] Skipped: {manufacturer_name} - not in database")
                     self.stats['models_skipped'] += 1
                     continue
                 
@@ -463,16 +479,16 @@ class VehicleImporterFinal:
                 new_model_id = self.insert_model(brand_id, model_name, model_data)
                 model_mapping[model_id] = (new_model_id, model_description)
                 
-                logging.info(f"✅ [{idx}/{len(models)}] {manufacturer_name.upper()} {model_name} ({year_from_val}-{year_to_val if year_to_val > 0 else 'present'})")
+                logging.info(f"✅ [{idx}/{total_models}] {manufacturer_name.upper()} {model_name} ({year_from_val}-{year_to_val if year_to_val > 0 else 'present'})")
                 self.stats['models_imported'] += 1
                 
                 if idx % 50 == 0:
-                    logging.info(f"\n📊 Progress: {idx}/{len(models)} ({idx/len(models)*100:.1f}%)")
+                    logging.info(f"\n📊 Progress: {idx}/{total_models} ({idx/max(total_models, 1)*100:.1f}%)")
                     logging.info(f"   Imported: {self.stats['models_imported']}, Skipped: {self.stats['models_skipped']}\n")
                 
                 # Progress za svaki 10. model
                 if idx % 10 == 0:
-                    logging.debug(f"Processing {idx}/{len(models)}...")
+                    logging.debug(f"Processing {idx}/{total_models}...")
                 
             except Exception as e:
                 logging.error(f"❌ Error processing model: {e}")
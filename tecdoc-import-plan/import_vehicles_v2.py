@@ -20,6 +20,8 @@ import secrets
 import string
 import re
 
+from tecdoc_db import stream_mysql
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -30,18 +32,24 @@ logging.basicConfig(
     ]
 )
 
+TECDOC_CONFIG = {
+    'host': "localhost",
+    'user': "root",
+    'password': "",
+    'database': "tecdoc1q2019",
+    'connect_timeout': 300
+}
+
 class VehicleImporterV2:
     def __init__(self):
         """Inicijalizacija konekcija"""
         
         # TecDoc MySQL
-        self.tecdoc_conn = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="",
-            database="tecdoc1q2019",
-            connect_timeout=300
-        )
+        self.tecdoc_conn = mysql.connector.connect(**TECDOC_CONFIG)
+        
+        # Zasebna konekcija za streaming modela - glavna konekcija se koristi
+        # za passengercars/engine upite unutar petlje dok stream traje
+        self.tecdoc_stream_conn = mysql.connector.connect(**TECDOC_CONFIG)
         
         # Postgres (Neon)
         self.prod_conn = psycopg2.connect(
@@ -152,10 +160,28 @@ class VehicleImporterV2:
         logging.info(f"📋 Loaded {len(manufacturers)} manufacturers from TecDoc")
         return manufacturers
     
-    def get_models_from_tecdoc(self, year_from=1990):
-        """Učitaj MODELE"""
+    def count_models_from_tecdoc(self, year_from=1990):
+        """Prebroji MODELE (za progress, bez učitavanja redova)"""
         cursor = self.tecdoc_conn.cursor()
         
+        query = """
+            SELECT COUNT(DISTINCT m.id)
+            FROM models m
+            WHERE m.IsPassengerCar = 1
+            AND (YEAR(m.`From`) >= %s OR YEAR(m.`To`) >= %s OR YEAR(m.`To`) = 0)
+            AND m.ManufacturerId IS NOT NULL
+            AND m.Description IS NOT NULL
+        """
+        
+        cursor.execute(query, (year_from, year_from))
+        total = cursor.fetchone()[0]
+        cursor.close()
+        
+        logging.info(f"📦 Found {total} models in TecDoc (>= {year_from})")
+        return total
+    
+    def get_models_from_tecdoc(self, year_from=1990):
+        """Streamaj MODELE (generator, redovi se ne drže u memoriji)"""
         query = """
             SELECT DISTINCT
                 m.id as model_id,
@@ -171,12 +197,7 @@ class VehicleImporterV2:
             ORDER BY m.ManufacturerId, m.Description
         """
         
-        cursor.execute(query, (year_from, year_from))
-        models = cursor.fetchall()
-        cursor.close()
-        
-        logging.info(f"📦 Loaded {len(models)} models from TecDoc (>= {year_from})")
-        return models
+        return stream_mysql(self.tecdoc_stream_conn, query, (year_from, year_from))
     
     def model_exists(self, brand_id, model_name):
         """Provjeri da li model postoji"""
@@ -345,6 +366,10 @@ class VehicleImporterV2:
         specs = cursor.fetchall()
         cursor.close()
         
+        return self.parse_engine_specs(specs)
+    
+    def parse_engine_specs(self, specs):
+        """Parsiraj (DisplayTitle, DisplayValue) redove u (KW, HP, CCM)"""
         power_kw = None
         power_hp = None
         capacity = None
@@ -456,8 +481,9 @@ class VehicleImporterV2:
         manufacturers = self.get_tecdoc_manufacturers()
         
         # 2. Učitaj MODELE
+        self.stats['models_total'] = self.count_models_from_tecdoc(year_from)
         models = self.get_models_from_tecdoc(year_from)
-        self.stats['models_total'] = len(models)
+        total_models = self.stats['models_total']
         
         logging.info(f"\n{'='*70}")
         logging.info(f"📦 FAZA 1: Import MODELA i GENERACIJA")
@@ -545,7 +571,7 @@ class VehicleImporterV2:
                 
                 # Progress
                 if idx % 10 == 0:
-                    logging.info(f"\n📊 Progress: {idx}/{len(models)} ({idx/len(models)*100:.1f}%)")
+                    logging.info(f"\n📊 Progress: {idx}/{total_models} ({idx/max(total_models, 1)*100:.1f}%)")
                     logging.info(f"   Models: {self.stats['models_imported']}, Generations: {self.stats['generations_imported']}, Engines: {self.stats['engines_imported']}\n")
                 
             except Exception as e:
@@ -576,6 +602,7 @@ class VehicleImporterV2:
     def close(self):
         """Zatvori konekcije"""
         self.tecdoc_conn.close()
+        self.tecdoc_stream_conn.close()
         self.prod_conn.close()
         logging.info("🔌 Database connections closed")
 
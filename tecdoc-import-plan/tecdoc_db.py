@@ -0,0 +1,1207 @@
+"""
+Zajednički DB helperi za TecDoc import/enrichment skripte
+=========================================================
+
+1) Pool konekcija sa health check-om i transparentnim reconnect-om
+
+   Umjesto da svaka klasa otvara svoje sirove konekcije, koristi se
+   zajednički pool po konfiguraciji (isti host/baza = isti pool):
+
+       from tecdoc_db import mysql_pool, postgres_pool
+
+       self.tecdoc_conn = mysql_pool(host="localhost", database="tecdoc1q2019", ...).connection()
+       self.postgres_conn = postgres_pool("postgresql://...").connection()
+
+   Dobijeni objekat se ponaša kao obična konekcija (cursor, commit,
+   rollback, close), ali:
+     - prije korištenja, ako je konekcija neaktivna duže od
+       health_check_interval, radi ping i po potrebi se ponovo spaja
+     - close() vraća konekciju u pool umjesto da je zatvori
+     - svaki cursor.execute() se mjeri (pool.timings)
+     - fetchone_cached / fetchall_cached koriste pripremljene upite
+       (MySQL prepared cursor, Postgres PREPARE/EXECUTE) za hot lookup-e
+
+   Na Neon pooler-u (PgBouncer, transaction mode) PREPARE ne preživljava
+   između transakcija, pa je tamo isključen - koristi se običan execute.
+
+2) Streaming čitanje velikih rezultata bez fetchall():
+
+  - MySQL (mysql.connector): unbuffered cursor + fetchmany
+  - Postgres (psycopg2): named (server-side) cursor sa itersize
+
+Redovi se vraćaju kao tuple, jedan po jedan, a sa servera se vuku u
+chunk-ovima, pa memorija ostaje ista bez obzira na veličinu rezultata.
+
+Primjer:
+    from tecdoc_db import stream_mysql, stream_postgres, chunked
+
+    for row in stream_mysql(tecdoc_conn, "SELECT id FROM articles"):
+        ...
+
+    for batch in chunked(stream_postgres(prod_conn, 'SELECT id FROM "Product"'), 500):
+        ...
+
+VAŽNO: dok se MySQL stream ne potroši do kraja, ista konekcija ne može
+izvršavati druge upite - za ugniježđene upite koristi zasebnu konekciju.
+
+3) Bulk upis ArticleOENumber redova (jedan upsert po batch-u):
+
+    writer = ArticleOENumberWriter()
+    writer.add(product_id, "1K0698151", "VW")
+    inserted = writer.flush(postgres_conn)   # commit radi pozivalac
+
+4) Sinhronizacija ProductCrossReference (diff željenog i postojećeg skupa):
+
+    sync = ProductCrossReferenceSync()
+    sync.set_references(product_id, cross_refs)
+    result = sync.flush(postgres_conn)       # commit radi pozivalac, pa sync.clear()
+
+5) Buffered UPDATE "Product" ... FROM (VALUES ...) (ProductUpdateWriter):
+
+    writer = ProductUpdateWriter([('technicalSpecs', 'jsonb', None)], flush_size=500)
+    writer.add(product_id, technicalSpecs=json.dumps(specs))
+    writer.flush(postgres_conn)              # commit radi pozivalac, pa writer.clear()
+
+6) TecDoc passengercars ID → naša generacija (VehicleGenerationResolver):
+
+    resolver = VehicleGenerationResolver()   # mapa se učitava jednom
+    rows = resolver.resolve(postgres_conn, passengercars_ids)
+"""
+
+import atexit
+import hashlib
+import io
+import itertools
+import logging
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def stream_mysql(conn, query: str, params: Optional[Sequence] = None,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[tuple]:
+    """
+    Streama redove iz MySQL-a preko unbuffered cursora.
+
+    Args:
+        conn: mysql.connector konekcija (ne smije se koristiti za druge upite dok stream traje)
+        query: SQL upit
+        params: Parametri upita
+        chunk_size: Broj redova po fetchmany pozivu
+
+    Yields:
+        Redovi kao tuple
+    """
+    cursor = conn.cursor(buffered=False)
+    try:
+        cursor.execute(query, params or ())
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                yield tuple(row)
+    finally:
+        # Unbuffered cursor mora pročitati ostatak rezultata prije zatvaranja
+        try:
+            while cursor.fetchmany(chunk_size):
+                pass
+        except Exception:
+            pass
+        cursor.close()
+
+
+def stream_postgres(conn, query: str, params: Optional[Sequence] = None,
+                    itersize: int = DEFAULT_CHUNK_SIZE, withhold: bool = False) -> Iterator[tuple]:
+    """
+    Streama redove iz Postgres-a preko named (server-side) cursora.
+
+    Args:
+        conn: psycopg2 konekcija
+        query: SQL upit
+        params: Parametri upita
+        itersize: Broj redova po round-tripu
+        withhold: True ako se na istoj konekciji radi commit/rollback dok stream
+                  traje. WITH HOLD cursor se commit-uje odmah nakon otvaranja,
+                  pa kasniji commit/rollback pozivaoca ne zatvaraju stream.
+
+    Yields:
+        Redovi kao tuple
+    """
+    cursor = conn.cursor(name=f"stream_{uuid.uuid4().hex[:12]}", withhold=withhold)
+    cursor.itersize = itersize
+    try:
+        cursor.execute(query, params)
+        if withhold and not conn.autocommit:
+            conn.commit()
+        for row in cursor:
+            yield tuple(row)
+    finally:
+        cursor.close()
+
+
+def chunked(rows: Iterable, size: int) -> Iterator[List]:
+    """
+    Grupiše bilo koji iterable u liste od najviše `size` elemenata.
+    """
+    iterator = iter(rows)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# ===================================================================
+# BULK WRITE (Postgres)
+# ===================================================================
+
+class ArticleOENumberWriter:
+    """
+    Skuplja ArticleOENumber redove kroz cijeli batch i upisuje ih jednim
+    INSERT ... VALUES ... ON CONFLICT ("productId", "oemNumber") DO UPDATE
+    (psycopg2 execute_values), umjesto SELECT + INSERT po OEM broju.
+
+    Duplikati (isti productId + oemNumber) se spajaju u memoriji - Postgres
+    ne dozvoljava da jedan ON CONFLICT DO UPDATE dva puta dira isti red.
+
+        writer = ArticleOENumberWriter()
+        for oem in oem_numbers:
+            writer.add(product_id, oem['oem'], oem['manufacturer'])
+        inserted = writer.flush(conn)   # commit radi pozivalac
+
+    overwrite=True:  postojeći red dobija novi manufacturer (TecDoc je izvor istine)
+    overwrite=False: postojeći manufacturer ostaje, popunjava se samo ako je NULL
+    """
+
+    INSERT_COLUMNS = '(id, "productId", "oemNumber", manufacturer, "referenceType", "createdAt", "updatedAt")'
+    VALUES_TEMPLATE = "(gen_random_uuid()::text, %s, %s, %s, %s, NOW(), NOW())"
+
+    def __init__(self, overwrite: bool = True, page_size: int = 5000):
+        self.overwrite = overwrite
+        self.page_size = page_size
+        self._rows: Dict[tuple, list] = {}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, product_id: str, oem_number: str, manufacturer: Optional[str] = None,
+            reference_type: str = 'Original') -> bool:
+        """
+        Dodaj OEM broj u buffer. Vraća False ako je isti par već u bufferu
+        (tada se samo popunjava manufacturer ako ga nije bilo).
+        """
+        key = (product_id, oem_number)
+        row = self._rows.get(key)
+        if row is not None:
+            if manufacturer and (self.overwrite or not row[2]):
+                row[2] = manufacturer
+            return False
+        self._rows[key] = [product_id, oem_number, manufacturer, reference_type or 'Original']
+        return True
+
+    def discard_product(self, product_id: str):
+        """Izbaci sve buffered redove jednog proizvoda (npr. nakon greške)"""
+        for key in [k for k in self._rows if k[0] == product_id]:
+            del self._rows[key]
+
+    def take(self) -> List[tuple]:
+        """Vrati buffered redove (productId, oemNumber, manufacturer, referenceType) i isprazni buffer"""
+        rows = [tuple(row) for row in self._rows.values()]
+        self._rows.clear()
+        return rows
+
+    @staticmethod
+    def existing_keys(conn, rows: Sequence[tuple]) -> set:
+        """Jedan upit: koji (productId, oemNumber) parovi već postoje u bazi"""
+        if not rows:
+            return set()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT a."productId", a."oemNumber"
+                FROM "ArticleOENumber" a
+                JOIN unnest(%s::text[], %s::text[]) AS k(product_id, oem_number)
+                  ON a."productId" = k.product_id AND a."oemNumber" = k.oem_number
+            """, ([r[0] for r in rows], [r[1] for r in rows]))
+            return {(r[0], r[1]) for r in cursor.fetchall()}
+        finally:
+            cursor.close()
+
+    def flush(self, conn) -> int:
+        """
+        Upiši sve buffered redove jednim upsert-om (bez commit-a).
+
+        Returns:
+            Broj novo ubačenih redova (ažurirani postojeći se ne broje)
+        """
+        rows = self.take()
+        if not rows:
+            return 0
+
+        from psycopg2.extras import execute_values
+
+        if self.overwrite:
+            manufacturer_sql = 'COALESCE(EXCLUDED.manufacturer, "ArticleOENumber".manufacturer)'
+        else:
+            manufacturer_sql = 'COALESCE("ArticleOENumber".manufacturer, EXCLUDED.manufacturer)'
+
+        query = f"""
+            INSERT INTO "ArticleOENumber" {self.INSERT_COLUMNS}
+            VALUES %s
+            ON CONFLICT ("productId", "oemNumber") DO UPDATE
+            SET manufacturer = {manufacturer_sql},
+                "updatedAt" = NOW()
+            RETURNING (xmax = 0)
+        """
+        cursor = conn.cursor()
+        try:
+            # xmax = 0 -> red je upravo ubačen, inače je ažuriran postojeći
+            result = execute_values(cursor, query, rows, template=self.VALUES_TEMPLATE,
+                                    page_size=self.page_size, fetch=True)
+            return sum(1 for (inserted,) in result if inserted)
+        finally:
+            cursor.close()
+
+
+class ProductCrossReferenceSync:
+    """
+    Batch sinhronizacija TecDoc cross reference-a (ProductCrossReference).
+
+    Za svaki proizvod se zada ŽELJENI skup referenci (set_references), a
+    flush() za cijeli batch:
+      1. jednim upitom razriješi replacementId (Product.catalogNumber)
+      2. jednim upitom učita postojeće redove ovog izvora
+      3. jednim DELETE-om obriše zastarjele i jednim INSERT-om doda nove
+
+    Dira samo redove sa svojim referenceType + notes (izvor), pa ručno
+    unesene reference ostaju, a ponovno pokretanje ne pravi duplikate.
+
+        sync = ProductCrossReferenceSync(only_local=True)
+        sync.set_references(product_id, [{'article_number': '...', 'supplier': 'BOSCH'}])
+        result = sync.flush(conn)   # commit radi pozivalac, pa sync.clear()
+
+    only_local=True: čuvaju se samo reference na proizvode koje imamo u bazi
+    """
+
+    INSERT_COLUMNS = '(id, "productId", "referenceType", "referenceNumber", manufacturer, notes, "replacementId")'
+    VALUES_TEMPLATE = "(gen_random_uuid()::text, %s, %s, %s, %s, %s, %s)"
+
+    def __init__(self, reference_type: str = 'CROSS', source: str = 'TecDoc',
+                 only_local: bool = False, page_size: int = 5000):
+        self.reference_type = reference_type
+        self.source = source
+        self.only_local = only_local
+        self.page_size = page_size
+        self._desired: Dict[str, Dict[tuple, None]] = {}
+        self.failed: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._desired)
+
+    def set_references(self, product_id: str, refs: Iterable[Dict]):
+        """
+        Zadaj kompletan skup referenci proizvoda (prazan skup briše postojeće).
+
+        refs: dict-ovi sa 'article_number' i (opcionalno) 'supplier'
+        """
+        desired = {}
+        for ref in refs:
+            number = (ref.get('article_number') or '').strip()
+            if number:
+                desired[(number, ref.get('supplier') or None)] = None
+        self._desired[product_id] = desired
+
+    def discard_product(self, product_id: str):
+        self._desired.pop(product_id, None)
+
+    def _resolve_replacements(self, cursor, numbers: List[str]) -> Dict[str, str]:
+        if not numbers:
+            return {}
+        cursor.execute("""
+            SELECT DISTINCT ON ("catalogNumber") "catalogNumber", id
+            FROM "Product"
+            WHERE "catalogNumber" = ANY(%s)
+            ORDER BY "catalogNumber", id
+        """, (numbers,))
+        return {number: product_id for number, product_id in cursor.fetchall()}
+
+    def product_ids(self) -> List[str]:
+        return list(self._desired)
+
+    def clear(self):
+        """Isprazni buffer - poziva se tek nakon uspješnog commit-a"""
+        self._desired = {}
+
+    def flush(self, conn) -> Dict[str, int]:
+        """
+        Primijeni sve zadane skupove (bez commit-a).
+
+        Ako batch padne, ponavlja se proizvod po proizvod (SAVEPOINT po
+        proizvodu). Proizvodi koji i dalje padaju izbacuju se iz buffera i
+        ostaju u self.failed ({product_id: greška}). Buffer ostaje do clear()
+        nakon commit-a.
+
+        Returns:
+            {'inserted', 'deleted', 'unchanged', 'products_with_inserts'}
+        """
+        self.failed = {}
+        result = {'inserted': 0, 'deleted': 0, 'unchanged': 0, 'products_with_inserts': 0}
+        if not self._desired:
+            return result
+
+        import psycopg2
+
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SAVEPOINT cross_ref_batch")
+            try:
+                self._apply(cursor, self._desired, result)
+            except psycopg2.Error as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT cross_ref_batch")
+                logging.warning(f"⚠️  Cross reference batch failed ({len(self._desired)} products), "
+                                f"retrying product by product: {e}")
+                result = {key: 0 for key in result}
+                for product_id, desired in list(self._desired.items()):
+                    product_result = {key: 0 for key in result}
+                    cursor.execute("SAVEPOINT cross_ref_product")
+                    try:
+                        self._apply(cursor, {product_id: desired}, product_result)
+                    except psycopg2.Error as product_error:
+                        cursor.execute("ROLLBACK TO SAVEPOINT cross_ref_product")
+                        self.failed[product_id] = str(product_error).strip()
+                        del self._desired[product_id]
+                    else:
+                        cursor.execute("RELEASE SAVEPOINT cross_ref_product")
+                        for key, value in product_result.items():
+                            result[key] += value
+            cursor.execute("RELEASE SAVEPOINT cross_ref_batch")
+            return result
+        finally:
+            cursor.close()
+
+    def _apply(self, cursor, desired_by_product: Dict[str, Dict[tuple, None]], result: Dict[str, int]):
+        from psycopg2.extras import execute_values
+
+        numbers = sorted({number for desired in desired_by_product.values() for number, _ in desired})
+        replacements = self._resolve_replacements(cursor, numbers)
+
+        cursor.execute("""
+            SELECT id, "productId", "referenceNumber", manufacturer, "replacementId"
+            FROM "ProductCrossReference"
+            WHERE "productId" = ANY(%s)
+              AND "referenceType" = %s
+              AND notes IS NOT DISTINCT FROM %s
+        """, (list(desired_by_product), self.reference_type, self.source))
+        existing: Dict[tuple, List[str]] = {}
+        for row_id, product_id, number, manufacturer, replacement_id in cursor.fetchall():
+            existing.setdefault((product_id, number, manufacturer, replacement_id), []).append(row_id)
+
+        inserts = []
+        delete_ids = []
+        for product_id, desired in desired_by_product.items():
+            product_inserts = 0
+            for number, manufacturer in desired:
+                replacement_id = replacements.get(number)
+                if replacement_id == product_id:
+                    continue
+                if self.only_local and not replacement_id:
+                    continue
+                key = (product_id, number, manufacturer, replacement_id)
+                ids = existing.pop(key, None)
+                if ids:
+                    result['unchanged'] += 1
+                    delete_ids.extend(ids[1:])  # stari duplikati
+                else:
+                    inserts.append((product_id, self.reference_type, number, manufacturer,
+                                    self.source, replacement_id))
+                    product_inserts += 1
+            if product_inserts:
+                result['products_with_inserts'] += 1
+
+        # Što je ostalo u existing više nije u željenom skupu
+        for ids in existing.values():
+            delete_ids.extend(ids)
+
+        if delete_ids:
+            cursor.execute('DELETE FROM "ProductCrossReference" WHERE id = ANY(%s)', (delete_ids,))
+            result['deleted'] = cursor.rowcount
+        if inserts:
+            execute_values(
+                cursor,
+                f'INSERT INTO "ProductCrossReference" {self.INSERT_COLUMNS} VALUES %s',
+                inserts, template=self.VALUES_TEMPLATE, page_size=self.page_size
+            )
+            result['inserted'] = len(inserts)
+
+
+class ProductUpdateWriter:
+    """
+    Buffered UPDATE "Product" za više proizvoda odjednom:
+
+        UPDATE "Product" AS p
+        SET "technicalSpecs" = v."technicalSpecs", ...
+        FROM (VALUES (...), (...)) AS v(id, "technicalSpecs", ...)
+        WHERE p.id = v.id
+
+    columns: lista (kolona, postgres tip, SET izraz ili None). None znači
+    direktno v."kolona"; izraz može koristiti i p."kolona", npr.
+    'COALESCE(v."eanCode", p."eanCode")'.
+    extra_set: dodatni SET izrazi bez vrijednosti (npr. '"updatedAt" = NOW()').
+
+        writer = ProductUpdateWriter([('technicalSpecs', 'jsonb', None)], flush_size=500)
+        writer.add(product_id, technicalSpecs=json.dumps(specs))
+        if writer.is_full():
+            writer.flush(conn)      # writer.failed: proizvodi čiji UPDATE nije prošao
+            conn.commit()
+            writer.clear()
+
+    Ako se isti proizvod doda više puta prije flush-a, kasnije vrijednosti
+    pobjeđuju. Kolona koja nije zadana ide kao NULL (pa je za "ne mijenjaj"
+    potreban COALESCE izraz).
+    """
+
+    def __init__(self, columns: Sequence[tuple], extra_set: Sequence[str] = ('"updatedAt" = NOW()',),
+                 flush_size: int = 500):
+        self.columns = [column for column, _, _ in columns]
+        self.flush_size = flush_size
+        self._rows: Dict[str, Dict] = {}
+        self.failed: Dict[str, str] = {}
+
+        self.template = '(%s, ' + ', '.join(f'%s::{pg_type}' for _, pg_type, _ in columns) + ')'
+        set_sql = []
+        for column, _, expression in columns:
+            set_sql.append(f'"{column}" = ' + (expression or f'v."{column}"'))
+        set_sql.extend(extra_set)
+        value_columns = ', '.join(['id'] + [f'"{column}"' for column in self.columns])
+        self.query = (
+            'UPDATE "Product" AS p SET ' + ', '.join(set_sql) +
+            f' FROM (VALUES %s) AS v({value_columns}) WHERE p.id = v.id'
+        )
+
+        # Metrika
+        self.rows_written = 0
+        self.flushes = 0
+        self.flush_seconds = 0.0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, product_id: str, **values):
+        """Dodaj (ili dopuni) izmjene za jedan proizvod"""
+        unknown = set(values) - set(self.columns)
+        if unknown:
+            raise ValueError(f"Unknown Product columns for this writer: {sorted(unknown)}")
+        self._rows.setdefault(product_id, {}).update(values)
+
+    def discard_product(self, product_id: str):
+        self._rows.pop(product_id, None)
+
+    def is_full(self) -> bool:
+        return len(self._rows) >= self.flush_size
+
+    def product_ids(self) -> List[str]:
+        return list(self._rows)
+
+    def clear(self):
+        """Isprazni buffer - poziva se tek nakon uspješnog commit-a"""
+        self._rows = {}
+
+    def _execute(self, cursor, rows: List[tuple]):
+        from psycopg2.extras import execute_values
+        execute_values(cursor, self.query, rows, template=self.template, page_size=len(rows))
+
+    def flush(self, conn) -> int:
+        """
+        Jedan UPDATE ... FROM (VALUES ...) za sve buffered proizvode (bez commit-a).
+
+        Ako batch UPDATE padne, ponavlja se red po red (SAVEPOINT po proizvodu),
+        pa jedan loš red ne poništi ostale. Proizvodi koji i dalje padaju izbacuju
+        se iz buffera i ostaju u self.failed ({product_id: greška}).
+
+        Buffer se NE prazni - ostaje do clear() nakon commit-a, pa pozivalac uvijek
+        zna koji proizvodi su bili u transakciji koja je (eventualno) propala.
+
+        Returns:
+            Broj ažuriranih redova
+        """
+        self.failed = {}
+        if not self._rows:
+            return 0
+
+        import psycopg2
+
+        rows = [
+            (product_id,) + tuple(values.get(column) for column in self.columns)
+            for product_id, values in self._rows.items()
+        ]
+
+        started = time.perf_counter()
+        written = 0
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SAVEPOINT product_update_batch")
+            try:
+                self._execute(cursor, rows)
+                written = len(rows)
+            except psycopg2.Error as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT product_update_batch")
+                logging.warning(f"⚠️  Product batch UPDATE failed ({len(rows)} rows), retrying row by row: {e}")
+                for row in rows:
+                    cursor.execute("SAVEPOINT product_update_row")
+                    try:
+                        self._execute(cursor, [row])
+                    except psycopg2.Error as row_error:
+                        cursor.execute("ROLLBACK TO SAVEPOINT product_update_row")
+                        self.failed[row[0]] = str(row_error).strip()
+                        del self._rows[row[0]]
+                    else:
+                        cursor.execute("RELEASE SAVEPOINT product_update_row")
+                        written += 1
+            cursor.execute("RELEASE SAVEPOINT product_update_batch")
+        finally:
+            cursor.close()
+
+        self.flush_seconds += time.perf_counter() - started
+        self.rows_written += written
+        self.flushes += 1
+        return written
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows_written / self.flush_seconds if self.flush_seconds else 0.0
+
+
+# ===================================================================
+# VEHICLE GENERATION RESOLVER (Postgres)
+# ===================================================================
+
+class VehicleGenerationResolver:
+    """
+    Mapira TecDoc passengercars ID-eve na VehicleGeneration."externalId".
+
+    Umjesto IN (%s, %s, ...) sa po jednim parametrom po vozilu (novi plan
+    za svaki artikal), drži mapu u memoriji:
+
+        externalId → [(brand, model, generation, engine_code, generation_id), ...]
+
+    (jedan red po motoru generacije, engine_code None ako motora nema -
+    isti redovi kao raniji JOIN sa LEFT JOIN "VehicleEngine").
+
+    preload=True: cijela mapa se učitava jednom (streaming), a lookup je
+    O(1) po vozilu. Kad ID nije u mapi, najviše jednom u refresh_interval
+    sekundi se dohvate generacije/motori kreirani ili izmijenjeni nakon
+    zadnjeg učitavanja ("updatedAt" > watermark). Skripta koja sama kreira
+    generacije zove invalidate(external_ids).
+
+    preload=False (jednokratni alati): dohvataju se samo nepoznati ID-evi -
+    do copy_threshold kao jedan = ANY(%s) parametar, a veći setovi se
+    COPY-om učitaju u privremenu tabelu i join-aju.
+    """
+
+    ROWS_QUERY = """
+        SELECT DISTINCT
+            vg."externalId",
+            vb.name,
+            vm.name,
+            vg.name,
+            ve."engineCode",
+            vg.id
+        FROM "VehicleGeneration" vg
+        JOIN "VehicleModel" vm ON vm.id = vg."modelId"
+        JOIN "VehicleBrand" vb ON vb.id = vm."brandId"
+        LEFT JOIN "VehicleEngine" ve ON ve."generationId" = vg.id
+    """
+
+    TEMP_TABLE = "tecdoc_passengercars_ids"
+
+    def __init__(self, preload: bool = True, copy_threshold: int = 2000, refresh_interval: float = 60.0):
+        self.preload = preload
+        self.copy_threshold = copy_threshold
+        self.refresh_interval = refresh_interval
+
+        self._rows: Dict[str, List[tuple]] = {}
+        self._missing = set()
+        self._loaded = False
+        self._watermark = None
+        self._last_refresh = 0.0
+
+        # Metrika
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _store(self, rows: Iterable[tuple], external_ids: Iterable[str] = ()):
+        """Zamijeni unose za dohvaćene ID-eve (i označi tražene koji ne postoje)"""
+        fetched: Dict[str, List[tuple]] = {}
+        for external_id, *row in rows:
+            fetched.setdefault(external_id, []).append(tuple(row))
+        for external_id in external_ids:
+            if external_id not in fetched:
+                self._rows.pop(external_id, None)
+                self._missing.add(external_id)
+        for external_id, entries in fetched.items():
+            self._rows[external_id] = entries
+            self._missing.discard(external_id)
+
+    def _now(self, conn):
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT NOW()")
+            return cursor.fetchone()[0]
+        finally:
+            cursor.close()
+
+    def load(self, conn):
+        """Učitaj cijelu mapu (streaming, jednom po run-u)"""
+        started = time.perf_counter()
+        self._watermark = self._now(conn)
+        self._rows = {}
+        self._missing = set()
+        self._store(stream_postgres(conn, self.ROWS_QUERY + ' WHERE vg."externalId" IS NOT NULL'))
+        self._loaded = True
+        self._last_refresh = time.monotonic()
+        logging.info(f"🗺️  Generation map loaded: {len(self._rows)} TecDoc vehicles "
+                     f"({time.perf_counter() - started:.1f}s)")
+
+    def refresh(self, conn) -> int:
+        """Dohvati generacije/motore izmijenjene nakon zadnjeg učitavanja"""
+        watermark = self._now(conn)
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT DISTINCT vg."externalId"
+                FROM "VehicleGeneration" vg
+                LEFT JOIN "VehicleEngine" ve ON ve."generationId" = vg.id
+                WHERE vg."externalId" IS NOT NULL
+                  AND (vg."updatedAt" > %s OR ve."updatedAt" > %s)
+            """, (self._watermark, self._watermark))
+            changed = [row[0] for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+
+        # Nove generacije mogu popuniti ranije nepoznate ID-eve
+        self._missing = set()
+        if changed:
+            self._fetch(conn, changed)
+        self._watermark = watermark
+        self._last_refresh = time.monotonic()
+        self.refreshes += 1
+        return len(changed)
+
+    def invalidate(self, external_ids: Iterable):
+        """Zaboravi ID-eve (npr. nakon INSERT-a generacije) - sljedeći resolve ih dohvata"""
+        for external_id in external_ids:
+            self._rows.pop(str(external_id), None)
+            self._missing.discard(str(external_id))
+        self._last_refresh = 0.0
+
+    def _fetch(self, conn, external_ids: List[str]):
+        """Dohvati redove za ID-eve: = ANY(%s) ili COPY u temp tabelu + JOIN"""
+        cursor = conn.cursor()
+        try:
+            if len(external_ids) > self.copy_threshold:
+                cursor.execute(f"CREATE TEMP TABLE IF NOT EXISTS {self.TEMP_TABLE} (external_id text)")
+                cursor.execute(f"TRUNCATE {self.TEMP_TABLE}")
+                cursor.copy_from(io.StringIO('\n'.join(external_ids) + '\n'), self.TEMP_TABLE,
+                                 columns=('external_id',))
+                cursor.execute(f"ANALYZE {self.TEMP_TABLE}")
+                cursor.execute(self.ROWS_QUERY +
+                               f' JOIN {self.TEMP_TABLE} t ON t.external_id = vg."externalId"')
+            else:
+                cursor.execute(self.ROWS_QUERY + ' WHERE vg."externalId" = ANY(%s)', (external_ids,))
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+        self._store(rows, external_ids)
+
+    def resolve(self, conn, passengercars_ids: Iterable) -> List[Dict]:
+        """
+        Returns:
+            Lista dict-ova (brand, model, generation, generation_id,
+            engine_code, tecdoc_passengercars_id) - jedan po motoru generacije
+        """
+        if self.preload and not self._loaded:
+            self.load(conn)
+
+        ids = list(dict.fromkeys(str(passengercars_id) for passengercars_id in passengercars_ids))
+
+        if self.preload:
+            if (any(i not in self._rows for i in ids)
+                    and time.monotonic() - self._last_refresh >= self.refresh_interval):
+                self.refresh(conn)
+        else:
+            unknown = [i for i in ids if i not in self._rows and i not in self._missing]
+            if unknown:
+                self._fetch(conn, unknown)
+
+        vehicles = []
+        for external_id in ids:
+            entries = self._rows.get(external_id)
+            if not entries:
+                self.misses += 1
+                continue
+            self.hits += 1
+            for brand, model, generation, engine_code, generation_id in entries:
+                vehicles.append({
+                    'brand': brand,
+                    'model': model,
+                    'generation': generation,
+                    'generation_id': generation_id,
+                    'engine_code': engine_code,
+                    'tecdoc_passengercars_id': external_id
+                })
+        return vehicles
+
+
+# ===================================================================
+# TIMING
+# ===================================================================
+
+class QueryTimings:
+    """
+    Broj izvršavanja i ukupno vrijeme po upitu (ključ = skraćeni SQL).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data: Dict[str, List[float]] = {}
+
+    @staticmethod
+    def label(query) -> str:
+        if isinstance(query, bytes):
+            query = query.decode('utf-8', 'replace')
+        return re.sub(r'\s+', ' ', str(query)).strip()[:80]
+
+    def record(self, label: str, seconds: float):
+        with self._lock:
+            entry = self._data.setdefault(label, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+
+    def summary(self) -> List[Dict]:
+        """Lista upita sortirana po ukupnom vremenu"""
+        with self._lock:
+            rows = [
+                {
+                    'query': label,
+                    'count': int(count),
+                    'total_s': round(total, 3),
+                    'avg_ms': round(total / count * 1000, 2) if count else 0.0,
+                    'max_ms': round(slowest * 1000, 2),
+                }
+                for label, (count, total, slowest) in self._data.items()
+            ]
+        return sorted(rows, key=lambda row: row['total_s'], reverse=True)
+
+    def log_summary(self, title: str = "DB timing", top: int = 10):
+        rows = self.summary()
+        if not rows:
+            return
+        logging.info(f"⏱️  {title} (top {min(top, len(rows))} po ukupnom vremenu):")
+        for row in rows[:top]:
+            logging.info(
+                f"   {row['total_s']:>8.2f}s  {row['count']:>7}x  "
+                f"avg {row['avg_ms']:>7.2f}ms  max {row['max_ms']:>8.2f}ms  {row['query']}"
+            )
+
+
+class TimedCursor:
+    """Omotač oko DB cursora koji mjeri svaki execute()"""
+
+    def __init__(self, cursor, timings: QueryTimings):
+        self._cursor = cursor
+        self._timings = timings
+
+    def execute(self, query, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(query, *args, **kwargs)
+        finally:
+            self._timings.record(QueryTimings.label(query), time.perf_counter() - started)
+
+    def executemany(self, query, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(query, *args, **kwargs)
+        finally:
+            self._timings.record(QueryTimings.label(query), time.perf_counter() - started)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        if name in ('_cursor', '_timings'):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._cursor, name, value)
+
+
+# ===================================================================
+# POOL + MANAGED CONNECTION
+# ===================================================================
+
+class ConnectionPool:
+    """
+    Jednostavan thread-safe pool konekcija jedne baze.
+
+    Driver-specifične stvari (connect, ping, transakcija, prepare) su
+    proslijeđene kao funkcije, pa isti pool radi za MySQL i Postgres.
+    """
+
+    def __init__(self, name: str, connect: Callable, ping: Callable, in_transaction: Callable,
+                 reset: Callable, max_idle: int = 4, health_check_interval: float = 30.0,
+                 prepare: bool = True, connection_errors: tuple = ()):
+        self.name = name
+        self._connect = connect
+        self._ping = ping
+        self._in_transaction = in_transaction
+        self._reset = reset
+        self.max_idle = max_idle
+        self.health_check_interval = health_check_interval
+        self.prepare = prepare
+        self.connection_errors = connection_errors
+
+        self.timings = QueryTimings()
+        self.reconnects = 0
+
+        self._lock = threading.Lock()
+        self._idle: List = []
+        self._statements: Dict[int, Dict] = {}  # id(raw) -> {sql: prepared handle}
+
+    def open_raw(self):
+        raw = self._connect()
+        self._statements[id(raw)] = {}
+        return raw
+
+    def discard_raw(self, raw):
+        self._statements.pop(id(raw), None)
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def statements(self, raw) -> Dict:
+        return self._statements.setdefault(id(raw), {})
+
+    def connection(self) -> 'ManagedConnection':
+        """Uzmi konekciju iz pool-a (ili otvori novu)"""
+        with self._lock:
+            raw = self._idle.pop() if self._idle else None
+        return ManagedConnection(self, raw)
+
+    @contextmanager
+    def acquire(self):
+        """with pool.acquire() as conn: ... (konekcija se vraća u pool na kraju)"""
+        conn = self.connection()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def release(self, raw):
+        """Vrati sirovu konekciju u pool (nezavršena transakcija se rollback-uje)"""
+        try:
+            if self._in_transaction(raw):
+                self._reset(raw)
+        except Exception:
+            self.discard_raw(raw)
+            return
+
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(raw)
+                return
+        self.discard_raw(raw)
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for raw in idle:
+            self.discard_raw(raw)
+
+
+class ManagedConnection:
+    """
+    Konekcija iz pool-a sa health check-om i transparentnim reconnect-om.
+
+    Sve što nije definisano ovdje (commit, rollback, autocommit, ...)
+    prosljeđuje se sirovoj konekciji.
+    """
+
+    def __init__(self, pool: ConnectionPool, raw=None):
+        object.__setattr__(self, '_pool', pool)
+        object.__setattr__(self, '_raw', raw)
+        object.__setattr__(self, '_last_check', 0.0)
+
+    # --- health check / reconnect ---
+
+    def _reconnect(self):
+        if self._raw is not None:
+            self._pool.discard_raw(self._raw)
+            self._pool.reconnects += 1
+            logging.warning(f"🔌 {self._pool.name}: konekcija izgubljena, ponovno spajanje...")
+        object.__setattr__(self, '_raw', self._pool.open_raw())
+        object.__setattr__(self, '_last_check', time.monotonic())
+
+    @property
+    def raw(self):
+        """Zdrava sirova konekcija (ping ako je neaktivna duže od intervala)"""
+        if self._raw is None:
+            self._reconnect()
+            return self._raw
+
+        now = time.monotonic()
+        if now - self._last_check > self._pool.health_check_interval:
+            # Usred transakcije se ne radi ping (reconnect bi izgubio transakciju)
+            if not self._pool._in_transaction(self._raw) and not self._pool._ping(self._raw):
+                self._reconnect()
+            object.__setattr__(self, '_last_check', now)
+        return self._raw
+
+    def ensure_alive(self):
+        """Forsiraj health check odmah"""
+        object.__setattr__(self, '_last_check', 0.0)
+        return self.raw
+
+    # --- cursor / execute ---
+
+    def cursor(self, *args, **kwargs):
+        return TimedCursor(self.raw.cursor(*args, **kwargs), self._pool.timings)
+
+    def _run(self, fn):
+        """Izvrši fn(raw); ako konekcija pukne van transakcije, spoji se ponovo i pokušaj još jednom"""
+        raw = self.raw
+        was_idle = not self._pool._in_transaction(raw)
+        try:
+            return fn(raw)
+        except self._pool.connection_errors:
+            if not was_idle:
+                raise
+            self._reconnect()
+            return fn(self._raw)
+
+    def fetchone(self, query, params=None):
+        def run(raw):
+            cursor = TimedCursor(raw.cursor(), self._pool.timings)
+            try:
+                cursor.execute(query, params)
+                return cursor.fetchone()
+            finally:
+                cursor.close()
+        return self._run(run)
+
+    def fetchall(self, query, params=None):
+        def run(raw):
+            cursor = TimedCursor(raw.cursor(), self._pool.timings)
+            try:
+                cursor.execute(query, params)
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+        return self._run(run)
+
+    def fetchone_cached(self, query, params=None):
+        """fetchone preko pripremljenog (keširanog) upita - za hot lookup-e"""
+        return self._run(lambda raw: self._pool.execute_prepared(raw, query, params, one=True))
+
+    def fetchall_cached(self, query, params=None):
+        """fetchall preko pripremljenog (keširanog) upita - za hot lookup-e"""
+        return self._run(lambda raw: self._pool.execute_prepared(raw, query, params, one=False))
+
+    # --- pool ---
+
+    def close(self):
+        """Vrati konekciju u pool"""
+        if self._raw is not None:
+            self._pool.release(self._raw)
+            object.__setattr__(self, '_raw', None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.raw, name, value)
+
+
+# ===================================================================
+# DRIVER-SPECIFIČNO
+# ===================================================================
+
+_POOLS: Dict[tuple, ConnectionPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def _mysql_execute_prepared(pool: ConnectionPool, raw, query, params, one):
+    statements = pool.statements(raw)
+    cursor = statements.get(query)
+    if cursor is None:
+        cursor = raw.cursor(prepared=True)
+        statements[query] = cursor
+    started = time.perf_counter()
+    try:
+        cursor.execute(query, params or ())
+        rows = cursor.fetchall()
+    finally:
+        pool.timings.record(QueryTimings.label(query), time.perf_counter() - started)
+    if one:
+        return rows[0] if rows else None
+    return rows
+
+
+def mysql_pool(max_idle: int = 4, health_check_interval: float = 30.0, **config) -> ConnectionPool:
+    """
+    Zajednički MySQL pool za datu konfiguraciju (mysql.connector.connect kwargs).
+    """
+    import mysql.connector
+
+    key = ('mysql', tuple(sorted(config.items())))
+    with _POOLS_LOCK:
+        if key in _POOLS:
+            return _POOLS[key]
+
+        def ping(raw):
+            try:
+                raw.ping(reconnect=False)
+                return True
+            except mysql.connector.Error:
+                return False
+
+        pool = ConnectionPool(
+            name=f"mysql:{config.get('host', 'localhost')}/{config.get('database', '')}",
+            connect=lambda: mysql.connector.connect(**config),
+            ping=ping,
+            in_transaction=lambda raw: bool(getattr(raw, 'in_transaction', False)),
+            reset=lambda raw: raw.rollback(),
+            max_idle=max_idle,
+            health_check_interval=health_check_interval,
+            connection_errors=(mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError),
+        )
+        pool.execute_prepared = lambda raw, query, params, one: _mysql_execute_prepared(pool, raw, query, params, one)
+        _POOLS[key] = pool
+        return pool
+
+
+def _pg_placeholders(query: str) -> str:
+    """%s → $1, $2, ... (za PREPARE)"""
+    counter = itertools.count(1)
+    return re.sub(r'(?<!%)%s', lambda _: f"${next(counter)}", query).replace('%%', '%')
+
+
+def _pg_execute_prepared(pool: ConnectionPool, raw, query, params, one):
+    cursor = TimedCursor(raw.cursor(), pool.timings)
+    try:
+        if not pool.prepare:
+            cursor.execute(query, params)
+        else:
+            statements = pool.statements(raw)
+            name = statements.get(query)
+            if name is None:
+                name = 'stmt_' + hashlib.md5(query.encode('utf-8')).hexdigest()[:16]
+                cursor.execute(f"PREPARE {name} AS {_pg_placeholders(query)}")
+                statements[query] = name
+            if params:
+                placeholders = ', '.join(['%s'] * len(params))
+                cursor.execute(f"EXECUTE {name} ({placeholders})", params)
+            else:
+                cursor.execute(f"EXECUTE {name}")
+        return cursor.fetchone() if one else cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def postgres_pool(dsn: Optional[str] = None, max_idle: int = 4, health_check_interval: float = 30.0,
+                  prepare: Optional[bool] = None, **config) -> ConnectionPool:
+    """
+    Zajednički Postgres pool za DSN ili psycopg2.connect kwargs.
+
+    prepare=None → automatski: isključeno za Neon pooler (-pooler u hostu).
+    """
+    import psycopg2
+    import psycopg2.extensions
+
+    key = ('postgres', dsn, tuple(sorted(config.items())))
+    with _POOLS_LOCK:
+        if key in _POOLS:
+            return _POOLS[key]
+
+        if prepare is None:
+            prepare = '-pooler' not in (dsn or '') and '-pooler' not in str(config.get('host', ''))
+
+        def connect():
+            return psycopg2.connect(dsn, **config) if dsn else psycopg2.connect(**config)
+
+        def in_transaction(raw):
+            if raw.closed:
+                return False
+            return raw.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+        def ping(raw):
+            if raw.closed:
+                return False
+            try:
+                cursor = raw.cursor()
+                cursor.execute("SELECT 1")
+                cursor.close()
+                if not raw.autocommit:
+                    raw.rollback()
+                return True
+            except psycopg2.Error:
+                return False
+
+        host = config.get('host') or (dsn.split('@')[-1].split('/')[0] if dsn else 'localhost')
+        pool = ConnectionPool(
+            name=f"postgres:{host}",
+            connect=connect,
+            ping=ping,
+            in_transaction=in_transaction,
+            reset=lambda raw: raw.rollback(),
+            max_idle=max_idle,
+            health_check_interval=health_check_interval,
+            prepare=prepare,
+            connection_errors=(psycopg2.OperationalError, psycopg2.InterfaceError),
+        )
+        pool.execute_prepared = lambda raw, query, params, one: _pg_execute_prepared(pool, raw, query, params, one)
+        _POOLS[key] = pool
+        return pool
+
+
+def all_pools() -> List[ConnectionPool]:
+    with _POOLS_LOCK:
+        return list(_POOLS.values())
+
+
+def log_timing_summary(top: int = 10):
+    """Ispiši timing za sve pool-ove (poziva se na kraju run-a)"""
+    for pool in all_pools():
+        pool.timings.log_summary(title=f"{pool.name} (reconnects: {pool.reconnects})", top=top)
+
+
+@atexit.register
+def _close_pools():
+    for pool in all_pools():
+        pool.close_all()
@@ -20,6 +20,20 @@ from datetime import datetime
 import logging
 import time
 
+from tecdoc_db import ProductCrossReferenceSync, ProductUpdateWriter
+
+# Product kolone koje update_product_in_db mijenja (jedan UPDATE ... FROM (VALUES ...) po flush-u)
+PRODUCT_UPDATE_COLUMNS = [
+    ('categoryId', 'text', 'COALESCE(v."categoryId", p."categoryId")'),
+    ('oemNumber', 'text', None),
+    ('technicalSpecs', 'jsonb', None),
+    ('tecdocArticleId', 'integer', None),
+    ('tecdocProductId', 'integer', None),
+]
+
+# Broj proizvoda po flush-u (Product UPDATE + cross refs + commit)
+PRODUCT_FLUSH_SIZE = 100
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -43,7 +57,7 @@ class ProductEnrichment:
     supplier_info: Dict
 
 class TecDocEnricher:
-    def __init__(self):
+    def __init__(self, flush_size: int = PRODUCT_FLUSH_SIZE):
         """Inicijalizacija konekcija na baze"""
         
         # TecDoc MySQL konekcija (read-only)
@@ -72,6 +86,12 @@ class TecDocEnricher:
             'errors': 0
         }
         
+        # Cross reference-i (ekvivalenti) se sinhronizuju za više proizvoda odjednom
+        self.cross_ref_sync = ProductCrossReferenceSync()
+        
+        # Product izmjene se pišu jednim UPDATE-om svakih flush_size proizvoda
+        self.product_writer = ProductUpdateWriter(PRODUCT_UPDATE_COLUMNS, flush_size=flush_size)
+        
         logging.info("✅ Database connections established")
     
     def get_products_to_enrich(self, limit: int = 50, offset: int = 0) -> List[Dict]:
@@ -472,9 +492,7 @@ class TecDocEnricher:
         )
     
     def update_product_in_db(self, product_id: str, enrichment: ProductEnrichment):
-        """Update Postgres sa obogaćenim podacima"""
-        cursor = self.prod_conn.cursor()
-        
+        """Dodaj obogaćene podatke u buffer (UPDATE + commit radi flush_pending)"""
         # Pripremi podatke
         category_id = None
         tecdoc_root_node_id = None
@@ -483,31 +501,53 @@ class TecDocEnricher:
             category_id = enrichment.category_mapping['local_category_id']
             tecdoc_root_node_id = enrichment.category_mapping['tecdoc_root_node_id']
         
-        query = """
-            UPDATE "Product"
-            SET 
-                "categoryId" = COALESCE(%s, "categoryId"),
-                "oemNumber" = %s,
-                "technicalSpecs" = %s::jsonb,
-                "tecdocArticleId" = %s,
-                "tecdocProductId" = %s,
-                "updatedAt" = NOW()
-            WHERE id = %s
+        self.product_writer.add(
+            product_id,
+            categoryId=category_id,
+            oemNumber=json.dumps(enrichment.oem_numbers) if enrichment.oem_numbers else None,
+            technicalSpecs=json.dumps(enrichment.technical_specs) if enrichment.technical_specs else None,
+            tecdocArticleId=enrichment.tecdoc_article_id,
+            tecdocProductId=tecdoc_root_node_id
+        )
+        self.cross_ref_sync.set_references(product_id, enrichment.cross_references)
+    
+    def flush_pending(self):
         """
+        Jedna transakcija: UPDATE "Product" ... FROM (VALUES ...) za buffered
+        proizvode + sinhronizacija njihovih cross reference-a, pa commit.
+        Svaki proizvod koji nije upisan broji se kao greška (po id-u).
+        """
+        products = len(self.product_writer)
+        if not products and not len(self.cross_ref_sync):
+            return
         
-        cursor.execute(query, (
-            category_id,
-            json.dumps(enrichment.oem_numbers) if enrichment.oem_numbers else None,
-            json.dumps(enrichment.technical_specs) if enrichment.technical_specs else None,
-            enrichment.tecdoc_article_id,
-            tecdoc_root_node_id,
-            product_id
-        ))
-        
-        self.prod_conn.commit()
-        cursor.close()
+        try:
+            written = self.product_writer.flush(self.prod_conn)
+            failed = dict(self.product_writer.failed)
+            for product_id in failed:
+                self.cross_ref_sync.discard_product(product_id)
+            result = self.cross_ref_sync.flush(self.prod_conn)
+            failed.update(self.cross_ref_sync.failed)
+            self.prod_conn.commit()
+        except Exception as e:
+            self.prod_conn.rollback()
+            logging.error(f"❌ Flush failed ({products} products): {e}")
+            pending = self.product_writer.product_ids() + self.cross_ref_sync.product_ids()
+            failed = {product_id: str(e) for product_id in pending}
+            failed.update(self.product_writer.failed)
+            failed.update(self.cross_ref_sync.failed)
+            result = None
+        self.product_writer.clear()
+        self.cross_ref_sync.clear()
+        
+        for product_id, error in failed.items():
+            logging.error(f"   ❌ Product {product_id} not updated: {error}")
+        self.stats['errors'] += len(failed)
+        if result is None:
+            return
         
-        logging.info(f"   💾 Updated in database")
+        logging.info(f"   💾 Updated {written}/{products} products in database ({self.product_writer.rows_per_second:.0f} rows/s)")
+        logging.info(f"   🔗 Cross refs: +{result['inserted']} / -{result['deleted']} ({result['unchanged']} unchanged)")
     
     def run_batch(self, batch_size: int = 50, start_from: int = 0):
         """Pokreni batch procesiranje"""
@@ -534,6 +574,8 @@ class TecDocEnricher:
                 
                 if enrichment:
                     self.update_product_in_db(product['id'], enrichment)
+                    if self.product_writer.is_full():
+                        self.flush_pending()
                 
                 # Progress update
                 if idx % 10 == 0:
@@ -548,6 +590,8 @@ class TecDocEnricher:
                 self.stats['errors'] += 1
                 continue
         
+        self.flush_pending()
+        
         # Final stats
         elapsed = time.time() - start_time
         logging.info(f"\n{'#'*70}")
@@ -17,6 +17,8 @@ import logging
 import re
 from collections import defaultdict
 
+from tecdoc_normalize import is_placeholder_oem, normalize_number, oem_variants
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -27,6 +29,37 @@ logging.basicConfig(
     ]
 )
 
+# Precompiled regexi (koriste se za svaki proizvod u batch-u)
+KEYWORD_RE = re.compile(r'\b[A-Z]{3,}\b')  # Words sa 3+ caps letters
+
+# Poznati product types - grupa → ključne riječi
+PRODUCT_TYPE_MAP = {
+    'FILTER': ['FILTER', 'AIR', 'OIL', 'CABIN', 'FUEL'],
+    'BRAKE': ['BRAKE', 'DISC', 'PAD', 'CALIPER'],
+    'SENSOR': ['SENSOR', 'MJERAČ', 'MJERAČ'],
+    'WIPER': ['WIPER', 'METLICA', 'BRISAČ'],
+    'OIL': ['OIL', 'ULJE'],
+    'BELT': ['BELT', 'KAIŠ']
+}
+
+# Potpuno različiti product types (npr. Filter vs Mirror)
+OPPOSITE_TYPES = [
+    ('FILTER', 'MIRROR'),
+    ('FILTER', 'WIPER'),
+    ('BRAKE', 'SENSOR'),
+    ('OIL', 'BRAKE'),
+]
+OPPOSITE_TYPE_WORDS = {word for pair in OPPOSITE_TYPES for word in pair}
+
+# Broj article ID-eva po IN (...) upitu
+ARTICLE_CHUNK_SIZE = 1000
+
+# Normalizovani OENbr (isti izraz kao functional index u tecdoc_normalized_indexes.sql)
+NORMALIZED_OENBR_SQL = "REPLACE(REPLACE(REPLACE(REPLACE(UPPER(OENbr), ' ', ''), '-', ''), '.', ''), '/', '')"
+
+# Broj OEM varijanti po IN (...) upitu
+OEM_VARIANT_CHUNK_SIZE = 500
+
 @dataclass
 class MatchResult:
     """Rezultat matchinga"""
@@ -100,6 +133,9 @@ class TecDocEnricherWithValidation:
         self.MIN_CONFIDENCE = min_confidence
         self.MIN_QUALITY_SCORE = min_quality_score
 
+        # OEM → article_id (nivo 4), puni se za cijeli batch odjednom
+        self.oem_normalized_cache: Dict[str, Optional[int]] = {}
+
         # Statistics
         self.stats = {
             'total': 0,
@@ -123,45 +159,16 @@ class TecDocEnricherWithValidation:
     # ===================================================================
 
     def should_skip_oem_matching(self, oem: str) -> bool:
-        """Provjeri da li je OEM vrijednost placeholder/invalid"""
-        if not oem:
-            return True
-
-        oem_clean = oem.strip().upper()
-        placeholder_values = ['0', 'N/A', 'NA', 'NONE', '-', '/', 'X', 'XX', 'XXX']
-
-        if oem_clean in placeholder_values:
-            return True
-        if len(oem_clean) < 3:
-            return True
-        if oem_clean.replace('0', '') == '':
-            return True
-
-        return False
+        """Provjeri da li je OEM vrijednost placeholder/invalid (vidi tecdoc_normalize.PLACEHOLDER_PATTERNS)"""
+        return is_placeholder_oem(oem)
 
     def normalize_catalog(self, catalog: str) -> str:
-        """Normalizacija kataloškog broja"""
-        if not catalog:
-            return ""
-        normalized = catalog.upper()
-        normalized = re.sub(r'[\s\-\./]', '', normalized)
-        return normalized
+        """Normalizacija kataloškog broja (uppercase, bez razmaka, -, ., /)"""
+        return normalize_number(catalog)
 
     def normalize_oem(self, oem: str) -> List[str]:
         """Normalizacija OEM broja - vraća liste varijanti"""
-        if not oem:
-            return []
-
-        normalized = oem.upper()
-        normalized = re.sub(r'[\s\-\./]', '', normalized)
-        variants = [normalized]
-
-        if normalized.startswith('A'):
-            variants.append(normalized[1:])
-        else:
-            variants.append('A' + normalized)
-
-        return list(set(variants))
+        return oem_variants(oem)
 
     # ===================================================================
     # MATCHING FUNKCIJE
@@ -222,25 +229,60 @@ class TecDocEnricherWithValidation:
         if not oem:
             return None
 
-        variants = self.normalize_oem(oem)
+        if oem not in self.oem_normalized_cache:
+            self.oem_normalized_cache.update(self.find_by_oem_normalized_bulk([oem]))
+        return self.oem_normalized_cache.get(oem)
+
+    def find_by_oem_normalized_bulk(self, oems: List[str]) -> Dict[str, Optional[int]]:
+        """
+        Normalized match za više OEM-ova odjednom.
+
+        Sve varijante svih OEM-ova idu u jedan IN upit (po chunk-u) nad
+        normalizovanim OENbr; za svaki OEM bira se pogodak sa najboljim
+        rangom varijante (0 = normalizovani OEM, 1 = sa/bez "A").
+
+        Returns:
+            {oem: article_id ili None}
+        """
+        variant_owners = defaultdict(list)  # variant → [(oem, rank)]
+        for oem in set(filter(None, oems)):
+            for rank, variant in enumerate(self.normalize_oem(oem)):
+                variant_owners[variant].append((oem, rank))
+
+        best = {}  # oem → (rank, article_id)
+        variants = list(variant_owners)
         cursor = self.tecdoc_conn.cursor()
 
-        for variant in variants:
-            query = """
-                SELECT article_id FROM article_oe_numbers
-                WHERE REPLACE(REPLACE(REPLACE(REPLACE(
-                    UPPER(OENbr),
-                    ' ', ''), '-', ''), '.', ''), '/', '') = %s
-                LIMIT 1
+        for start in range(0, len(variants), OEM_VARIANT_CHUNK_SIZE):
+            chunk = variants[start:start + OEM_VARIANT_CHUNK_SIZE]
+            placeholders = ','.join(['%s'] * len(chunk))
+            query = f"""
+                SELECT {NORMALIZED_OENBR_SQL} AS variant, MIN(article_id)
+                FROM article_oe_numbers
+                WHERE {NORMALIZED_OENBR_SQL} IN ({placeholders})
+                GROUP BY variant
             """
-            cursor.execute(query, (variant,))
-            result = cursor.fetchone()
-            if result:
-                cursor.close()
-                return result[0]
+            cursor.execute(query, chunk)
+            for variant, article_id in cursor.fetchall():
+                # MySQL collation je case/accent-insensitive - vrati se na naš ključ
+                owners = variant_owners.get(variant) or variant_owners.get(variant.upper(), [])
+                for oem, rank in owners:
+                    if oem not in best or rank < best[oem][0]:
+                        best[oem] = (rank, article_id)
 
         cursor.close()
-        return None
+
+        result = {oem: None for oem in oems if oem}
+        result.update({oem: article_id for oem, (rank, article_id) in best.items()})
+        return result
+
+    def prefetch_oem_normalized(self, products: List[Dict]):
+        """Nivo 4 za cijeli batch u jednom upitu (samo proizvodi koji još nemaju TecDoc artikal)"""
+        oems = [
+            product.get('oemNumber') for product in products
+            if not product.get('tecdocArticleId') and not self.should_skip_oem_matching(product.get('oemNumber'))
+        ]
+        self.oem_normalized_cache = self.find_by_oem_normalized_bulk(oems) if oems else {}
 
     def advanced_match(self, catalog: str, oem: str = None, ean: str = None) -> MatchResult:
         """Multi-level matching strategy SA OEM VALIDATION"""
@@ -337,6 +379,70 @@ class TecDocEnricherWithValidation:
         cursor.close()
         return oem_numbers
 
+    def get_basic_article_data_bulk(self, article_ids) -> Dict[int, Dict]:
+        """Osnovni podaci za više artikala odjednom (article_id → dict)"""
+        article_ids = list(article_ids)
+        result = {}
+        cursor = self.tecdoc_conn.cursor()
+
+        for start in range(0, len(article_ids), ARTICLE_CHUNK_SIZE):
+            chunk = article_ids[start:start + ARTICLE_CHUNK_SIZE]
+            placeholders = ','.join(['%s'] * len(chunk))
+            query = f"""
+                SELECT
+                    a.id,
+                    a.CurrentProduct as product_id,
+                    a.Supplier as supplier_id,
+                    s.Description as manufacturer,
+                    a.NormalizedDescription as product_type,
+                    a.DataSupplierArticleNumber as catalog_number
+                FROM articles a
+                LEFT JOIN suppliers s ON a.Supplier = s.id
+                WHERE a.id IN ({placeholders})
+            """
+            cursor.execute(query, chunk)
+            for row in cursor.fetchall():
+                result[row[0]] = {
+                    'article_id': row[0],
+                    'product_id': row[1],
+                    'supplier_id': row[2],
+                    'manufacturer': row[3],
+                    'product_type': row[4],
+                    'catalog_number': row[5]
+                }
+
+        cursor.close()
+        return result
+
+    def get_oem_numbers_bulk(self, article_ids) -> Dict[int, List[Dict]]:
+        """OEM brojevi za više artikala odjednom (article_id → lista, isti redoslijed kao pojedinačno)"""
+        article_ids = list(article_ids)
+        result = defaultdict(list)
+        cursor = self.tecdoc_conn.cursor()
+
+        for start in range(0, len(article_ids), ARTICLE_CHUNK_SIZE):
+            chunk = article_ids[start:start + ARTICLE_CHUNK_SIZE]
+            placeholders = ','.join(['%s'] * len(chunk))
+            query = f"""
+                SELECT DISTINCT
+                    aon.article_id,
+                    aon.OENbr as oem_number,
+                    m.Description as manufacturer
+                FROM article_oe_numbers aon
+                LEFT JOIN manufacturers m ON aon.Manufacturer = m.id
+                WHERE aon.article_id IN ({placeholders})
+                ORDER BY aon.article_id, m.Description, aon.OENbr
+            """
+            cursor.execute(query, chunk)
+            for article_id, oem, manufacturer in cursor.fetchall():
+                result[article_id].append({
+                    'oem': oem,
+                    'manufacturer': manufacturer if manufacturer else 'Unknown'
+                })
+
+        cursor.close()
+        return result
+
     # ===================================================================
     # QUALITY VALIDATION - KLJUČNA FUNKCIONALNOST!
     # ===================================================================
@@ -355,151 +461,136 @@ class TecDocEnricherWithValidation:
         3. Da li je manufacturer isti?
         4. Da li je product type sličan?
         5. Da li postoje red flags?
+
+        Za više proizvoda koristi score_batch() (isti rezultat, brže).
         """
+        return self.score_batch([(product, match_result, tecdoc_data, tecdoc_oem_numbers)])[0]
 
-        issues = []
-        warnings = []
-        checks = {}
-        score = 100
-
-        our_catalog = product.get('catalogNumber', '')
-        our_oem = product.get('oemNumber', '')
-        our_name = product.get('name', '').upper()
-
-        tecdoc_manufacturer = tecdoc_data.get('manufacturer', '')
-        tecdoc_product_type = tecdoc_data.get('product_type', '')
-        tecdoc_catalog = tecdoc_data.get('catalog_number', '')
-
-        # ---------------------------------------------------------------
-        # CHECK 1: Catalog Number Similarity
-        # ---------------------------------------------------------------
-        if match_result.method in ['catalog_exact', 'catalog_normalized']:
-            # Odlično - matchali smo preko catalog-a
-            checks['catalog_match'] = True
-        else:
-            # Matchali smo preko OEM/EAN - provjeri da li su catalogi slični
-            our_norm = self.normalize_catalog(our_catalog)
-            tecdoc_norm = self.normalize_catalog(tecdoc_catalog)
+    def score_batch(self, items: List[Tuple[Dict, MatchResult, Dict, List[Dict]]]) -> List[MatchQuality]:
+        """
+        Batch validacija kvaliteta matcheva.
 
-            if our_norm == tecdoc_norm:
+        items: lista (product, match_result, tecdoc_data, tecdoc_oem_numbers)
+
+        Svaki string (catalog, OEM, naziv, TecDoc product type) se normalizuje
+        i analizira samo jednom po batch-u, a OEM liste TecDoc artikala se
+        pretvaraju u set-ove normalizovanih brojeva → provjere su set lookup-i
+        umjesto petlji po svim OEM-ovima za svaki proizvod.
+        """
+        text_cache: Dict[str, Tuple[set, set, set]] = {}
+        oem_sets: Dict[int, set] = {}
+
+        # Memoizovano u tecdoc_normalize (LRU), dijeli se između batch-eva
+        normalize = normalize_number
+        is_placeholder = is_placeholder_oem
+
+        def text_features(text: str) -> Tuple[set, set, set]:
+            """(ključne riječi, product type grupe, riječi iz OPPOSITE_TYPES) za upper-case tekst"""
+            if text not in text_cache:
+                keywords = set(KEYWORD_RE.findall(text))
+                groups = {
+                    ptype for ptype, words in PRODUCT_TYPE_MAP.items()
+                    if any(word in text for word in words)
+                }
+                flagged = {word for word in OPPOSITE_TYPE_WORDS if word in text}
+                text_cache[text] = (keywords, groups, flagged)
+            return text_cache[text]
+
+        def tecdoc_oem_set(article_id: Optional[int], tecdoc_oem_numbers: List[Dict]) -> set:
+            if article_id is None:
+                return {normalize(oem['oem']) for oem in tecdoc_oem_numbers}
+            if article_id not in oem_sets:
+                oem_sets[article_id] = {normalize(oem['oem']) for oem in tecdoc_oem_numbers}
+            return oem_sets[article_id]
+
+        results = []
+        for product, match_result, tecdoc_data, tecdoc_oem_numbers in items:
+            issues = []
+            warnings = []
+            checks = {}
+            score = 100
+
+            our_catalog = product.get('catalogNumber', '')
+            our_oem = product.get('oemNumber', '')
+            our_name = (product.get('name') or '').upper()
+
+            tecdoc_product_type = tecdoc_data.get('product_type') or ''
+            tecdoc_type_upper = tecdoc_product_type.upper()
+            tecdoc_catalog = tecdoc_data.get('catalog_number', '')
+
+            oem_placeholder = is_placeholder(our_oem)
+
+            # CHECK 1: Catalog Number Similarity
+            if match_result.method in ['catalog_exact', 'catalog_normalized']:
+                checks['catalog_match'] = True
+            elif normalize(our_catalog) == normalize(tecdoc_catalog):
                 checks['catalog_match'] = True
             else:
                 checks['catalog_match'] = False
                 warnings.append(f"Catalog brojevi različiti: '{our_catalog}' vs '{tecdoc_catalog}'")
                 score -= 10
 
-        # ---------------------------------------------------------------
-        # CHECK 2: OEM Number Overlap
-        # ---------------------------------------------------------------
-        if not self.should_skip_oem_matching(our_oem) and tecdoc_oem_numbers:
-            # Provjeri da li naš OEM postoji u TecDoc OEM listi
-            our_oem_normalized = self.normalize_catalog(our_oem)
-            found_oem = False
-
-            for tecdoc_oem in tecdoc_oem_numbers:
-                tecdoc_oem_normalized = self.normalize_catalog(tecdoc_oem['oem'])
-                if our_oem_normalized == tecdoc_oem_normalized:
-                    found_oem = True
+            # CHECK 2: OEM Number Overlap
+            if not oem_placeholder and tecdoc_oem_numbers:
+                if normalize(our_oem) in tecdoc_oem_set(match_result.article_id, tecdoc_oem_numbers):
                     checks['oem_overlap'] = True
-                    break
-
-            if not found_oem:
-                checks['oem_overlap'] = False
-
-                # Ako smo matchali preko OEM-a ali ga nema u listi - PROBLEM!
-                if match_result.method in ['oem_exact', 'oem_normalized']:
-                    issues.append(f"⚠️ CRITICAL: Matched preko OEM '{our_oem}', ali nije u TecDoc OEM listi!")
-                    score -= 50  # Major red flag
                 else:
-                    warnings.append(f"OEM '{our_oem}' nije pronađen u TecDoc OEM listi ({len(tecdoc_oem_numbers)} OEM-ova)")
-                    score -= 15
-        elif not tecdoc_oem_numbers:
-            checks['oem_overlap'] = None
-            warnings.append("TecDoc artikal nema OEM brojeve")
-            score -= 5
-        else:
-            checks['oem_overlap'] = None  # Naš OEM je placeholder, ne možemo provjeriti
-
-        # ---------------------------------------------------------------
-        # CHECK 3: Product Type/Name Similarity
-        # ---------------------------------------------------------------
-        # Ekstraktuj ključne riječi iz našeg imena
-        our_keywords = set(re.findall(r'\b[A-Z]{3,}\b', our_name))  # Words sa 3+ caps letters
-        tecdoc_keywords = set(re.findall(r'\b[A-Z]{3,}\b', tecdoc_product_type.upper()))
-
-        # Posebni slučajevi - poznati product types
-        product_type_map = {
-            'FILTER': ['FILTER', 'AIR', 'OIL', 'CABIN', 'FUEL'],
-            'BRAKE': ['BRAKE', 'DISC', 'PAD', 'CALIPER'],
-            'SENSOR': ['SENSOR', 'MJERAČ', 'MJERAČ'],
-            'WIPER': ['WIPER', 'METLICA', 'BRISAČ'],
-            'OIL': ['OIL', 'ULJE'],
-            'BELT': ['BELT', 'KAIŠ']
-        }
+                    checks['oem_overlap'] = False
+
+                    # Ako smo matchali preko OEM-a ali ga nema u listi - PROBLEM!
+                    if match_result.method in ['oem_exact', 'oem_normalized']:
+                        issues.append(f"⚠️ CRITICAL: Matched preko OEM '{our_oem}', ali nije u TecDoc OEM listi!")
+                        score -= 50  # Major red flag
+                    else:
+                        warnings.append(f"OEM '{our_oem}' nije pronađen u TecDoc OEM listi ({len(tecdoc_oem_numbers)} OEM-ova)")
+                        score -= 15
+            elif not tecdoc_oem_numbers:
+                checks['oem_overlap'] = None
+                warnings.append("TecDoc artikal nema OEM brojeve")
+                score -= 5
+            else:
+                checks['oem_overlap'] = None  # Naš OEM je placeholder, ne možemo provjeriti
 
-        type_match = False
-        for ptype, keywords in product_type_map.items():
-            if any(kw in our_name for kw in keywords):
-                if any(kw in tecdoc_product_type.upper() for kw in keywords):
-                    type_match = True
-                    break
+            # CHECK 3: Product Type/Name Similarity
+            our_keywords, our_groups, our_flagged = text_features(our_name)
+            tecdoc_keywords, tecdoc_groups, tecdoc_flagged = text_features(tecdoc_type_upper)
 
-        if type_match:
-            checks['product_type_match'] = True
-        else:
-            # Fallback: provjeri keyword overlap
-            common_keywords = our_keywords & tecdoc_keywords
-            if len(common_keywords) >= 1:
+            if our_groups & tecdoc_groups or our_keywords & tecdoc_keywords:
                 checks['product_type_match'] = True
             else:
                 checks['product_type_match'] = False
                 warnings.append(f"Product type možda ne odgovara: '{our_name[:30]}' vs '{tecdoc_product_type}'")
                 score -= 20
 
-        # ---------------------------------------------------------------
-        # CHECK 4: Red Flags (potpuno pogrešni matchevi)
-        # ---------------------------------------------------------------
-
-        # Red Flag 1: Matchali smo SAMO preko placeholder OEM-a
-        if match_result.method in ['oem_exact', 'oem_normalized']:
-            if self.should_skip_oem_matching(our_oem):
-                issues.append("🚨 CRITICAL: Matched preko placeholder OEM-a! (BUG)")
-                score = 0  # Instant fail
-                checks['no_placeholder_match'] = False
-            else:
-                checks['no_placeholder_match'] = True
-
-        # Red Flag 2: Potpuno različiti product types (npr. Filter vs Mirror)
-        opposite_types = [
-            ('FILTER', 'MIRROR'),
-            ('FILTER', 'WIPER'),
-            ('BRAKE', 'SENSOR'),
-            ('OIL', 'BRAKE'),
-        ]
-
-        for type1, type2 in opposite_types:
-            if type1 in our_name and type2 in tecdoc_product_type.upper():
-                issues.append(f"🚨 MISMATCH: '{our_name[:30]}' vs '{tecdoc_product_type}'")
-                score -= 40
-                break
-            if type2 in our_name and type1 in tecdoc_product_type.upper():
-                issues.append(f"🚨 MISMATCH: '{our_name[:30]}' vs '{tecdoc_product_type}'")
-                score -= 40
-                break
-
-        # ---------------------------------------------------------------
-        # Final Score & Validity
-        # ---------------------------------------------------------------
-        score = max(0, min(100, score))  # Clamp 0-100
-        is_valid = score >= self.MIN_QUALITY_SCORE and len(issues) == 0
-
-        return MatchQuality(
-            is_valid=is_valid,
-            score=score,
-            issues=issues,
-            warnings=warnings,
-            checks=checks
-        )
+            # CHECK 4: Red Flags
+            # Red Flag 1: Matchali smo SAMO preko placeholder OEM-a
+            if match_result.method in ['oem_exact', 'oem_normalized']:
+                if oem_placeholder:
+                    issues.append("🚨 CRITICAL: Matched preko placeholder OEM-a! (BUG)")
+                    score = 0  # Instant fail
+                    checks['no_placeholder_match'] = False
+                else:
+                    checks['no_placeholder_match'] = True
+
+            # Red Flag 2: Potpuno različiti product types
+            if our_flagged and tecdoc_flagged:
+                for type1, type2 in OPPOSITE_TYPES:
+                    if (type1 in our_flagged and type2 in tecdoc_flagged) or \
+                            (type2 in our_flagged and type1 in tecdoc_flagged):
+                        issues.append(f"🚨 MISMATCH: '{our_name[:30]}' vs '{tecdoc_product_type}'")
+                        score -= 40
+                        break
+
+            score = max(0, min(100, score))  # Clamp 0-100
+            results.append(MatchQuality(
+                is_valid=score >= self.MIN_QUALITY_SCORE and len(issues) == 0,
+                score=score,
+                issues=issues,
+                warnings=warnings,
+                checks=checks
+            ))
+
+        return results
 
     # ===================================================================
     # VALIDATION REPORT GENERATION
@@ -509,13 +600,70 @@ class TecDocEnricherWithValidation:
         """
         Kreira kompletni validation report za jedan proizvod
         """
+        # Pokušaj matching
+        match_result = self.advanced_match(product['catalogNumber'], product.get('oemNumber', ''),
+                                           product.get('eanCode', ''))
+
+        if not match_result.article_id:
+            return self.build_validation_report(product, match_result)
+
+        # Pronađen match - izvuci TecDoc podatke
+        tecdoc_data = self.get_basic_article_data(match_result.article_id)
+        tecdoc_oem_numbers = self.get_oem_numbers_with_manufacturers(match_result.article_id)
+
+        # Validiraj kvalitet matcha
+        quality = self.validate_match_quality(product, match_result, tecdoc_data, tecdoc_oem_numbers)
+
+        return self.build_validation_report(product, match_result, tecdoc_data, tecdoc_oem_numbers, quality)
+
+    def create_validation_reports(self, products: List[Dict]) -> List[ValidationReport]:
+        """
+        Batch verzija create_validation_report:
+        matching po proizvodu, zatim TecDoc podaci za sve matcheve u
+        par IN upita i score_batch() za cijeli batch.
+        """
+        self.prefetch_oem_normalized(products)
+
+        matches = [
+            self.advanced_match(product['catalogNumber'], product.get('oemNumber', ''),
+                                product.get('eanCode', ''))
+            for product in products
+        ]
+
+        article_ids = {match.article_id for match in matches if match.article_id}
+        article_data = self.get_basic_article_data_bulk(article_ids)
+        article_oems = self.get_oem_numbers_bulk(article_ids)
+
+        matched = [
+            (product, match, article_data.get(match.article_id, {}), article_oems.get(match.article_id, []))
+            for product, match in zip(products, matches)
+            if match.article_id
+        ]
+        qualities = iter(self.score_batch(matched))
+        matched_items = iter(matched)
+
+        reports = []
+        for product, match in zip(products, matches):
+            if not match.article_id:
+                reports.append(self.build_validation_report(product, match))
+                continue
+            _, _, tecdoc_data, tecdoc_oem_numbers = next(matched_items)
+            reports.append(self.build_validation_report(
+                product, match, tecdoc_data, tecdoc_oem_numbers, next(qualities)
+            ))
+
+        return reports
+
+    def build_validation_report(self,
+                                product: Dict,
+                                match_result: MatchResult,
+                                tecdoc_data: Optional[Dict] = None,
+                                tecdoc_oem_numbers: Optional[List[Dict]] = None,
+                                quality: Optional[MatchQuality] = None) -> ValidationReport:
+        """ValidationReport iz rezultata matchinga i validacije"""
         product_id = product['id']
         catalog = product['catalogNumber']
         oem = product.get('oemNumber', '')
-        ean = product.get('eanCode', '')
-
-        # Pokušaj matching
-        match_result = self.advanced_match(catalog, oem, ean)
 
         if not match_result.article_id:
             # Nije pronađen match
@@ -540,13 +688,6 @@ class TecDocEnricherWithValidation:
                 reason='NOT_FOUND'
             )
 
-        # Pronađen match - izvuci TecDoc podatke
-        tecdoc_data = self.get_basic_article_data(match_result.article_id)
-        tecdoc_oem_numbers = self.get_oem_numbers_with_manufacturers(match_result.article_id)
-
-        # Validiraj kvalitet matcha
-        quality = self.validate_match_quality(product, match_result, tecdoc_data, tecdoc_oem_numbers)
-
         # Odluka: da li update-ovati?
         should_update = False
         reason = ""
@@ -625,14 +766,14 @@ class TecDocEnricherWithValidation:
         logging.info(f"Products to validate: {len(products)}")
         logging.info(f"=" * 80)
 
-        # Validate each product
-        for i, product in enumerate(products, 1):
+        # Matching + batch validacija kvaliteta za sve proizvode
+        reports = self.create_validation_reports(products)
+
+        for i, (product, report) in enumerate(zip(products, reports), 1):
             self.stats['total'] += 1
 
             logging.info(f"\n[{i}/{len(products)}] Validating: {product['catalogNumber']}")
 
-            # Create validation report
-            report = self.create_validation_report(product)
             self.validation_reports.append(report)
 
             # Update stats
@@ -745,12 +886,16 @@ class TecDocEnricherWithValidation:
                 'Issues', 'Warnings'
             ])
 
-            # Get SKUs
+            # Get SKUs (jedan upit za sve reporte)
             cursor = self.postgres_conn.cursor()
+            cursor.execute(
+                'SELECT id, sku FROM "Product" WHERE id = ANY(%s)',
+                ([report.product_id for report in self.validation_reports],)
+            )
+            skus = dict(cursor.fetchall())
+
             for report in self.validation_reports:
-                cursor.execute('SELECT sku FROM "Product" WHERE id = %s', (report.product_id,))
-                sku_row = cursor.fetchone()
-                sku = sku_row[0] if sku_row else ''
+                sku = skus.get(report.product_id) or ''
 
                 writer.writerow([
                     sku,
@@ -5,6 +5,7 @@ Script za linkovanje slika iz TecDoc baze sa proizvodima u PostgreSQL bazi.
 Korištenje:
     python3 tecdoc_image_linker.py --test              # Test sa jednim proizvodom
     python3 tecdoc_image_linker.py --all               # Import svih slika
+    python3 tecdoc_image_linker.py --all --batch-size 1000  # Veći batch (manje MySQL upita)
     python3 tecdoc_image_linker.py --article-id 123456 # Test sa specifičnim article ID
 """
 
@@ -12,12 +13,16 @@ import os
 import sys
 import mysql.connector
 import psycopg2
+from psycopg2.extras import execute_values
 import argparse
 from pathlib import Path
-from typing import Optional, List, Tuple
+from typing import Dict, Iterator, Optional, List, Tuple
 import logging
 from dotenv import load_dotenv
 
+from tecdoc_db import chunked, log_timing_summary, mysql_pool, postgres_pool
+from tecdoc_metrics import add_metrics_argument, metrics
+
 # Load environment variables
 load_dotenv()
 
@@ -40,9 +45,15 @@ MYSQL_CONFIG = {
     'host': 'localhost',
     'user': 'root',
     'password': os.environ.get('MYSQL_PASSWORD', ''),  # Postavite u .env ako trebate
-    'database': 'tecdoc1q2019'
+    'database': 'tecdoc1q2019',
+    # Bez autocommit-a konekcija ostaje "u transakciji" nakon prvog SELECT-a,
+    # pa pool preskače health check i reconnect
+    'autocommit': True
 }
 
+# Proizvoda po stranici (keyset paginacija u get_products_with_tecdoc_id)
+PRODUCT_PAGE_SIZE = 2000
+
 # PostgreSQL konfiguracija - koristi .env DATABASE_URL
 PG_CONNECTION_STRING = os.environ.get(
     'DATABASE_URL',
@@ -56,12 +67,13 @@ class TecDocImageLinker:
     def __init__(self):
         self.mysql_conn = None
         self.pg_conn = None
-        self.images_cache = {}  # Cache za pronađene slike
+        self.images_cache = {}  # Cache za pronađene slike: supplier_id -> {PictureName: putanja}
 
     def connect_mysql(self):
         """Spojite se na MySQL bazu."""
         try:
-            self.mysql_conn = mysql.connector.connect(**MYSQL_CONFIG)
+            self.mysql_conn = mysql_pool(**MYSQL_CONFIG).connection()
+            self.mysql_conn.ensure_alive()
             logger.info("✓ Spojena MySQL baza")
         except mysql.connector.Error as e:
             logger.error(f"✗ Greška pri spajanju MySQL: {e}")
@@ -70,7 +82,8 @@ class TecDocImageLinker:
     def connect_postgres(self):
         """Spojite se na PostgreSQL bazu."""
         try:
-            self.pg_conn = psycopg2.connect(PG_CONNECTION_STRING)
+            self.pg_conn = postgres_pool(PG_CONNECTION_STRING).connection()
+            self.pg_conn.ensure_alive()
             logger.info("✓ Spojena PostgreSQL baza")
             logger.debug(f"  Baza: {self.pg_conn.get_dsn_parameters().get('dbname')}")
         except psycopg2.Error as e:
@@ -78,6 +91,7 @@ class TecDocImageLinker:
             logger.error(f"  Connection string: {PG_CONNECTION_STRING[:50]}...")
             raise
 
+    @metrics.timed('db')
     def get_images_for_article(self, article_id: int) -> List[Tuple[int, str, str]]:
         """Pronađi sve slike za jedan artikal iz MySQL baze.
 
@@ -99,6 +113,7 @@ class TecDocImageLinker:
         cursor.close()
         return results
 
+    @metrics.timed('db')
     def get_article_supplier(self, article_id: int) -> Optional[int]:
         """Pronađi Supplier ID za artikal.
 
@@ -116,6 +131,89 @@ class TecDocImageLinker:
 
         return result[0] if result else None
 
+    @metrics.timed('db')
+    def get_images_for_articles(self, article_ids: List[int]) -> Dict[int, List[str]]:
+        """Pronađi slike za cijeli batch artikala jednim IN (...) upitom.
+
+        Args:
+            article_ids: Lista ID-eva artikala iz TecDoc baze
+
+        Returns:
+            Dict article_id -> lista PictureName (redoslijed kao u bazi)
+        """
+        if not article_ids:
+            return {}
+
+        cursor = self.mysql_conn.cursor()
+        placeholders = ','.join(['%s'] * len(article_ids))
+        query = f"""
+            SELECT article_id, PictureName
+            FROM article_mediainformation
+            WHERE article_id IN ({placeholders}) AND DocumentType = 'Picture'
+            AND PictureName IS NOT NULL AND PictureName != ''
+        """
+        cursor.execute(query, tuple(article_ids))
+
+        images: Dict[int, List[str]] = {}
+        for article_id, picture_name in cursor.fetchall():
+            images.setdefault(article_id, []).append(picture_name)
+        cursor.close()
+        return images
+
+    @metrics.timed('db')
+    def get_suppliers_for_articles(self, article_ids: List[int]) -> Dict[int, int]:
+        """Pronađi Supplier ID za cijeli batch artikala jednim IN (...) upitom.
+
+        Args:
+            article_ids: Lista ID-eva artikala
+
+        Returns:
+            Dict article_id -> Supplier ID
+        """
+        if not article_ids:
+            return {}
+
+        cursor = self.mysql_conn.cursor()
+        placeholders = ','.join(['%s'] * len(article_ids))
+        query = f"SELECT id, Supplier FROM articles WHERE id IN ({placeholders})"
+        cursor.execute(query, tuple(article_ids))
+        suppliers = {article_id: supplier for article_id, supplier in cursor.fetchall() if supplier}
+        cursor.close()
+        return suppliers
+
+    @metrics.timed('fs')
+    def get_supplier_index(self, supplier_id: int) -> Dict[str, str]:
+        """Vrati index slika za jednog dobavljača (PictureName -> putanja).
+
+        Supplier folder se skenira samo jednom, nakon toga su sve pretrage
+        dict lookup-i. Ako ista slika postoji na više mjesta, prednost ima
+        očekivana putanja /Supplier/PictureNameFirst2Chars/PictureName.
+
+        Args:
+            supplier_id: ID dobavljača
+
+        Returns:
+            Dict PictureName -> apsolutna putanja
+        """
+        if supplier_id in self.images_cache:
+            return self.images_cache[supplier_id]
+
+        index: Dict[str, str] = {}
+        supplier_path = os.path.join(TECDOC_IMAGES_PATH, str(supplier_id))
+        if os.path.exists(supplier_path):
+            for root, dirs, files in os.walk(supplier_path):
+                expected_dir = os.path.relpath(root, supplier_path)
+                for picture_name in files:
+                    if picture_name not in index or expected_dir == picture_name[:2]:
+                        index[picture_name] = os.path.join(root, picture_name)
+            logger.debug(f"  ✓ Indeksiran supplier {supplier_id}: {len(index)} slika")
+        else:
+            logger.debug(f"  ✗ Supplier folder ne postoji: {supplier_path}")
+
+        self.images_cache[supplier_id] = index
+        return index
+
+    @metrics.timed('fs')
     def find_image_file(self, supplier_id: int, picture_name: str) -> Optional[str]:
         """Pronađi sliku na file sistemu.
 
@@ -154,29 +252,58 @@ class TecDocImageLinker:
         logger.debug(f"  ✗ Slika ne postoji: {picture_name}")
         return None
 
-    def get_products_with_tecdoc_id(self, limit: Optional[int] = None) -> List[Tuple]:
-        """Pronađi proizvode sa tecdocArticleId u PostgreSQL bazi.
+    @metrics.timed('db')
+    def count_products_with_tecdoc_id(self) -> int:
+        """Prebroji proizvode sa tecdocArticleId (za progress)."""
+        cursor = self.pg_conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM "Product" WHERE "tecdocArticleId" IS NOT NULL')
+        total = cursor.fetchone()[0]
+        cursor.close()
+        return total
+
+    def get_products_with_tecdoc_id(self, limit: Optional[int] = None) -> Iterator[Tuple]:
+        """Streamaj proizvode sa tecdocArticleId iz PostgreSQL baze.
+
+        Keyset paginacija po id-u (WHERE id > zadnji ORDER BY id LIMIT n):
+        svaka stranica je zaseban kratki upit, pa radi i preko Neon pooler-a
+        (PgBouncer transaction mode, gdje server-side cursor ne preživi
+        commit između batch-eva), a cijela lista se nikad ne drži u memoriji.
 
         Args:
             limit: Maksimalni broj proizvoda (za testiranje)
 
         Returns:
-            Lista tuple-a: (product_id, tecdocArticleId, name)
+            Generator tuple-a: (product_id, tecdocArticleId, name)
         """
-        cursor = self.pg_conn.cursor()
         query = """
             SELECT id, "tecdocArticleId", name
             FROM "Product"
             WHERE "tecdocArticleId" IS NOT NULL
+              AND id > %s
+            ORDER BY id
+            LIMIT %s
         """
-        if limit:
-            query += f" LIMIT {limit}"
-
-        cursor.execute(query)
-        results = cursor.fetchall()
-        cursor.close()
-        return results
+        last_id = ''
+        remaining = limit
+        while remaining is None or remaining > 0:
+            page_size = PRODUCT_PAGE_SIZE if remaining is None else min(PRODUCT_PAGE_SIZE, remaining)
+            cursor = self.pg_conn.cursor()
+            try:
+                cursor.execute(query, (last_id, page_size))
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+            if not rows:
+                return
+            for row in rows:
+                yield tuple(row)
+            last_id = rows[-1][0]
+            if remaining is not None:
+                remaining -= len(rows)
+            if len(rows) < page_size:
+                return
 
+    @metrics.timed('write')
     def update_product_image(self, product_id: str, image_url: str) -> bool:
         """Ažuriraj produktni imageUrl u PostgreSQL bazi.
 
@@ -199,6 +326,41 @@ class TecDocImageLinker:
             self.pg_conn.rollback()
             return False
 
+    @metrics.timed('write')
+    def update_product_images_bulk(self, updates: List[Tuple[str, str]]) -> int:
+        """Ažuriraj imageUrl za više proizvoda jednim UPDATE ... FROM (VALUES ...).
+
+        Args:
+            updates: Lista tuple-a (product_id, image_url)
+
+        Returns:
+            Broj ažuriranih proizvoda
+        """
+        if not updates:
+            return 0
+
+        try:
+            cursor = self.pg_conn.cursor()
+            execute_values(
+                cursor,
+                """
+                UPDATE "Product" AS p
+                SET "imageUrl" = v.image_url
+                FROM (VALUES %s) AS v(id, image_url)
+                WHERE p.id = v.id
+                """,
+                updates,
+                page_size=len(updates)
+            )
+            updated = cursor.rowcount
+            self.pg_conn.commit()
+            cursor.close()
+            return updated
+        except psycopg2.Error as e:
+            logger.error(f"✗ Greška pri bulk ažuriranju: {e}")
+            self.pg_conn.rollback()
+            return 0
+
     def test_single_product(self, product_id: Optional[str] = None, article_id: Optional[int] = None):
         """Testiraj linkovanje za jedan proizvod.
 
@@ -236,11 +398,11 @@ class TecDocImageLinker:
                 product_id, tecdoc_article_id, product_name = result
         else:
             # Uzmi prvi proizvod
-            products = self.get_products_with_tecdoc_id(limit=1)
-            if not products:
+            product = next(self.get_products_with_tecdoc_id(limit=1), None)
+            if not product:
                 logger.error("✗ Nema proizvoda sa tecdocArticleId")
                 return
-            product_id, tecdoc_article_id, product_name = products[0]
+            product_id, tecdoc_article_id, product_name = product
 
         logger.info(f"\nProizvod: {product_name}")
         logger.info(f"  PostgreSQL ID: {product_id}")
@@ -286,61 +448,78 @@ class TecDocImageLinker:
         else:
             logger.warning("✗ Nisu pronađene fizičke datoteke")
 
-    def process_all_products(self, batch_size: int = 100):
-        """Procesiraj sve proizvode i linkuj slike.
+    @metrics.timed('batch')
+    def process_batch(self, products: List[Tuple]) -> int:
+        """Linkuj slike za jedan batch proizvoda.
 
-        Args:
-            batch_size: Koliko proizvoda obraditi po batch-u
-        """
-        import json
+        MySQL se pita dva puta po batch-u (slike + supplieri), fajlovi se
+        traže kroz supplier index, a svi imageUrl-ovi se upisuju jednim
+        bulk UPDATE-om.
 
-        logger.info("\n" + "="*60)
-        logger.info("PROCESSING: Sve proizvode sa slikama")
-        logger.info("="*60)
+        Args:
+            products: Lista tuple-a (product_id, tecdocArticleId, name)
 
-        # Pronađi sve proizvode
-        products = self.get_products_with_tecdoc_id()
-        logger.info(f"\n✓ Pronađeno proizvoda: {len(products)}")
+        Returns:
+            Broj ažuriranih proizvoda
+        """
+        article_ids = list({tecdoc_article_id for _, tecdoc_article_id, _ in products})
 
-        updated_count = 0
-        for i, (product_id, tecdoc_article_id, product_name) in enumerate(products, 1):
-            if i % batch_size == 0:
-                logger.info(f"  Obrađeno: {i}/{len(products)}")
+        images_by_article = self.get_images_for_articles(article_ids)
+        suppliers = self.get_suppliers_for_articles(list(images_by_article.keys()))
 
-            # Pronađi slike
-            images = self.get_images_for_article(tecdoc_article_id)
-            if not images:
+        updates = []
+        for product_id, tecdoc_article_id, product_name in products:
+            pictures = images_by_article.get(tecdoc_article_id)
+            supplier_id = suppliers.get(tecdoc_article_id)
+            if not pictures or not supplier_id:
                 continue
 
-            # Pronađi Supplier
-            supplier_id = self.get_article_supplier(tecdoc_article_id)
-            if not supplier_id:
-                continue
+            index = self.get_supplier_index(supplier_id)
 
-            # Pronađi sve fizičke datoteke (ne samo prvu!)
-            found_urls = []
-            for article_id, picture_name, doc_type in images:
-                image_path = self.find_image_file(supplier_id, picture_name)
+            # Spremi samo prvu pronađenu sliku kao imageUrl (za Next.js Image komponentu)
+            for picture_name in pictures:
+                image_path = index.get(picture_name)
                 if image_path:
-                    # Kreiraj relativnu putanju
                     relative_path = image_path.replace(TECDOC_IMAGES_PATH + "/", "")
-                    image_url = f"/images/tecdoc/{relative_path}"
-                    found_urls.append(image_url)
+                    updates.append((product_id, f"/images/tecdoc/{relative_path}"))
+                    break
+
+        return self.update_product_images_bulk(updates)
+
+    def process_all_products(self, batch_size: int = 100):
+        """Procesiraj sve proizvode i linkuj slike.
 
-            # Ako je pronađeno slike, spremi prvu kao imageUrl i sve kao JSON
-            if found_urls:
-                # Spremi samo prvu sliku kao imageUrl (za Next.js Image komponentu)
-                if self.update_product_image(product_id, found_urls[0]):
-                    updated_count += 1
+        Args:
+            batch_size: Koliko proizvoda obraditi po batch-u
+        """
+        logger.info("\n" + "="*60)
+        logger.info("PROCESSING: Sve proizvode sa slikama")
+        logger.info("="*60)
 
-        logger.info(f"\n✓ Ažurirano proizvoda: {updated_count}/{len(products)}")
+        # Pronađi sve proizvode (streaming, batch po batch)
+        total = self.count_products_with_tecdoc_id()
+        logger.info(f"\n✓ Pronađeno proizvoda: {total}")
 
-    def close(self):
-        """Zatvori sve konekcije."""
+        processed = 0
+        updated_count = 0
+        for batch in chunked(self.get_products_with_tecdoc_id(), batch_size):
+            updated = self.process_batch(batch)
+            updated_count += updated
+            processed += len(batch)
+            metrics.count('products.processed', len(batch))
+            metrics.count('products.image_linked', updated)
+            logger.info(f"  Obrađeno: {processed}/{total} (ažurirano: {updated_count})")
+
+        logger.info(f"\n✓ Ažurirano proizvoda: {updated_count}/{total}")
+
+    def close(self, metrics_out: Optional[str] = None):
+        """Zatvori sve konekcije i ispiši timing (metrike u metrics_out)."""
         if self.mysql_conn:
             self.mysql_conn.close()
         if self.pg_conn:
             self.pg_conn.close()
+        log_timing_summary()
+        metrics.finish(metrics_out)
 
 
 def main():
@@ -366,6 +545,13 @@ def main():
         action='store_true',
         help='Procesiraj sve proizvode'
     )
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=500,
+        help='Broj proizvoda po batch-u za --all (default: 500)'
+    )
+    add_metrics_argument(parser)
 
     args = parser.parse_args()
 
@@ -381,7 +567,7 @@ def main():
         if args.test or (not args.all and not args.article_id and not args.product_id):
             linker.test_single_product(product_id=args.product_id, article_id=args.article_id)
         elif args.all:
-            linker.process_all_products()
+            linker.process_all_products(batch_size=args.batch_size)
         else:
             linker.test_single_product(product_id=args.product_id, article_id=args.article_id)
 
@@ -391,7 +577,7 @@ def main():
         traceback.print_exc()
         sys.exit(1)
     finally:
-        linker.close()
+        linker.close(metrics_out=args.metrics_out)
 
 
 if __name__ == '__main__':
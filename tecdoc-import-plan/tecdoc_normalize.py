@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Zajednička normalizacija kataloških/OEM brojeva
+===============================================
+
+Enrichment skripte (tecdoc_advanced_enrichment.py,
+tecdoc_enrichment_with_validation.py) zovu normalizaciju više puta po
+proizvodu. Umjesto re.sub + lista placeholder-a u svakom pozivu:
+
+  - normalizacija ide preko unaprijed izgrađenih translate tabela
+    (isti rezultat kao re.sub(r'[\\s\\-\\./]', '', value.upper())); ASCII
+    vrijednosti (skoro sve) idu kroz bytes.translate, ~2x brže od regex-a
+  - rezultati su memoizovani (LRU cache) - isti OEM/katalog se ponavlja
+    kroz OEM listu, cross reference-e i validaciju
+  - placeholder detektor koristi frozenset izgrađen iz PLACEHOLDER_PATTERNS
+    (iste vrijednosti koje broji analyze_oem_data_quality.py)
+
+Korištenje:
+    from tecdoc_normalize import normalize_number, oem_variants, is_placeholder_oem
+
+    normalize_number("A 004-094.24/04")   # "A0040942404"
+    oem_variants("A 004 094 24 04")       # ["A0040942404", "0040942404"]
+    is_placeholder_oem("N/A")             # True
+
+Benchmark:
+    python3 tecdoc_normalize.py --benchmark
+"""
+
+import argparse
+import random
+import re
+import string
+import sys
+import time
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+NORMALIZE_CACHE_SIZE = 65536
+
+# Sve što regex \s hvata (Unicode whitespace) + '-', '.', '/'
+_STRIP_CHARS = ''.join(chr(cp) for cp in range(0x3001) if chr(cp).isspace()) + '-./'
+NORMALIZE_TABLE = str.maketrans('', '', _STRIP_CHARS)
+_ASCII_STRIP_BYTES = bytes(ord(c) for c in _STRIP_CHARS if ord(c) < 128)
+
+# Placeholder OEM vrijednosti (vrijednost, opis) - koristi ih i analyze_oem_data_quality.py
+PLACEHOLDER_PATTERNS = [
+    ('0', "Single zero"),
+    ('00', "Double zero"),
+    ('000', "Triple zero"),
+    ('N/A', "N/A"),
+    ('NA', "NA"),
+    ('NONE', "NONE"),
+    ('-', "Dash"),
+    ('/', "Slash"),
+    ('X', "X"),
+    ('XX', "XX"),
+    ('XXX', "XXX"),
+]
+PLACEHOLDER_VALUES = frozenset(value for value, _ in PLACEHOLDER_PATTERNS)
+
+# Kraći OEM nije validan
+MIN_OEM_LENGTH = 3
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def _normalize(value: str) -> str:
+    value = value.upper()
+    if value.isascii():
+        return value.encode('ascii').translate(None, _ASCII_STRIP_BYTES).decode('ascii')
+    return value.translate(NORMALIZE_TABLE)
+
+
+def normalize_number(value: Optional[str]) -> str:
+    """Uppercase + bez razmaka, crtica, tačaka i kosih crta"""
+    if not value:
+        return ""
+    return _normalize(value)
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def _oem_variants(value: str) -> Tuple[str, ...]:
+    normalized = _normalize(value)
+
+    # Varijante sa/bez početnog "A" (redoslijed = rang varijante)
+    if normalized.startswith('A'):
+        variants = (normalized, normalized[1:])
+    else:
+        variants = (normalized, 'A' + normalized)
+    return tuple(dict.fromkeys(variants))
+
+
+def oem_variants(value: Optional[str]) -> List[str]:
+    """
+    Normalizovani OEM + varijanta sa/bez "A" prefiksa
+
+    Primjer:
+    "A 004 094 24 04" → ["A0040942404", "0040942404"]
+    """
+    if not value:
+        return []
+    return list(_oem_variants(value))
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def _is_placeholder(value: str) -> bool:
+    oem_clean = value.strip().upper()
+    return (
+        oem_clean in PLACEHOLDER_VALUES
+        or len(oem_clean) < MIN_OEM_LENGTH
+        or not oem_clean.strip('0')  # Sve nule (0, 00, 0000, ...)
+    )
+
+
+def is_placeholder_oem(oem: Optional[str]) -> bool:
+    """
+    Provjeri da li je OEM vrijednost placeholder/invalid
+
+    Skipuje:
+    - Prazne vrijednosti
+    - Placeholder vrijednosti kao "0", "N/A", "NONE"
+    - Veoma kratke vrijednosti (< 3 karaktera)
+    - Samo nule
+    """
+    if not oem:
+        return True
+    return _is_placeholder(oem)
+
+
+def cache_info() -> dict:
+    """LRU statistika (hits/misses) za logovanje na kraju run-a"""
+    return {
+        'normalize': _normalize.cache_info(),
+        'oem_variants': _oem_variants.cache_info(),
+        'placeholder': _is_placeholder.cache_info(),
+    }
+
+
+# ===================================================================
+# BENCHMARK
+# ===================================================================
+
+_LEGACY_RE = re.compile(r'[\s\-\./]')
+
+
+def _legacy_normalize(value: str) -> str:
+    return _LEGACY_RE.sub('', value.upper())
+
+
+def _sample_numbers(count: int, distinct: int) -> List[str]:
+    rng = random.Random(42)
+    alphabet = string.ascii_uppercase + string.digits
+    separators = ['', ' ', '-', '.', '/']
+
+    pool = []
+    for _ in range(distinct):
+        parts = [''.join(rng.choice(alphabet) for _ in range(rng.randint(2, 4)))
+                 for _ in range(rng.randint(2, 5))]
+        pool.append(rng.choice(separators).join(parts).lower() if rng.random() < 0.3
+                    else rng.choice(separators).join(parts))
+    return [rng.choice(pool) for _ in range(count)]
+
+
+def benchmark(count: int = 500000, distinct: int = 20000):
+    """Ispiši normalizovanih stringova/sekundi: regex vs translate vs translate + LRU"""
+    values = _sample_numbers(count, distinct)
+
+    # Provjera: translate daje isto što i stari regex
+    mismatches = sum(1 for value in set(values) if _legacy_normalize(value) != normalize_number(value))
+
+    def run(label, func):
+        started = time.perf_counter()
+        for value in values:
+            func(value)
+        elapsed = time.perf_counter() - started
+        print(f"  {label:28} {count / elapsed:>12,.0f} strings/s")
+
+    print(f"Benchmark: {count:,} strings ({distinct:,} distinct), mismatches vs regex: {mismatches}")
+    run("regex (re.sub)", _legacy_normalize)
+    run("translate", _normalize.__wrapped__)
+    _normalize.cache_clear()
+    run("translate + LRU", normalize_number)
+    _oem_variants.cache_clear()
+    run("oem_variants + LRU", oem_variants)
+    _is_placeholder.cache_clear()
+    run("is_placeholder_oem + LRU", is_placeholder_oem)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Normalizacija kataloških/OEM brojeva')
+    parser.add_argument('--benchmark', action='store_true', help='Pokreni benchmark (strings/s)')
+    parser.add_argument('--count', type=int, default=500000, help='Broj stringova u benchmark-u')
+    parser.add_argument('--distinct', type=int, default=20000, help='Broj različitih stringova u benchmark-u')
+    parser.add_argument('values', nargs='*', help='Vrijednosti za normalizaciju')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.count, args.distinct)
+        return 0
+
+    for value in args.values:
+        print(f"{value!r} → {normalize_number(value)!r} variants={oem_variants(value)} "
+              f"placeholder={is_placeholder_oem(value)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,13 @@
+-- Functional indexes on normalized catalog / OE numbers in TecDoc MySQL (8.0.13+)
+-- Enricheri traže po REPLACE(REPLACE(REPLACE(REPLACE(UPPER(x), ' ', ''), '-', ''), '.', ''), '/', '');
+-- bez ovih indeksa svaki takav lookup je full scan article_oe_numbers / articles.
+-- Izraz mora biti identičan onom u upitima (NORMALIZED_OENBR_SQL) da bi ga MySQL koristio.
+--
+-- Pokretanje (jednom, kao korisnik sa ALTER pravima):
+--   mysql -u root tecdoc1q2019 < tecdoc_normalized_indexes.sql
+
+CREATE INDEX idx_aon_oenbr_normalized
+  ON article_oe_numbers ((REPLACE(REPLACE(REPLACE(REPLACE(UPPER(OENbr), ' ', ''), '-', ''), '.', ''), '/', '')));
+
+CREATE INDEX idx_articles_number_normalized
+  ON articles ((REPLACE(REPLACE(REPLACE(REPLACE(UPPER(DataSupplierArticleNumber), ' ', ''), '-', ''), '.', ''), '/', '')));
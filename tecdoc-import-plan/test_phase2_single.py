@@ -9,6 +9,8 @@ import mysql.connector
 import json
 import logging
 
+from tecdoc_db import ProductCrossReferenceSync
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -694,80 +696,22 @@ class TecDocEnricherTest:
     def create_cross_references(self, product_id: str, cross_refs: list):
         """
         Kreiraj ProductCrossReference zapise samo za proizvode koje imamo u bazi
-        - Provjeri da li replacement proizvod postoji u našoj bazi (po catalogNumber)
-        - Ako postoji, kreiraj ProductCrossReference
+        - replacement proizvod se traži po catalogNumber (jedan upit za sve reference)
+        - postojeće TecDoc reference se diff-aju, pa je ponovno pokretanje idempotentno
         """
         if not cross_refs:
             return 0
-        
-        cursor = self.prod_conn.cursor()
-        created_count = 0
-        
-        for ref in cross_refs:
-            article_number = ref['article_number']
-            supplier = ref['supplier']
-            
-            # 1. Provjeri da li replacement proizvod postoji u našoj bazi
-            query = """
-                SELECT id, name
-                FROM "Product"
-                WHERE "catalogNumber" = %s
-                LIMIT 1
-            """
-            
-            cursor.execute(query, (article_number,))
-            result = cursor.fetchone()
-            
-            if not result:
-                logging.debug(f"   ⏭️  Skipped {supplier} {article_number} (not in our database)")
-                continue
-            
-            replacement_id, replacement_name = result
-            
-            # 2. Provjeri da li već postoji cross reference
-            check_query = """
-                SELECT id FROM "ProductCrossReference"
-                WHERE "productId" = %s AND "replacementId" = %s
-                LIMIT 1
-            """
-            
-            cursor.execute(check_query, (product_id, replacement_id))
-            if cursor.fetchone():
-                logging.debug(f"   ⏭️  Cross reference already exists: {article_number}")
-                continue
-            
-            # 3. Kreiraj ProductCrossReference
-            import secrets
-            import string
-            from datetime import datetime
-            
-            def generate_cuid():
-                timestamp = str(int(datetime.now().timestamp() * 1000))[-10:]
-                random_part = ''.join(secrets.choice(string.ascii_lowercase + string.digits) for _ in range(15))
-                return f"c{timestamp}{random_part}"
-            
-            new_id = generate_cuid()
-            
-            insert_query = """
-                INSERT INTO "ProductCrossReference" (
-                    id,
-                    "productId",
-                    "replacementId",
-                    "createdAt",
-                    "updatedAt"
-                ) VALUES (
-                    %s, %s, %s, NOW(), NOW()
-                )
-            """
-            
-            cursor.execute(insert_query, (new_id, product_id, replacement_id))
-            self.prod_conn.commit()
-            
-            logging.info(f"   ✅ Created cross reference: {supplier} {article_number}")
-            created_count += 1
-        
-        cursor.close()
-        return created_count
+
+        sync = ProductCrossReferenceSync(only_local=True)
+        sync.set_references(product_id, cross_refs)
+        result = sync.flush(self.prod_conn)
+        self.prod_conn.commit()
+
+        if sync.failed:
+            logging.error(f"   ❌ Cross references not saved: {sync.failed[product_id]}")
+        if result['deleted']:
+            logging.info(f"   🗑️  Removed {result['deleted']} stale cross reference(s)")
+        return result['inserted']
     
     def test(self):
         """Testiraj na jednom proizvodu"""
@@ -21,6 +21,8 @@ import psycopg2
 import logging
 from dotenv import load_dotenv
 
+from tecdoc_db import log_timing_summary, postgres_pool
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -53,7 +55,8 @@ class ImageSyncer:
     def connect_neon(self):
         """Spojava se na Neon test bazu."""
         try:
-            self.neon_conn = psycopg2.connect(NEON_PG_CONNECTION)
+            self.neon_conn = postgres_pool(NEON_PG_CONNECTION).connection()
+            self.neon_conn.ensure_alive()
             logger.info("✓ Spojena Neon test baza")
         except psycopg2.Error as e:
             logger.error(f"✗ Greška pri spajanju Neon: {e}")
@@ -62,7 +65,8 @@ class ImageSyncer:
     def connect_vps(self):
         """Spojava se na VPS production bazu."""
         try:
-            self.vps_conn = psycopg2.connect(VPS_PG_CONNECTION)
+            self.vps_conn = postgres_pool(VPS_PG_CONNECTION).connection()
+            self.vps_conn.ensure_alive()
             logger.info("✓ Spojena VPS production baza")
         except psycopg2.Error as e:
             logger.error(f"✗ Greška pri spajanju VPS: {e}")
@@ -153,6 +157,7 @@ class ImageSyncer:
             self.neon_conn.close()
         if self.vps_conn:
             self.vps_conn.close()
+        log_timing_summary()
 
 
 def main():